@@ -0,0 +1,102 @@
+"""
+End-to-end request latency through the REST API.
+
+Run with ``python -m benchmarks.bench_api``. Requests go through
+``chat.api.api:app`` with an in-process ASGI client, so routing, validation,
+the facade and JSON encoding are measured without network overhead. Sending
+is also measured with many requests in flight at once.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import httpx
+
+from chat.api.api import app
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.search_index import SearchIndex
+
+CONCURRENCY = 32
+CONTENT = "Hello, my order A-1234 has not arrived yet."
+
+
+def _percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_us": statistics.median(samples),
+        "p95_us": samples[int(len(samples) * 0.95)],
+    }
+
+
+async def _latency(request, repeat: int) -> dict:
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        response = await request(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+        response.raise_for_status()
+    return _percentiles(samples)
+
+
+async def _measure(requests: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/customers/", json={"customer_id": 1, "name": "John", "email": "j@x.io"})
+        response = await client.post("/chats/new", json={"customer_id": 1, "topic": "Billing"})
+        session_id = response.json()["session_id"]
+        send_url = f"/chats/{session_id}/messages/customer/"
+        message = {"customer_id": 1, "content": CONTENT}
+
+        results = {
+            "send_message": await _latency(lambda i: client.post(send_url, json=message), requests),
+            "history_page": await _latency(
+                lambda i: client.get(f"/chats/{session_id}/history/", params={"limit": 50}),
+                requests,
+            ),
+            "search": await _latency(
+                lambda i: client.get("/search", params={"q": "a-1234", "limit": 20}), requests
+            ),
+        }
+
+        async def sender(count: int):
+            for _ in range(count):
+                response = await client.post(send_url, json=message)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(requests // CONCURRENCY) for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+        results["concurrent_send_requests_per_s"] = (
+            requests // CONCURRENCY * CONCURRENCY / elapsed
+        )
+    return results
+
+
+def run(quick: bool = False) -> dict:
+    requests = 320 if quick else 3_200
+    previous = Repository.backend()
+    logging.disable(logging.WARNING)
+    try:
+        Repository.configure(InMemoryRepository())
+        SearchIndex.clear()
+        AgentScheduler.clear()
+        results = {"requests": requests, "concurrency": CONCURRENCY}
+        results.update(asyncio.run(_measure(requests)))
+    finally:
+        logging.disable(logging.NOTSET)
+        Repository.configure(previous)
+        SearchIndex.clear()
+        AgentScheduler.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
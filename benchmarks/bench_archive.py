@@ -0,0 +1,118 @@
+"""
+Memory and scan time of ended sessions before and after archiving.
+
+Run with ``python -m benchmarks.bench_archive``. Fills an ``InMemoryRepository``
+with messages over 1000 sessions, then ends every session so that its messages
+move into a columnar ``MessageBlock``. Reports the traced bytes per message
+(content included) in both states, the time to archive, a scan counting the
+messages per participant type, and reading the last page of one history.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.enums import ParticipantType
+from chat.models.message_data import MessageData
+from chat.repository.memory_repository import InMemoryRepository
+
+SESSIONS = 1000
+PAGE = 50
+
+
+def _scan_objects(repository) -> Counter:
+    counts: Counter = Counter()
+    for messages in repository.session_messages.values():
+        for message in messages:
+            counts[message.participant_type] += 1
+    return counts
+
+
+def _scan_blocks(repository) -> Counter:
+    counts: Counter = Counter()
+    for block in repository.archives.values():
+        counts.update(block.count_by_participant_type())
+    return counts
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _page_us(repository, session_id, repeat=1000) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        repository.get_session_messages(session_id, -PAGE)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def _fill(count: int):
+    repository = InMemoryRepository()
+    session_ids = [uuid.uuid4() for _ in range(SESSIONS)]
+    for i, session_id in enumerate(session_ids):
+        repository.add_chat_session(ChatSessionData(session_id, 1000 + i, "Billing"))
+    participant_types = (ParticipantType.CUSTOMER, ParticipantType.AGENT)
+    repository.add_messages(
+        MessageData(
+            session_id=session_ids[i % SESSIONS],
+            participant_id=1000 + i % SESSIONS if i % 3 else 1,
+            participant_type=participant_types[i % 3 == 0],
+            content=f"Message {i}: could you clear your cookies and log in again?",
+        )
+        for i in range(count)
+    )
+    return repository, session_ids
+
+
+def _end_all(repository, session_ids):
+    ended_at = datetime.now()
+    for session_id in session_ids:
+        repository.end_chat_session(session_id, ended_at)
+
+
+def run(quick: bool = False) -> dict:
+    count = 100_000 if quick else 1_000_000
+
+    repository, session_ids = _fill(count)
+    object_counts, object_scan = _timed(_scan_objects, repository)
+    object_page = _page_us(repository, session_ids[0])
+    _, archive_seconds = _timed(_end_all, repository, session_ids)
+    block_counts, block_scan = _timed(_scan_blocks, repository)
+    assert +block_counts == +object_counts
+    block_page = _page_us(repository, session_ids[0])
+    del repository
+
+    # Memory is measured in a second, traced run; tracing slows allocations.
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    repository, session_ids = _fill(count)
+    gc.collect()
+    live_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    _end_all(repository, session_ids)
+    gc.collect()
+    archived_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return {
+        "messages": count,
+        "live_bytes_per_message": live_bytes / count,
+        "archived_bytes_per_message": archived_bytes / count,
+        "archive_seconds": archive_seconds,
+        "scan_ms": {"objects": object_scan * 1e3, "blocks": block_scan * 1e3},
+        "last_page_us": {"objects": object_page, "blocks": block_page},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,137 @@
+"""
+End-to-end latency of fanning messages out to other processes through ``RespBroker``.
+
+Run with ``python -m benchmarks.bench_broker``. A stand-in RESP server runs
+in a process of its own, unless ``--url`` points to a real Redis. Subscriber
+processes subscribe to every session through their ``MessageHub``; this
+process publishes messages one at a time, as ``ChatService`` does, in bursts
+of ``BURST`` with a short pause in between. The latency of a message is the
+time from ``publish`` until a subscriber in another process got it from its
+``Subscription``. ``batched`` coalesces whatever is queued into frames of up
+to 256 messages, ``unbatched`` sends every message as a frame of its own.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+from chat.broker.resp_broker import RespBroker
+from chat.models.message_data import MessageData
+from chat.services.message_hub import MessageHub
+
+SESSIONS = 10
+SUBSCRIBERS = 2
+BURST = 20
+
+
+def _subscriber(url: str, channel: str, session_ids: list, count: int, ready, results) -> None:
+    logging.disable(logging.INFO)
+
+    async def receive():
+        subscriptions = [MessageHub.subscribe(session_id, count) for session_id in session_ids]
+        broker = RespBroker(url, channel)
+        ready.wait()
+        latencies = []
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def drain(subscription):
+            while True:
+                message = await subscription.get()
+                await queue.put(time.time() - float(message.content))
+
+        tasks = [asyncio.ensure_future(drain(subscription)) for subscription in subscriptions]
+        for _ in range(count):
+            latencies.append(await queue.get())
+        for task in tasks:
+            task.cancel()
+        broker.close()
+        return latencies
+
+    results.put(asyncio.run(receive()))
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def _measure(url: str, count: int, batch_size: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    channel = f"bench:{uuid.uuid4().hex}"
+    session_ids = [uuid.uuid4() for _ in range(SESSIONS)]
+    ready = context.Barrier(SUBSCRIBERS + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_subscriber, args=(url, channel, session_ids, count, ready, results)
+        )
+        for _ in range(SUBSCRIBERS)
+    ]
+    for process in processes:
+        process.start()
+    broker = RespBroker(url, channel, batch_size=batch_size)
+    ready.wait()
+    # Let the subscribers reach their receive loops.
+    time.sleep(0.2)
+    start = time.perf_counter()
+    for i in range(count):
+        message = MessageData(session_id=session_ids[i % SESSIONS], content=repr(time.time()))
+        broker.publish([message])
+        if i % BURST == BURST - 1:
+            time.sleep(0.001)
+    latencies = [latency for _ in processes for latency in results.get()]
+    elapsed = time.perf_counter() - start
+    broker.close()
+    for process in processes:
+        process.join()
+    return {
+        "deliveries_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": _percentile(latencies, 0.99) * 1e3,
+        "max_ms": max(latencies) * 1e3,
+    }
+
+
+def _start_server() -> tuple:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "chat.repository.resp_server", "--port", "0"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    port = int(server.stdout.readline())
+    return server, f"redis://127.0.0.1:{port}/0"
+
+
+def run(quick: bool = False, url: str = None) -> dict:
+    count = 2_000 if quick else 20_000
+    results = {"messages": count, "subscriber_processes": SUBSCRIBERS, "cpu_count": os.cpu_count()}
+    server = None
+    if url is None:
+        server, url = _start_server()
+    logging.disable(logging.INFO)
+    try:
+        results["batched"] = _measure(url, count, 256)
+        results["unbatched"] = _measure(url, count, 1)
+    finally:
+        logging.disable(logging.NOTSET)
+        MessageHub.clear()
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    parser.add_argument("--url", help="a Redis server to use instead of the stand-in")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick, url=args.url), indent=2))
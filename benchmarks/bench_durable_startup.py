@@ -0,0 +1,78 @@
+"""
+Startup time of the durable in-memory repository.
+
+Run with ``python -m benchmarks.bench_durable_startup``. The repository is
+filled with messages, then reopened three ways: replaying the whole log,
+loading a snapshot only, and loading a snapshot plus a 10% log tail.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from chat.models.message_data import MessageData
+from chat.repository.durable_memory_repository import DurableInMemoryRepository
+
+MESSAGES_PER_SESSION = 20
+BATCH = 10_000
+
+
+def _write_messages(repository: DurableInMemoryRepository, count: int):
+    session_id = uuid.uuid4()
+    batch = []
+    for i in range(count):
+        if i % MESSAGES_PER_SESSION == 0:
+            session_id = uuid.uuid4()
+        batch.append(
+            MessageData(session_id=session_id, participant_id=i % 1000, content="Hello, I need help with my order.")
+        )
+        if len(batch) == BATCH:
+            repository.add_messages(batch)
+            batch = []
+    repository.add_messages(batch)
+
+
+def _directory_mb(directory: str) -> float:
+    return sum(entry.stat().st_size for entry in os.scandir(directory)) / 2**20
+
+
+def _reopen(directory: str, expected: int) -> float:
+    start = time.perf_counter()
+    repository = DurableInMemoryRepository(directory, snapshot_interval=10**12)
+    elapsed = time.perf_counter() - start
+    assert len(repository.messages) == expected
+    repository.close()
+    return elapsed
+
+
+def run(quick: bool = False) -> dict:
+    total = 100_000 if quick else 1_000_000
+    tail = total // 10
+    results = {"messages": total}
+    with tempfile.TemporaryDirectory() as directory:
+        repository = DurableInMemoryRepository(directory, snapshot_interval=10**12)
+        _write_messages(repository, total)
+        repository.close()
+        results["log_mb"] = _directory_mb(directory)
+        results["full_log_replay_s"] = _reopen(directory, total)
+
+        repository = DurableInMemoryRepository(directory, snapshot_interval=10**12)
+        repository.snapshot()
+        repository.close()
+        results["snapshot_mb"] = _directory_mb(directory)
+        results["snapshot_only_s"] = _reopen(directory, total)
+
+        repository = DurableInMemoryRepository(directory, snapshot_interval=10**12)
+        _write_messages(repository, tail)
+        repository.close()
+        results["snapshot_plus_tail_s"] = _reopen(directory, total + tail)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
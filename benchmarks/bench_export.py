@@ -0,0 +1,98 @@
+"""
+Throughput and peak memory of exporting every session with its history.
+
+Run with ``python -m benchmarks.bench_export``. ``ChatFacade.export_sessions``
+streams NDJSON chunks, which are counted and dropped as a client would
+consume them; ``materialized`` builds the same export the old way, from
+``list_sessions`` and the full ``get_chat_history`` of each session encoded
+with ``jsonable_encoder``. Peak memory is what ``tracemalloc`` sees allocated
+on top of the stored data while exporting, which for the stream should stay
+flat as the number of sessions grows. ``bytes`` is the size of the export as
+sent, compressed for ``streamed_gzip``.
+"""
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+
+from chat.api.chat_facade import ChatFacade
+from chat.api.serialization import session_dict
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.repository.repository import Repository
+
+MESSAGES_PER_SESSION = 50
+
+
+def _populate(sessions: int) -> None:
+    Repository.clear()
+    for i in range(sessions):
+        session_id = uuid.uuid4()
+        Repository.add_chat_session(ChatSessionData(session_id, i, "Billing", i % 10))
+        Repository.add_messages(
+            MessageData(session_id=session_id, participant_id=i, content=f"Message number {j}")
+            for j in range(MESSAGES_PER_SESSION)
+        )
+
+
+def _streamed(facade: ChatFacade, compress: bool) -> int:
+    return sum(len(chunk) for chunk in facade.export_sessions(compress=compress))
+
+
+def _materialized(facade: ChatFacade, compress: bool) -> int:
+    lines = [
+        json.dumps(
+            {
+                "session": session_dict(session),
+                "messages": jsonable_encoder(facade.get_chat_history(session.session_id)),
+            }
+        )
+        for session in facade.list_sessions()
+    ]
+    return len("\n".join(lines))
+
+
+def _measure(func, facade: ChatFacade, compress: bool = False) -> dict:
+    start = time.perf_counter()
+    size = func(facade, compress)
+    elapsed = time.perf_counter() - start
+    # Traced separately; tracing slows the export down several times.
+    tracemalloc.start()
+    func(facade, compress)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"bytes": size, "bytes_per_s": size / elapsed, "peak_bytes": peak}
+
+
+def run(quick: bool = False) -> dict:
+    sizes = [100, 400] if quick else [1_000, 4_000]
+    facade = ChatFacade()
+    results = []
+    logging.disable(logging.INFO)
+    try:
+        for sessions in sizes:
+            _populate(sessions)
+            results.append(
+                {
+                    "sessions": sessions,
+                    "messages": sessions * MESSAGES_PER_SESSION,
+                    "streamed": _measure(_streamed, facade),
+                    "streamed_gzip": _measure(_streamed, facade, compress=True),
+                    "materialized": _measure(_materialized, facade),
+                }
+            )
+    finally:
+        logging.disable(logging.NOTSET)
+        Repository.clear()
+    return {"by_dataset_size": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,120 @@
+"""
+Per-message overhead of ``ChatFacade`` over calling ``ChatService`` directly.
+
+Run with ``python -m benchmarks.bench_facade``. For the in-memory and the
+SQLite backend, ``handle`` times getting the participant a message is sent
+through: a ``Customer`` built by ``ChatParticipantFactory``, as the facade used
+to for every call, against the ``ParticipantCache`` handle it uses now.
+``send`` times whole messages without strategies, sent through
+``ChatService.send_message`` itself and through the facade; ``overhead_us``
+is the difference.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from chat.api.chat_facade import ChatFacade
+from chat.models.enums import ParticipantType
+from chat.participants.chat_participant_factory import ChatParticipantFactory
+from chat.participants.participant_cache import ParticipantCache
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.repository.sqlite_repository import SQLiteRepository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.chat_service import ChatService
+from chat.services.search_index import SearchIndex
+
+CUSTOMERS = 100
+ROUNDS = 3
+CONTENT = "Hello, I was charged twice for my last order, could you check?"
+
+
+def _best_us(function, count: int) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        function(count)
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e6
+
+
+def _handles(count: int) -> dict:
+    def factory(count):
+        for i in range(count):
+            ChatParticipantFactory.create_participant(
+                participant_type=ParticipantType.CUSTOMER, customer_id=i % CUSTOMERS + 1
+            )
+
+    def cached(count):
+        for i in range(count):
+            ParticipantCache.get(ParticipantType.CUSTOMER, i % CUSTOMERS + 1)
+
+    return {"factory_us": _best_us(factory, count), "cached_us": _best_us(cached, count)}
+
+
+async def _sends(facade, sessions, count: int) -> dict:
+    async def direct():
+        for i in range(count):
+            customer_id, session_id = sessions[i % CUSTOMERS]
+            await ChatService.send_message(
+                session_id, customer_id, ParticipantType.CUSTOMER, CONTENT
+            )
+
+    async def through_facade():
+        for i in range(count):
+            customer_id, session_id = sessions[i % CUSTOMERS]
+            await facade.customer_send_message(session_id, customer_id, CONTENT)
+
+    # The store grows as messages are sent, so the two take turns going first.
+    best = {"direct": float("inf"), "facade": float("inf")}
+    modes = [("direct", direct), ("facade", through_facade)]
+    for round in range(ROUNDS):
+        for label, send in modes[round % 2:] + modes[:round % 2]:
+            start = time.perf_counter()
+            await send()
+            best[label] = min(best[label], time.perf_counter() - start)
+    direct_us = best["direct"] / count * 1e6
+    facade_us = best["facade"] / count * 1e6
+    return {"direct_us": direct_us, "facade_us": facade_us, "overhead_us": facade_us - direct_us}
+
+
+async def _measure(backend, handles: int, sends: int) -> dict:
+    Repository.configure(backend)
+    SearchIndex.clear()
+    AgentScheduler.clear()
+    facade = ChatFacade()
+    sessions = []
+    for customer_id in range(1, CUSTOMERS + 1):
+        facade.create_customer(customer_id, f"Customer {customer_id}", f"{customer_id}@example.com")
+        sessions.append((customer_id, await facade.initiate_chat(customer_id, "Bench")))
+    return {"handle": _handles(handles), "send": await _sends(facade, sessions, sends)}
+
+
+def run(quick: bool = False) -> dict:
+    handles, sends = (20_000, 2_000) if quick else (200_000, 20_000)
+    previous = Repository.backend()
+    logging.disable(logging.INFO)
+    results = {"handles": handles, "messages": sends}
+    try:
+        results["memory"] = asyncio.run(_measure(InMemoryRepository(), handles, sends))
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SQLiteRepository(os.path.join(directory, "bench.db"))
+            results["sqlite"] = asyncio.run(_measure(backend, handles // 4, sends // 4))
+            backend.close()
+    finally:
+        logging.disable(logging.NOTSET)
+        Repository.configure(previous)
+        SearchIndex.clear()
+        AgentScheduler.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,80 @@
+"""
+Profanity and spam filter cost against large word lists.
+
+Run with ``python -m benchmarks.bench_filters``. Compares the previous
+per-word scan (one ``in`` check and ``str.replace`` per word) with the
+Aho-Corasick strategies on clean and dirty messages.
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from chat.models.message_data import MessageData
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+
+MESSAGE = (
+    "Hi, I ordered a laptop last week and the tracking page still shows that the "
+    "package has not left the warehouse. Could you check what is going on please?"
+)
+
+
+def _words(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        for _ in range(count)
+    ]
+
+
+def _per_word_profanity(words, content):
+    for badword in words:
+        if badword in content:
+            content = content.replace(badword, "*" * len(badword))
+    return content
+
+
+def _per_word_spam(words, content):
+    return any(keyword in content.lower() for keyword in words)
+
+
+def _us_per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(quick: bool = False) -> dict:
+    terms = 1_000 if quick else 10_000
+    repeat = 200 if quick else 1_000
+    words = _words(terms, seed=1)
+    dirty = MESSAGE.replace("laptop", words[-1])
+
+    start = time.perf_counter()
+    profanity = ProfanityFilterStrategy(words)
+    build_ms = (time.perf_counter() - start) * 1e3
+    spam = SpamFilterStrategy(words)
+
+    results = {"terms": terms, "message_chars": len(MESSAGE), "build_ms": build_ms}
+    for label, content in (("clean", MESSAGE), ("dirty", dirty)):
+        results[label] = {
+            "profanity_per_word_us": _us_per_call(lambda: _per_word_profanity(words, content), repeat),
+            "profanity_automaton_us": _us_per_call(
+                lambda: profanity.process(MessageData(content=content)), repeat
+            ),
+            "spam_per_word_us": _us_per_call(lambda: _per_word_spam(words, content), repeat),
+            "spam_automaton_us": _us_per_call(
+                lambda: spam.process(MessageData(content=content)), repeat
+            ),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,98 @@
+"""
+Chat history latency as the global message count and the session size grow.
+
+Run with ``python -m benchmarks.bench_history``. The history of one session of
+fixed size is read while the total number of messages in the repository grows;
+with the per-session index the latency should stay flat. Then sessions of
+growing size are read in full and by their last page of ``PAGE_SIZE``
+messages, which should not depend on the session size.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+from chat.api.chat_facade import ChatFacade
+from chat.models.message_data import MessageData
+from chat.repository.repository import Repository
+
+SESSION_SIZE = 50
+MESSAGES_PER_SESSION = 20
+PAGE_SIZE = 50
+
+
+def _populate(total_messages: int, session_size: int = SESSION_SIZE) -> uuid.UUID:
+    Repository.clear()
+    target_session = uuid.uuid4()
+    for _ in range(session_size):
+        Repository.add_message(MessageData(session_id=target_session, content="hello"))
+
+    session_id = uuid.uuid4()
+    for i in range(total_messages - session_size):
+        if i % MESSAGES_PER_SESSION == 0:
+            session_id = uuid.uuid4()
+        Repository.add_message(MessageData(session_id=session_id, content="hello"))
+    return target_session
+
+
+def _full_scan_history(session_id: uuid.UUID):
+    # The previous implementation of ChatFacade.get_chat_history.
+    messages = [m for m in Repository.messages.values() if m.session_id == session_id]
+    messages.sort(key=lambda x: x.timestamp)
+    return messages
+
+
+def _median_latency_us(func, session_id: uuid.UUID, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(session_id)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def run(quick: bool = False) -> dict:
+    sizes = [1_000, 10_000, 50_000] if quick else [10_000, 100_000, 1_000_000]
+    facade = ChatFacade()
+    results = []
+    for total in sizes:
+        session_id = _populate(total)
+        assert len(facade.get_chat_history(session_id)) == SESSION_SIZE
+        results.append(
+            {
+                "global_messages": total,
+                "indexed_us": _median_latency_us(facade.get_chat_history, session_id, 200),
+                "full_scan_us": _median_latency_us(_full_scan_history, session_id, 5),
+            }
+        )
+
+    by_session_size = []
+    for session_size in sizes[:-1]:
+        session_id = _populate(session_size, session_size)
+        total = str(session_size)
+        by_session_size.append(
+            {
+                "session_size": session_size,
+                "full_history_us": _median_latency_us(facade.get_chat_history, session_id, 20),
+                "last_page_us": _median_latency_us(
+                    lambda s: facade.get_chat_history_page(s, limit=PAGE_SIZE, before=total),
+                    session_id,
+                    200,
+                ),
+            }
+        )
+    Repository.clear()
+    return {
+        "session_size": SESSION_SIZE,
+        "results": results,
+        "page_size": PAGE_SIZE,
+        "by_session_size": by_session_size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
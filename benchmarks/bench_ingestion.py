@@ -0,0 +1,93 @@
+"""
+Message ingestion throughput, one by one versus in batches.
+
+Run with ``python -m benchmarks.bench_ingestion``. Messages are sent through
+``ChatFacade.customer_send_message`` one at a time and through
+``ChatFacade.send_messages`` in batches, with the in-memory and the SQLite
+repository backends.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from chat.api.chat_facade import ChatFacade
+from chat.models.enums import ParticipantType
+from chat.models.message_data import MessageData
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.repository.sqlite_repository import SQLiteRepository
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+
+SESSIONS = 50
+BATCH_SIZE = 1_000
+
+
+async def _setup(facade: ChatFacade) -> list:
+    facade.create_customer(1, "John Doe", "john@example.com")
+    return [
+        await facade.initiate_chat(1, "Bench", [SpamFilterStrategy(), ProfanityFilterStrategy()])
+        for _ in range(SESSIONS)
+    ]
+
+
+async def _one_by_one(facade: ChatFacade, sessions: list, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        await facade.customer_send_message(sessions[i % SESSIONS], 1, "I need help with my order.")
+    return count / (time.perf_counter() - start)
+
+
+async def _batched(facade: ChatFacade, sessions: list, count: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, count, BATCH_SIZE):
+        await facade.send_messages(
+            [
+                MessageData(
+                    session_id=sessions[i % SESSIONS],
+                    participant_id=1,
+                    participant_type=ParticipantType.CUSTOMER,
+                    content="I need help with my order.",
+                )
+                for i in range(offset, min(offset + BATCH_SIZE, count))
+            ]
+        )
+    return count / (time.perf_counter() - start)
+
+
+async def _measure(count: int) -> dict:
+    facade = ChatFacade()
+    sessions = await _setup(facade)
+    return {
+        "one_by_one_msgs_per_s": await _one_by_one(facade, sessions, count),
+        "batched_msgs_per_s": await _batched(facade, sessions, count),
+    }
+
+
+def run(quick: bool = False) -> dict:
+    count = 5_000 if quick else 50_000
+    previous = Repository.backend()
+    logging.disable(logging.INFO)
+    results = {"messages": count, "batch_size": BATCH_SIZE}
+    try:
+        Repository.configure(InMemoryRepository())
+        results["memory"] = asyncio.run(_measure(count))
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SQLiteRepository(f"{directory}/bench.db")
+            Repository.configure(backend)
+            results["sqlite"] = asyncio.run(_measure(count))
+            backend.close()
+    finally:
+        logging.disable(logging.NOTSET)
+        Repository.configure(previous)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,94 @@
+"""
+Per-message cost of logging on the message path.
+
+Run with ``python -m benchmarks.bench_logging``. Compares the previous setup,
+an f-string with the message content written synchronously by a
+``StreamHandler``, with ``log_message``, which queues an unformatted record
+for the writer thread, at full and at 10% sampling, and with lean records
+that skip the caller, thread and process info. ``caller_us`` is the time
+the sending code spends per message; ``drained_us`` includes waiting until
+the writer has written everything.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from chat.config import settings
+from chat.models.enums import ParticipantType
+from chat.models.message_data import MessageData
+from chat.utils import logging as chat_logging
+
+CONTENT = "Hello, I was charged twice for my last order, could you check?"
+
+
+def _previous(messages, logger):
+    for message in messages:
+        logger.info(
+            f"[{message.participant_type.value} {message.participant_id}]: {message.content}"
+        )
+
+
+def _queued(messages, logger):
+    for message in messages:
+        chat_logging.log_message(message)
+
+
+def _measure(log, messages, logger) -> dict:
+    start = time.perf_counter()
+    log(messages, logger)
+    caller = time.perf_counter() - start
+    chat_logging.stop_logging()
+    drained = time.perf_counter() - start
+    return {
+        "caller_us": caller / len(messages) * 1e6,
+        "drained_us": drained / len(messages) * 1e6,
+    }
+
+
+def run(quick: bool = False) -> dict:
+    count = 10_000 if quick else 100_000
+    messages = [
+        MessageData(participant_id=1, participant_type=ParticipantType.CUSTOMER, content=CONTENT)
+        for _ in range(count)
+    ]
+    sample_rate = settings.log_message_sample_rate
+    results = {"messages": count}
+    with open(os.devnull, "w") as devnull:
+        try:
+            # The previous configuration: root at DEBUG, a synchronous handler.
+            previous = logging.getLogger("bench.previous")
+            previous.propagate = False
+            handler = logging.StreamHandler(devnull)
+            handler.setFormatter(
+                logging.Formatter("{asctime} - {levelname} - {message}", style="{")
+            )
+            previous.addHandler(handler)
+            previous.setLevel(logging.DEBUG)
+            chat_logging.configure_logging("INFO", stream=devnull)
+            results["previous"] = _measure(_previous, messages, previous)
+
+            for label, rate, lean in (
+                ("queued_json", 1.0, False),
+                ("queued_json_lean_records", 1.0, True),
+                ("queued_json_sampled_10pct", 0.1, False),
+            ):
+                settings.log_message_sample_rate = rate
+                chat_logging.configure_logging("INFO", stream=devnull, lean_records=lean)
+                results[label] = _measure(_queued, messages, None)
+        finally:
+            settings.log_message_sample_rate = sample_rate
+            chat_logging.configure_logging(
+                settings.log_level,
+                settings.log_format == "json",
+                lean_records=settings.log_lean_records,
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
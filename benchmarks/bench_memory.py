@@ -0,0 +1,99 @@
+"""
+Memory held per stored message.
+
+Run with ``python -m benchmarks.bench_memory``. Stores messages built the way
+the API builds them (session ids parsed per request, participant ids read from
+JSON) spread over 1000 sessions, and reports the traced bytes per message,
+excluding the content strings, for the previous ``__dict__``-based model
+stored as-is and for the slotted model stored by ``InMemoryRepository``.
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Union
+
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.enums import MessageType, ParticipantType
+from chat.models.message_data import MessageData
+from chat.repository.memory_repository import InMemoryRepository
+
+SESSIONS = 1000
+
+
+@dataclass
+class _DictMessageData:
+    """``MessageData`` as it was before it was slotted."""
+
+    message_id: uuid.UUID = field(default_factory=uuid.uuid4)
+    session_id: uuid.UUID = field(default_factory=uuid.uuid4)
+    participant_id: Union[int, str] = "System"
+    participant_type: ParticipantType = ParticipantType.BOT
+    content: str = "No Content"
+    timestamp: datetime = field(default_factory=datetime.now)
+    message_type: MessageType = MessageType.TEXT
+
+
+class _PlainStore:
+    """The previous repository layout, storing messages unchanged."""
+
+    def __init__(self):
+        self.messages = {}
+        self.session_messages = {}
+
+    def add_message(self, message):
+        self.messages[message.message_id] = message
+        self.session_messages.setdefault(message.session_id, []).append(message)
+
+
+def _bytes_per_message(model, store, session_ids, contents) -> float:
+    # Request payloads carry ids as text, parsed into new objects per message.
+    raw_session_ids = [str(session_id) for session_id in session_ids]
+    raw_participant_ids = [str(1000 + i) for i in range(SESSIONS)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i, content in enumerate(contents):
+        k = i % SESSIONS
+        store.add_message(
+            model(
+                session_id=uuid.UUID(raw_session_ids[k]),
+                participant_id=int(raw_participant_ids[k]),
+                participant_type=ParticipantType.CUSTOMER,
+                content=content,
+            )
+        )
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(contents)
+
+
+def run(quick: bool = False) -> dict:
+    count = 100_000 if quick else 1_000_000
+    contents = [f"Message {i} about my order" for i in range(count)]
+    session_ids = [uuid.uuid4() for _ in range(SESSIONS)]
+
+    repository = InMemoryRepository()
+    for i, session_id in enumerate(session_ids):
+        repository.add_chat_session(ChatSessionData(session_id, 1000 + i, "Billing"))
+
+    return {
+        "messages": count,
+        "before_bytes_per_message": _bytes_per_message(
+            _DictMessageData, _PlainStore(), session_ids, contents
+        ),
+        "after_bytes_per_message": _bytes_per_message(
+            MessageData, repository, session_ids, contents
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,105 @@
+"""
+Overhead of the metrics instrumentation.
+
+Run with ``python -m benchmarks.bench_metrics``. The same workloads run with
+``Metrics.enabled`` off and on: ``ChatService.send_message`` with the spam
+and profanity filters, which times the call and every strategy, and
+``Repository.add_message`` alone, which times its lock wait and hold.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import time
+import uuid
+
+from chat.models.enums import ParticipantType
+from chat.models.message_data import MessageData
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.chat_service import ChatService
+from chat.services.search_index import SearchIndex
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+from chat.utils.metrics import Metrics
+
+SESSIONS = 50
+ROUNDS = 4
+CONTENT = "Hello, I was charged twice for my last order, could you check?"
+
+
+async def _send_us(count: int) -> float:
+    sessions = [
+        await ChatService.initiate_chat_session(
+            1, "Bench", [SpamFilterStrategy(), ProfanityFilterStrategy()]
+        )
+        for _ in range(SESSIONS)
+    ]
+    start = time.perf_counter()
+    for i in range(count):
+        await ChatService.send_message(
+            sessions[i % SESSIONS], 1, ParticipantType.CUSTOMER, CONTENT
+        )
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def _add_message_us(count: int) -> float:
+    session_id = uuid.uuid4()
+    messages = [MessageData(session_id=session_id, content=CONTENT) for _ in range(count)]
+    start = time.perf_counter()
+    for message in messages:
+        Repository.add_message(message)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def _measure(enabled: bool, count: int) -> dict:
+    gc.collect()
+    Metrics.enabled = enabled
+    # Locks and pipelines are instrumented when they are created.
+    Repository.configure(InMemoryRepository())
+    ChatService._pipelines.clear()
+    SearchIndex.clear()
+    AgentScheduler.clear()
+    send_us = asyncio.run(_send_us(count))
+    Repository.configure(InMemoryRepository())
+    return {"send_message_us": send_us, "add_message_us": _add_message_us(count)}
+
+
+def run(quick: bool = False) -> dict:
+    count = 5_000 if quick else 50_000
+    previous, was_enabled = Repository.backend(), Metrics.enabled
+    logging.disable(logging.INFO)
+    results = {"messages": count}
+    try:
+        # Alternate the modes and keep the best round of each, so neither
+        # benefits from warm-up or suffers more from a noisy neighbour.
+        _measure(False, count)
+        rounds = {"disabled": [], "enabled": []}
+        for round_number in range(ROUNDS):
+            order = ("disabled", "enabled") if round_number % 2 else ("enabled", "disabled")
+            for label in order:
+                rounds[label].append(_measure(label == "enabled", count))
+        for label, measured in rounds.items():
+            results[label] = {key: min(m[key] for m in measured) for key in measured[0]}
+        results["overhead_us"] = {
+            key: results["enabled"][key] - results["disabled"][key]
+            for key in results["enabled"]
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+        Metrics.enabled = was_enabled
+        Metrics.reset()
+        Repository.configure(previous)
+        ChatService._pipelines.clear()
+        SearchIndex.clear()
+        AgentScheduler.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
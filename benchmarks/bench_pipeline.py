@@ -0,0 +1,63 @@
+"""
+Per-message cost of the compiled strategy pipeline.
+
+Run with ``python -m benchmarks.bench_pipeline``. Compares the previous loop
+calling ``process`` on every strategy with ``StrategyPipeline.run`` for a
+session with spam, case-insensitive profanity and translation strategies.
+"""
+import argparse
+import json
+import logging
+import time
+
+from benchmarks.bench_filters import MESSAGE, _words
+from chat.models.message_data import MessageData
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+from chat.strategies.strategy_pipeline import StrategyPipeline
+from chat.strategies.translation_strategy import TranslationStrategy
+
+
+def _loop(strategies, message):
+    for strategy in strategies:
+        message = strategy.process(message)
+    return message
+
+
+def _us_per_message(func, content: str, repeat: int) -> float:
+    messages = [MessageData(content=content) for _ in range(repeat)]
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(quick: bool = False) -> dict:
+    terms = 1_000 if quick else 10_000
+    repeat = 500 if quick else 5_000
+    strategies = [
+        SpamFilterStrategy(_words(terms, seed=2)),
+        ProfanityFilterStrategy(_words(terms, seed=3), case_sensitive=False),
+        TranslationStrategy(target_language="French"),
+    ]
+    pipeline = StrategyPipeline(strategies)
+    spam = MESSAGE + " " + strategies[0].spam_keywords[0]
+
+    logging.disable(logging.WARNING)
+    try:
+        results = {"terms": terms}
+        for label, content in (("clean", MESSAGE), ("spam", spam)):
+            results[label] = {
+                "loop_us": _us_per_message(lambda m: _loop(strategies, m), content, repeat),
+                "pipeline_us": _us_per_message(pipeline.run, content, repeat),
+            }
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
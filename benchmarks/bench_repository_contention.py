@@ -0,0 +1,95 @@
+"""
+Repository throughput under concurrent writers and readers.
+
+Run with ``python -m benchmarks.bench_repository_contention``. Each thread
+appends messages to its own sessions and reads sessions back, first through a
+reproduction of the previous single global lock and then through the striped
+``Repository``. Note that on a GIL build of CPython the threads still share one
+interpreter lock, so striping removes lock convoys but cannot add cores; the
+numbers scale further on a free-threaded build.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.repository.repository import Repository
+
+
+class _GlobalLockStore:
+    """The previous design: every operation behind one lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chat_sessions = {}
+        self.messages = {}
+        self.session_messages = {}
+
+    def add_chat_session(self, session):
+        with self._lock:
+            self.chat_sessions[session.session_id] = session
+
+    def add_message(self, message):
+        with self._lock:
+            self.messages[message.message_id] = message
+            self.session_messages.setdefault(message.session_id, []).append(message)
+
+    def get_chat_session(self, session_id):
+        with self._lock:
+            return self.chat_sessions.get(session_id)
+
+
+def _worker(store, sessions, operations, barrier):
+    messages = [MessageData(session_id=sessions[i % len(sessions)]) for i in range(operations)]
+    barrier.wait()
+    for i, message in enumerate(messages):
+        store.add_message(message)
+        store.get_chat_session(sessions[i % len(sessions)])
+
+
+def _throughput(store, threads: int, operations: int) -> float:
+    barrier = threading.Barrier(threads + 1)
+    workers = []
+    for _ in range(threads):
+        sessions = [uuid.uuid4() for _ in range(16)]
+        for session_id in sessions:
+            store.add_chat_session(ChatSessionData(session_id, 1, "Bench"))
+        workers.append(
+            threading.Thread(target=_worker, args=(store, sessions, operations, barrier))
+        )
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return threads * operations / elapsed
+
+
+def run(quick: bool = False) -> dict:
+    operations = 20_000 if quick else 200_000
+    thread_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    results = []
+    for threads in thread_counts:
+        Repository.clear()
+        results.append(
+            {
+                "threads": threads,
+                "global_lock_ops_per_s": _throughput(_GlobalLockStore(), threads, operations),
+                "striped_ops_per_s": _throughput(Repository, threads, operations),
+            }
+        )
+    Repository.clear()
+    return {"operations_per_thread": operations, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,69 @@
+"""
+Cost of automatic agent assignment as the number of agents grows.
+
+Run with ``python -m benchmarks.bench_scheduler``. Registers agents with a few
+skills each, keeps them half loaded, then times assigning a new session and
+releasing an old one, which hands the freed agent nothing or a waiting session.
+"""
+import argparse
+import json
+import logging
+import time
+import uuid
+
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.support_agent_data import SupportAgentData
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+
+TOPICS = [f"topic{i}" for i in range(20)]
+
+
+def _us_per_cycle(agents: int, cycles: int) -> float:
+    AgentScheduler.clear()
+    Repository.configure(InMemoryRepository())
+    for agent_id in range(agents):
+        Repository.add_agent(SupportAgentData(agent_id, f"Agent {agent_id}"))
+        skills = [TOPICS[agent_id % len(TOPICS)], TOPICS[(agent_id * 7) % len(TOPICS)]]
+        AgentScheduler.register_agent(agent_id, skills, max_sessions=4)
+
+    def new_session(i: int) -> ChatSessionData:
+        session = ChatSessionData(uuid.uuid4(), 1, TOPICS[i % len(TOPICS)])
+        Repository.add_chat_session(session)
+        return session
+
+    active = [new_session(i) for i in range(agents * 2)]
+    for session in active:
+        AgentScheduler.submit(session)
+    sessions = [new_session(i) for i in range(cycles)]
+
+    start = time.perf_counter()
+    for i, session in enumerate(sessions):
+        AgentScheduler.submit(session)
+        AgentScheduler.release(active[i].session_id)
+    return (time.perf_counter() - start) / cycles * 1e6
+
+
+def run(quick: bool = False) -> dict:
+    sizes = (10, 1_000, 10_000) if quick else (10, 1_000, 100_000)
+    cycles = 2_000 if quick else 20_000
+    previous = Repository.backend()
+    logging.disable(logging.WARNING)
+    try:
+        return {
+            "us_per_assign_and_release": {
+                str(agents): _us_per_cycle(agents, min(cycles, agents * 2)) for agents in sizes
+            }
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+        AgentScheduler.clear()
+        Repository.configure(previous)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
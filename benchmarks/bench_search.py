@@ -0,0 +1,78 @@
+"""
+Indexing throughput and query latency of the message search index.
+
+Run with ``python -m benchmarks.bench_search``. Indexes support messages
+mentioning order numbers and products over 10000 sessions, then times term,
+phrase and session-scoped queries of different selectivity.
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from chat.models.message_data import MessageData
+from chat.services.search_index import SearchIndex
+
+PRODUCTS = [f"product{i}" for i in range(500)]
+TEMPLATES = [
+    "Hi, my order {order} of {product} has not arrived yet",
+    "Could you clear your cookies and log in again?",
+    "The {product} I received is broken, order {order}",
+    "I was charged twice for {product}",
+    "Thanks for reaching out, let me check order {order} for you",
+    "Is there anything else I can help you with?",
+]
+
+
+def _messages(count: int, sessions: int, seed: int = 1):
+    rnd = random.Random(seed)
+    session_ids = [uuid.uuid4() for _ in range(sessions)]
+    return session_ids, [
+        MessageData(
+            session_id=session_ids[i % sessions],
+            content=rnd.choice(TEMPLATES).format(
+                order=f"A-{rnd.randrange(1_000_000)}", product=rnd.choice(PRODUCTS)
+            ),
+        )
+        for i in range(count)
+    ]
+
+
+def _query_ms(query: str, session_ids=None, repeat: int = 5) -> dict:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _, total = SearchIndex.search(query, session_ids)
+    return {"ms": (time.perf_counter() - start) / repeat * 1e3, "matches": total}
+
+
+def run(quick: bool = False) -> dict:
+    count = 100_000 if quick else 1_000_000
+    session_ids, messages = _messages(count, sessions=10_000)
+    SearchIndex.clear()
+    start = time.perf_counter()
+    for i in range(0, count, 1000):
+        SearchIndex.add_many(messages[i : i + 1000])
+    index_seconds = time.perf_counter() - start
+
+    order = next(m.content for m in messages if "A-" in m.content).split("A-")[1].split()[0]
+    results = {
+        "messages": count,
+        "index_us_per_message": index_seconds / count * 1e6,
+        "queries": {
+            "order_number": _query_ms(f"A-{order.rstrip(',')}"),
+            "product": _query_ms("product42"),
+            "phrase": _query_ms('"charged twice for product42"'),
+            "common_term": _query_ms("order"),
+            "common_term_in_session": _query_ms("order", {session_ids[0]}),
+        },
+    }
+    SearchIndex.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
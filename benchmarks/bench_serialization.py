@@ -0,0 +1,85 @@
+"""
+Encoding a large chat history as a JSON response.
+
+Run with ``python -m benchmarks.bench_serialization``. The full history of one
+session is rendered as the body of ``GET /chats/{session_id}/history/``:
+``encoder`` runs the messages through ``jsonable_encoder`` into a
+``JSONResponse`` as the route did before, ``cold`` is the route with an empty
+``MessageJsonCache`` and ``warm`` the route with every message already cached,
+as for repeated polling of the same history.
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from chat.api.api import chat_facade, get_chat_history
+from chat.api.serialization import MessageJsonCache
+from chat.models.message_data import MessageData
+from chat.repository.repository import Repository
+
+
+def _encoder_body(session_id: uuid.UUID) -> bytes:
+    page = chat_facade.get_chat_history_page(session_id)
+    content = {
+        "messages": page.messages,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    }
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def _route_body(session_id: uuid.UUID) -> bytes:
+    return get_chat_history(session_id, limit=None).body
+
+
+def _cold_body(session_id: uuid.UUID) -> bytes:
+    MessageJsonCache.clear()
+    return _route_body(session_id)
+
+
+def _measure(func, session_id: uuid.UUID, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(session_id)
+        samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    return {"ms": median * 1e3, "bytes_per_s": len(body) / median}
+
+
+def run(quick: bool = False) -> dict:
+    count = 2_000 if quick else 10_000
+    repeat = 5 if quick else 20
+    logging.disable(logging.INFO)
+    try:
+        Repository.clear()
+        session_id = uuid.uuid4()
+        Repository.add_messages(
+            MessageData(session_id=session_id, participant_id=123, content=f"Message number {i}")
+            for i in range(count)
+        )
+        body = _encoder_body(session_id)
+        assert json.loads(_cold_body(session_id)) == json.loads(body)
+        results = {"messages": count, "body_bytes": len(body)}
+        results["encoder"] = _measure(_encoder_body, session_id, repeat)
+        results["cold"] = _measure(_cold_body, session_id, repeat)
+        _route_body(session_id)
+        results["warm"] = _measure(_route_body, session_id, repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+        MessageJsonCache.clear()
+        Repository.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,73 @@
+"""
+``ChatService.send_message`` throughput with and without strategies.
+
+Run with ``python -m benchmarks.bench_service``. Messages are sent one at a
+time into sessions without strategies, with the spam and profanity filters,
+and with the filters plus a cached translation, against the in-memory backend.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from chat.models.enums import ParticipantType
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.chat_service import ChatService
+from chat.services.search_index import SearchIndex
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+from chat.strategies.translation_strategy import TranslationStrategy
+
+SESSIONS = 50
+CONTENT = "Hello, I was charged twice for my last order, could you check?"
+
+
+def _strategies(label: str) -> list:
+    if label == "no_strategies":
+        return []
+    filters = [SpamFilterStrategy(), ProfanityFilterStrategy()]
+    if label == "filters":
+        return filters
+    return filters + [TranslationStrategy(target_language="French")]
+
+
+async def _throughput(label: str, count: int) -> float:
+    sessions = [
+        await ChatService.initiate_chat_session(1, "Bench", _strategies(label))
+        for _ in range(SESSIONS)
+    ]
+    start = time.perf_counter()
+    for i in range(count):
+        await ChatService.send_message(
+            sessions[i % SESSIONS], 1, ParticipantType.CUSTOMER, CONTENT
+        )
+    return count / (time.perf_counter() - start)
+
+
+def run(quick: bool = False) -> dict:
+    count = 5_000 if quick else 50_000
+    previous = Repository.backend()
+    logging.disable(logging.INFO)
+    results = {"messages": count}
+    try:
+        for label in ("no_strategies", "filters", "filters_and_translation"):
+            Repository.configure(InMemoryRepository())
+            SearchIndex.clear()
+            AgentScheduler.clear()
+            results[f"{label}_msgs_per_s"] = asyncio.run(_throughput(label, count))
+    finally:
+        logging.disable(logging.NOTSET)
+        Repository.configure(previous)
+        SearchIndex.clear()
+        AgentScheduler.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
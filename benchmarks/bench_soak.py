@@ -0,0 +1,153 @@
+"""
+Resident memory of the in-memory backend over a simulated week of traffic.
+
+Run with ``python -m benchmarks.bench_soak``. Time is simulated: every step
+of five minutes starts new sessions, each of which exchanges messages for a
+few steps and then goes quiet, and ``SessionSweeper.sweep`` runs with its
+clock set to the simulated time. Every session has a customer of its own,
+gets replies from one of ``AGENTS`` agents and one in ``TICKET_EVERY``
+opens a ticket. At the end of every simulated day the number of sessions,
+archives, tickets and indexed messages still held, and the number of
+allocated Python objects, are recorded. ``swept`` closes idle
+sessions and evicts them a day after they ended, so its figures level off
+after the first day; ``closed_only`` closes them without evicting, which is
+how memory grew before.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.enums import ParticipantType
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.chat_service import ChatService
+from chat.services.search_index import SearchIndex
+from chat.services.session_sweeper import SessionSweeper
+
+STEP = timedelta(minutes=5)
+STEPS_PER_DAY = 288
+CONTENT = "Hello, I was charged twice for my last order, could you check?"
+REPLY = "Sorry about that, I am looking into it."
+AGENTS = 50
+TICKET_EVERY = 5
+
+
+def _resident(backend: InMemoryRepository) -> dict:
+    gc.collect()
+    return {
+        "sessions": len(backend.chat_sessions),
+        "archives": len(backend.archives),
+        "tickets": len(backend.support_tickets),
+        "indexed_messages": SearchIndex.indexed_count(),
+        "allocated_blocks": sys.getallocatedblocks(),
+    }
+
+
+async def _simulate(days: int, sessions_per_step: int, retention_seconds: float) -> dict:
+    backend = InMemoryRepository()
+    Repository.configure(backend)
+    SearchIndex.clear()
+    AgentScheduler.clear()
+    random.seed(1)
+    now = datetime(2024, 1, 1)
+    SessionSweeper.clock = lambda: now
+    SessionSweeper.idle_seconds = 1800.0
+    SessionSweeper.retention_seconds = retention_seconds
+
+    # Session id -> (customer id, agent id, steps it keeps sending messages for).
+    active = {}
+    customers = 0
+    daily = []
+    start = time.perf_counter()
+    for step in range(1, days * STEPS_PER_DAY + 1):
+        now += STEP
+        for _ in range(sessions_per_step):
+            customers += 1
+            customer_id = 1_000_000 + customers
+            agent_id = random.randrange(AGENTS)
+            session = ChatSessionData(
+                session_id=uuid.uuid4(),
+                customer_id=customer_id,
+                topic="Billing",
+                support_agent_id=agent_id,
+                last_activity=now,
+            )
+            Repository.add_chat_session(session)
+            if customers % TICKET_EVERY == 0:
+                Repository.add_support_ticket(
+                    SupportTicketData(agent_id, session.session_id, "Refund")
+                )
+            active[session.session_id] = (customer_id, agent_id, random.randint(1, 6))
+        messages = []
+        for session_id, (customer_id, agent_id, steps) in list(active.items()):
+            messages.append(
+                MessageData(
+                    participant_id=customer_id,
+                    participant_type=ParticipantType.CUSTOMER,
+                    content=CONTENT,
+                    session_id=session_id,
+                    timestamp=now,
+                )
+            )
+            messages.append(
+                MessageData(
+                    participant_id=agent_id,
+                    participant_type=ParticipantType.AGENT,
+                    content=REPLY,
+                    session_id=session_id,
+                    timestamp=now + timedelta(seconds=1),
+                )
+            )
+            if steps == 1:
+                del active[session_id]
+            else:
+                active[session_id] = (customer_id, agent_id, steps - 1)
+        await ChatService.send_messages(messages)
+        await SessionSweeper.sweep()
+        if step % STEPS_PER_DAY == 0:
+            daily.append(_resident(backend))
+    return {"seconds": time.perf_counter() - start, "daily": daily}
+
+
+def run(quick: bool = False) -> dict:
+    days, sessions_per_step = (3, 2) if quick else (7, 10)
+    previous = Repository.backend()
+    sweeper = (
+        SessionSweeper.clock,
+        SessionSweeper.idle_seconds,
+        SessionSweeper.retention_seconds,
+    )
+    logging.disable(logging.INFO)
+    results = {"days": days, "sessions_per_day": sessions_per_step * STEPS_PER_DAY}
+    try:
+        results["swept"] = asyncio.run(_simulate(days, sessions_per_step, 86400.0))
+        results["closed_only"] = asyncio.run(_simulate(days, sessions_per_step, 0))
+    finally:
+        logging.disable(logging.NOTSET)
+        (
+            SessionSweeper.clock,
+            SessionSweeper.idle_seconds,
+            SessionSweeper.retention_seconds,
+        ) = sweeper
+        Repository.configure(previous)
+        SearchIndex.clear()
+        AgentScheduler.clear()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
@@ -0,0 +1,67 @@
+"""
+Backend calls and wall time saved by the translation cache.
+
+Run with ``python -m benchmarks.bench_translation``. Agents' messages are
+mostly canned replies with some unique text; they are translated from a
+thread pool, as with a ``THREAD`` execution policy, against a stub backend
+with artificial latency, once without and once with the cache.
+"""
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chat.models.message_data import MessageData
+from chat.strategies.translation_strategy import StubTranslator, TranslationStrategy
+from chat.utils.translation_cache import TranslationCache
+
+CANNED_REPLIES = [
+    "Could you clear your cookies and log in again?",
+    "Thanks for reaching out, let me check that for you.",
+    "Is there anything else I can help you with?",
+    "I have forwarded your request to our billing team.",
+    "Please restart the application and try again.",
+]
+
+
+def _contents(count: int, unique_share: float, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    return [
+        f"Order {i} has shipped." if rnd.random() < unique_share else rnd.choice(CANNED_REPLIES)
+        for i in range(count)
+    ]
+
+
+def _translate_all(strategy: TranslationStrategy, contents: list, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda content: strategy.process(MessageData(content=content)), contents))
+    return time.perf_counter() - start
+
+
+def run(quick: bool = False) -> dict:
+    count = 500 if quick else 5_000
+    latency = 0.002
+    workers = 16
+    contents = _contents(count, unique_share=0.1)
+
+    results = {"messages": count, "latency_ms": latency * 1e3, "workers": workers}
+    for label, cache in (("uncached", None), ("cached", TranslationCache())):
+        translator = StubTranslator(latency=latency)
+        strategy = TranslationStrategy("French", translator, cache)
+        results[label] = {
+            "seconds": _translate_all(strategy, contents, workers),
+            "backend_calls": translator.calls,
+        }
+        if cache is not None:
+            results[label]["hit_rate"] = cache.stats.hit_rate
+            results[label]["coalesced"] = cache.stats.coalesced
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick), indent=2))
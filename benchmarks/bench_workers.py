@@ -0,0 +1,118 @@
+"""
+Message throughput of several worker processes sharing the Redis backend.
+
+Run with ``python -m benchmarks.bench_workers``. A stand-in RESP server is
+started in a process of its own, unless ``--url`` points to a real Redis.
+For every worker count, that many processes each send messages through
+``ChatService.send_message`` into sessions of their own, as API workers
+behind one load balancer would; ``messages_per_s`` is the combined rate
+from the first worker starting to the last one finishing. Workers and
+server compete for the same cores, so the scaling seen depends on
+``cpu_count``; ``memory_single_process`` is one process on the in-memory
+backend, which cannot be shared at all.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.enums import ParticipantType
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.redis_repository import RedisRepository
+from chat.repository.repository import Repository
+from chat.services.chat_service import ChatService
+
+SESSIONS = 10
+WORKER_COUNTS = (1, 2, 4)
+CONTENT = "Hello, I was charged twice for my last order, could you check?"
+
+
+def _send(count: int) -> tuple:
+    sessions = [ChatSessionData(uuid.uuid4(), 1, "Bench") for _ in range(SESSIONS)]
+    for session in sessions:
+        Repository.add_chat_session(session)
+
+    async def send():
+        for i in range(count):
+            await ChatService.send_message(
+                sessions[i % SESSIONS].session_id, 1, ParticipantType.CUSTOMER, CONTENT
+            )
+
+    start = time.time()
+    asyncio.run(send())
+    return start, time.time()
+
+
+def _worker(url: str, prefix: str, count: int, barrier, results) -> None:
+    logging.disable(logging.INFO)
+    Repository.configure(RedisRepository(url, prefix))
+    barrier.wait()
+    results.put(_send(count))
+
+
+def _measure(url: str, workers: int, count: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    prefix = f"bench:{uuid.uuid4().hex}:"
+    processes = [
+        context.Process(target=_worker, args=(url, prefix, count, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    spans = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    RedisRepository(url, prefix).clear()
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+    return {"messages_per_s": workers * count / elapsed}
+
+
+def _start_server() -> tuple:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "chat.repository.resp_server", "--port", "0"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    port = int(server.stdout.readline())
+    return server, f"redis://127.0.0.1:{port}/0"
+
+
+def run(quick: bool = False, url: str = None) -> dict:
+    count = 500 if quick else 3000
+    results = {"messages_per_worker": count, "cpu_count": os.cpu_count()}
+    server = None
+    if url is None:
+        server, url = _start_server()
+    previous = Repository.backend()
+    logging.disable(logging.INFO)
+    try:
+        Repository.configure(InMemoryRepository())
+        start, end = _send(count)
+        results["memory_single_process"] = {"messages_per_s": count / (end - start)}
+        for workers in WORKER_COUNTS:
+            results[f"redis_{workers}_workers"] = _measure(url, workers, count)
+    finally:
+        logging.disable(logging.NOTSET)
+        Repository.configure(previous)
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    parser.add_argument("--url", help="a Redis server to use instead of the stand-in")
+    args = parser.parse_args()
+    print(json.dumps(run(quick=args.quick, url=args.url), indent=2))
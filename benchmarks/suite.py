@@ -0,0 +1,180 @@
+"""
+Run every benchmark and compare the results with a stored baseline.
+
+Run with ``python -m benchmarks``. Each ``bench_*`` module runs in a fresh
+interpreter, so no benchmark inherits the repository, indexes or caches of
+another, and the combined results are written to one JSON file. Given a
+``--baseline`` from an earlier run, every timing and throughput metric is
+compared with it and the command fails if one got worse by more than the
+tolerance. Timings on a busy machine are noisy; ``--repeat`` runs every
+benchmark several times and keeps the best value of each metric.
+"""
+import argparse
+import json
+import pkgutil
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import benchmarks
+
+HIGHER_IS_BETTER = ("_per_s", "hit_rate")
+LOWER_IS_BETTER = ("_us", "_ms", "_s", "seconds", "_bytes", "bytes_per_message", "_mb")
+
+
+@dataclass(slots=True)
+class Comparison:
+    metric: str
+    baseline: float
+    current: float
+    # How many times worse the current value is; below 1.0 it improved.
+    slowdown: float
+    regressed: bool
+
+
+def discover() -> List[str]:
+    return sorted(
+        module.name
+        for module in pkgutil.iter_modules(benchmarks.__path__)
+        if module.name.startswith("bench_")
+    )
+
+
+def run_benchmark(name: str, quick: bool = False) -> dict:
+    """Run one benchmark module in a subprocess and return its results."""
+    command = [sys.executable, "-m", f"benchmarks.{name}"] + (["--quick"] if quick else [])
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+def best_of(runs: list, key: str = ""):
+    """Merge the results of repeated runs, keeping the best value of every metric."""
+    first = runs[0]
+    if isinstance(first, dict):
+        return {k: best_of([run[k] for run in runs], k) for k in first}
+    if isinstance(first, list):
+        return [best_of(list(items), key) for items in zip(*runs)]
+    if isinstance(first, (int, float)) and not isinstance(first, bool) and direction(key):
+        return max(runs) if direction(key) > 0 else min(runs)
+    return first
+
+
+def run_suite(names: List[str], quick: bool = False, repeat: int = 1) -> dict:
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        runs = [run_benchmark(name, quick) for _ in range(repeat)]
+        failed = [run for run in runs if "error" in run]
+        results[name] = failed[0] if failed else best_of(runs)
+        status = "failed" if failed else "done"
+        print(f"{name}: {status} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return {
+        "meta": {
+            "quick": quick,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": results,
+    }
+
+
+def direction(key: str) -> int:
+    """Return 1 if higher values of a metric are better, -1 if lower, else 0."""
+    if key.endswith(HIGHER_IS_BETTER):
+        return 1
+    if key.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def metrics(results, prefix: str = "") -> Dict[str, float]:
+    """
+    Flatten nested results into ``path: value`` for the comparable metrics.
+
+    Entries of a list are labelled by their first field, such as
+    ``results[global_messages=1000]``, so runs line up by parameter.
+    """
+    flat: Dict[str, float] = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, (dict, list)):
+                flat.update(metrics(value, path))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                if direction(key):
+                    flat[path] = float(value)
+    elif isinstance(results, list):
+        for index, item in enumerate(results):
+            label = str(index)
+            if isinstance(item, dict) and item:
+                key, value = next(iter(item.items()))
+                if not isinstance(value, (dict, list)) and not direction(key):
+                    label = f"{key}={value}"
+            flat.update(metrics(item, f"{prefix}[{label}]"))
+    return flat
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.25) -> List[Comparison]:
+    """Compare the metrics both runs have; a regression is worse by over ``tolerance``."""
+    before = metrics(baseline["benchmarks"])
+    after = metrics(current["benchmarks"])
+    comparisons = []
+    for metric, old in before.items():
+        new = after.get(metric)
+        if new is None:
+            continue
+        worse, better = (new, old) if direction(metric) < 0 else (old, new)
+        slowdown = worse / better if better else (1.0 if worse == better else float("inf"))
+        comparisons.append(Comparison(metric, old, new, slowdown, slowdown > 1 + tolerance))
+    return comparisons
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("names", nargs="*", help="benchmarks to run, e.g. bench_api; default all")
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="runs per benchmark, keeping the best values"
+    )
+    parser.add_argument("--output", default="benchmark-results.json", help="results file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare with")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%"
+    )
+    args = parser.parse_args(argv)
+
+    names = args.names or discover()
+    unknown = sorted(set(names) - set(discover()))
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    current = run_suite(names, args.quick, max(args.repeat, 1))
+    with open(args.output, "w") as file:
+        json.dump(current, file, indent=2)
+    print(f"Results written to {args.output}")
+    failed = [name for name, result in current["benchmarks"].items() if "error" in result]
+    for name in failed:
+        print(f"FAILED {name}: {current['benchmarks'][name]['error']}")
+    if not args.baseline:
+        return 1 if failed else 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline["meta"].get("quick") != args.quick:
+        print("Warning: the baseline was run with different sizes (--quick).")
+    comparisons = compare(baseline, current, args.tolerance)
+    for comparison in comparisons:
+        marker = "REGRESSION" if comparison.regressed else "ok"
+        print(
+            f"{marker:>10}  {comparison.metric}: {comparison.baseline:.6g} -> "
+            f"{comparison.current:.6g} ({comparison.slowdown:.2f}x)"
+        )
+    regressions = sum(comparison.regressed for comparison in comparisons)
+    print(f"{len(comparisons)} metrics compared, {regressions} regressed.")
+    return 1 if failed or regressions else 0
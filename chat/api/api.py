@@ -1,10 +1,87 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+from typing import List, Optional
+
+import asyncio
+
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uuid
 
 from chat.api.chat_facade import ChatFacade
+from chat.api.metrics_middleware import MetricsMiddleware
+from chat.api.schemas import (
+    AgentResponse,
+    CustomerResponse,
+    HistoryResponse,
+    SearchResponse,
+    SessionListResponse,
+    TicketListResponse,
+)
+from chat.api.serialization import (
+    FastJSONResponse,
+    MessageJsonCache,
+    agent_dict,
+    customer_dict,
+    dumps,
+    messages_json,
+    session_dict,
+    ticket_dict,
+)
+from chat.broker.broker import Broker
+from chat.broker.memory_broker import InMemoryBroker
+from chat.config import settings
+from chat.models.enums import MessageType, ParticipantType, TicketStatus
+from chat.models.message_data import MessageData
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.search_index import SearchIndex
+from chat.services.session_sweeper import SessionSweeper
+from chat.utils.metrics import Metrics
+
+
+def check_workers(workers: int) -> None:
+    """
+    Refuse to start several workers with state that would differ between them.
+
+    Agent loads and the assignment queue are kept per worker, so automatic
+    assignment would overfill agents; the search index of a worker only
+    learns of other workers' messages through the Redis broker.
+    """
+    if workers <= 1:
+        return
+    if AgentScheduler.enabled:
+        raise RuntimeError(
+            f"Automatic agent assignment cannot run in {workers} workers, as agent loads "
+            "are kept per worker; set CHAT_AUTO_ASSIGN_AGENTS=0 or run one worker."
+        )
+    if isinstance(Broker.backend(), InMemoryBroker):
+        raise RuntimeError(
+            f"Search would only find the messages stored by each of the {workers} workers; "
+            "set CHAT_BROKER=redis or run one worker."
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_workers(settings.workers)
+    # Restore the agents' loads and the queue once per worker, not per facade.
+    if AgentScheduler.enabled:
+        AgentScheduler.rebuild()
+    # Make messages recovered by a persistent backend searchable.
+    SearchIndex.rebuild()
+    # Close idle sessions and evict ended ones while the app is up.
+    sweeper = asyncio.create_task(SessionSweeper.run())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 chat_facade = ChatFacade()
 
 
@@ -19,6 +96,9 @@ class AgentCreateRequest(BaseModel):
     agent_id: int = 456
     name: str = "timo"
     email: str = "timo@helpdesk.com"
+    # Topics the agent is preferred for, and the most sessions it handles at once.
+    skills: List[str] = []
+    max_sessions: Optional[int] = None
 
 
 class ChatInitiateRequest(BaseModel):
@@ -32,6 +112,19 @@ class MessageSendRequest(BaseModel):
     content: str = "Hi, could you help me? i can not process my Pyaments"
 
 
+class BatchMessage(BaseModel):
+    session_id: uuid.UUID
+    participant_id: int | str = 123
+    participant_type: ParticipantType = ParticipantType.CUSTOMER
+    content: str = "Hi, could you help me? i can not process my Pyaments"
+    message_type: MessageType = MessageType.TEXT
+    timestamp: Optional[datetime] = None
+
+
+class MessageBatchRequest(BaseModel):
+    messages: List[BatchMessage]
+
+
 @app.post("/agents/")
 def create_agent(agent: AgentCreateRequest):
     try:
@@ -39,6 +132,8 @@ def create_agent(agent: AgentCreateRequest):
             agent_id=agent.agent_id,
             name=agent.name,
             email=agent.email,
+            skills=agent.skills,
+            max_sessions=agent.max_sessions,
         )
         return {"message": "Agent created successfully"}
     except Exception as e:
@@ -83,6 +178,18 @@ async def assign_agent_to_session(session_id: uuid.UUID, agent_id: int = 456):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/chats/{session_id}/end")
+async def end_chat(session_id: uuid.UUID):
+    """
+    End a chat session. Its history stays readable, but it accepts no new messages.
+    """
+    try:
+        await chat_facade.end_chat(session_id)
+        return {"message": f"Chat session {session_id} ended."}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/chats/{session_id}/messages/customer/")
 async def customer_send_message(session_id: uuid.UUID, request: MessageSendRequest):
     try:
@@ -114,32 +221,225 @@ async def agent_send_message(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/chats/{session_id}/history/")
-def get_chat_history(session_id: uuid.UUID):
+@app.post("/chats/messages:batch")
+async def send_messages_batch(request: MessageBatchRequest):
+    """
+    Ingest many messages at once. The batch is stored as a whole or not at all.
+
+    `timestamp` may be given to keep the original send time of imported messages.
+    It must not be older than the session's last message nor in the future; one
+    with a time zone, e.g. a trailing `Z`, is converted to the server's local time.
+    """
+    try:
+        messages = []
+        for item in request.messages:
+            fields = item.model_dump(exclude_none=True)
+            messages.append(MessageData(**fields))
+        message_ids = await chat_facade.send_messages(messages)
+        return {
+            "message": f"{len(message_ids)} messages sent successfully",
+            "message_ids": [str(message_id) for message_id in message_ids],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/chats/{session_id}/history/", response_model=HistoryResponse)
+def get_chat_history(
+    session_id: uuid.UUID,
+    limit: Optional[int] = Query(default=None, ge=1),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since: Optional[datetime] = None,
+):
+    """
+    Get the message history of a chat session.
+
+    Poll for new messages by passing the returned `next_cursor` as `after`,
+    or page backwards through older messages with `prev_cursor` as `before`.
+    """
+    try:
+        page = chat_facade.get_chat_history_page(
+            session_id, limit=limit, before=before, after=after, since=since
+        )
+        content = b"".join(
+            (
+                b'{"messages":',
+                messages_json(page.messages),
+                b',"next_cursor":',
+                dumps(page.next_cursor),
+                b',"prev_cursor":',
+                dumps(page.prev_cursor),
+                b"}",
+            )
+        )
+        return FastJSONResponse(content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/search", response_model=SearchResponse)
+def search_messages(
+    q: str = Query(..., min_length=1),
+    session_id: Optional[uuid.UUID] = None,
+    customer_id: Optional[int] = None,
+    agent_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Search messages by words and "quoted phrases", best matches first.
+
+    Narrow the search with ``session_id``, ``customer_id`` or ``agent_id`` and
+    page through the results with ``offset``, passing ``next_offset``.
+    """
+    try:
+        page = chat_facade.search(q, session_id, customer_id, agent_id, limit, offset)
+        encoded = MessageJsonCache.encode_many(hit.message for hit in page.hits)
+        hits = b",".join(
+            b'{"message":' + message + b',"score":' + dumps(hit.score) + b"}"
+            for hit, message in zip(page.hits, encoded)
+        )
+        content = b"".join(
+            (
+                b'{"hits":[',
+                hits,
+                b'],"total":',
+                dumps(page.total),
+                b',"next_offset":',
+                dumps(page.next_offset),
+                b"}",
+            )
+        )
+        return FastJSONResponse(content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/tickets", response_model=TicketListResponse)
+def list_tickets(
+    status: Optional[TicketStatus] = None,
+    agent_id: Optional[int] = None,
+    session_id: Optional[uuid.UUID] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """
+    List support tickets, optionally only those with a status, of an agent or
+    of a session. Page through them with ``offset``, passing ``next_offset``.
+    """
+    try:
+        page = chat_facade.list_tickets(status, agent_id, session_id, limit, offset)
+        return FastJSONResponse(
+            {
+                "tickets": [ticket_dict(ticket) for ticket in page.tickets],
+                "total": page.total,
+                "next_offset": page.next_offset,
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/tickets/count")
+def count_tickets(
+    status: Optional[TicketStatus] = None,
+    agent_id: Optional[int] = None,
+    session_id: Optional[uuid.UUID] = None,
+):
+    """Count the support tickets matching the same filters as ``/tickets``."""
     try:
-        history = chat_facade.get_chat_history(session_id)
-        return {"messages": history}
+        return {"count": chat_facade.count_tickets(status, agent_id, session_id)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/customers/")
+@app.get("/export", response_class=StreamingResponse)
+def export_sessions(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    agent_id: Optional[int] = None,
+    gzip: bool = False,
+):
+    """
+    Stream all sessions with their messages as NDJSON, one session per line.
+
+    ``since`` and ``until`` keep only the messages sent in that time range and
+    the sessions that have any; ``agent_id`` the sessions handled by an agent.
+    With ``gzip=true`` the stream is sent gzip-encoded.
+    """
+    try:
+        chunks = chat_facade.export_sessions(since, until, agent_id, compress=gzip)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"Content-Encoding": "gzip"} if gzip else None
+    return StreamingResponse(chunks, media_type="application/x-ndjson", headers=headers)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Timings and counters in the Prometheus text format. Disabled with CHAT_METRICS=0.
+    """
+    if not Metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return PlainTextResponse(
+        Metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.websocket("/ws/chats/{session_id}")
+async def chat_updates(websocket: WebSocket, session_id: uuid.UUID):
+    """
+    Push every new message of a chat session to the connected client.
+
+    Messages are still sent through the REST routes. A client that cannot keep
+    up is disconnected with code 1013 and should resume from the history.
+    """
+    try:
+        subscription = chat_facade.subscribe(session_id)
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def forward_messages():
+        while True:
+            message = await subscription.get()
+            if message is None:
+                await websocket.close(code=1013)
+                return
+            await websocket.send_text(MessageJsonCache.encode(message).decode())
+
+    forwarder = asyncio.create_task(forward_messages())
+    try:
+        # Incoming frames are ignored; receiving only detects the disconnect.
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except WebSocketDisconnect:
+        pass
+    finally:
+        forwarder.cancel()
+        chat_facade.unsubscribe(subscription)
+
+
+@app.get("/customers/", response_model=List[CustomerResponse])
 def list_customers():
-    return chat_facade.list_customers()
+    return FastJSONResponse([customer_dict(customer) for customer in chat_facade.list_customers()])
 
 
-@app.get("/agents/")
+@app.get("/agents/", response_model=List[AgentResponse])
 def list_agents():
-    return chat_facade.list_agents()
+    return FastJSONResponse([agent_dict(agent) for agent in chat_facade.list_agents()])
 
 
-@app.get("/sessions/")
+@app.get("/sessions/", response_model=SessionListResponse)
 def get_all_sessions():
     """
-    Endpoint to get all chat sessions data.
+    Endpoint to get all chat sessions data. Strategies are listed by class name.
     """
     try:
         sessions = chat_facade.list_sessions()
-        return {"sessions": sessions}
+        return FastJSONResponse({"sessions": [session_dict(session) for session in sessions]})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,11 +1,23 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Iterator, List, Optional
 import uuid
+import zlib
 
+from chat.api.serialization import dumps, message_dict, session_dict
 from chat.models.customer_data import CustomerData
-from chat.models.enums import ParticipantType
+from chat.models.enums import ParticipantType, TicketStatus
+from chat.models.history_page import HistoryPage
+from chat.models.message_data import MessageData
+from chat.models.search_page import SearchHit, SearchPage
 from chat.models.support_agent_data import SupportAgentData
+from chat.models.ticket_page import TicketPage
 from chat.participants.chat_participant_factory import ChatParticipantFactory
+from chat.participants.participant_cache import ParticipantCache
 from chat.repository.repository import Repository
+from chat.services.chat_service import ChatService
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.message_hub import MessageHub, Subscription
+from chat.services.search_index import SearchIndex
 from chat.strategies.message_processing_strategy import MessageProcessingStrategy
 from chat.utils.logging import logging
 
@@ -18,12 +30,22 @@ class ChatFacade:
     def create_customer(self, customer_id: int, name: str, email: str):
         customer_data = CustomerData(customer_id, name, email)
         Repository.add_customer(customer_data)
-        logging.info(f"Customer {name} created with ID {customer_id}.")
+        ParticipantCache.invalidate(ParticipantType.CUSTOMER, customer_id)
+        logging.info("Customer %s created with ID %s.", name, customer_id)
 
-    def create_agent(self, agent_id: int, name: str, email: str):
+    def create_agent(
+        self,
+        agent_id: int,
+        name: str,
+        email: str,
+        skills: Optional[List[str]] = None,
+        max_sessions: Optional[int] = None,
+    ):
         agent_data = SupportAgentData(agent_id, name, email)
         Repository.add_agent(agent_data)
-        logging.info(f"Agent {name} created with ID {agent_id}.")
+        ParticipantCache.invalidate(ParticipantType.AGENT, agent_id)
+        AgentScheduler.register_agent(agent_id, skills or (), max_sessions)
+        logging.info("Agent %s created with ID %s.", name, agent_id)
 
     async def initiate_chat(
         self,
@@ -31,39 +53,37 @@ class ChatFacade:
         topic: str,
         strategies: Optional[List[MessageProcessingStrategy]] = None,
     ) -> uuid.UUID:
-        customer = ChatParticipantFactory.create_participant(
-            participant_type=ParticipantType.CUSTOMER, customer_id=customer_id
-        )
+        customer = ParticipantCache.get(ParticipantType.CUSTOMER, customer_id)
         session_id = await customer.initiate_chat_session(topic, strategies) # type: ignore
         logging.info(
-            f"Chat session {session_id} initiated for customer {customer_id} on topic '{topic}'."
+            "Chat session %s initiated for customer %s on topic '%s'.",
+            session_id,
+            customer_id,
+            topic,
         )
         return session_id
 
     async def customer_send_message(
         self, session_id: uuid.UUID, customer_id: int, content: str
     ):
-        customer = ChatParticipantFactory.create_participant(
-            participant_type=ParticipantType.CUSTOMER, customer_id=customer_id
-        )
+        customer = ParticipantCache.get(ParticipantType.CUSTOMER, customer_id)
         await customer.send_message(session_id, content)
-        logging.info(f"Customer {customer_id} sent message in session {session_id}.")
+        logging.debug("Customer %s sent a message in session %s.", customer_id, session_id)
 
     async def agent_handle_session(self, session_id: uuid.UUID, agent_id: int):
-        agent = ChatParticipantFactory.create_participant(
-            participant_type=ParticipantType.AGENT, agent_id=agent_id
-        )
+        agent = ParticipantCache.get(ParticipantType.AGENT, agent_id)
         await agent.handle_chat_session(session_id) # type: ignore
-        logging.info(f"Agent {agent_id} assigned to session {session_id}.")
+        logging.info("Agent %s assigned to session %s.", agent_id, session_id)
+
+    async def end_chat(self, session_id: uuid.UUID):
+        await ChatService.end_chat_session(session_id)
 
     async def agent_send_message(
         self, session_id: uuid.UUID, agent_id: int, content: str
     ):
-        agent = ChatParticipantFactory.create_participant(
-            participant_type=ParticipantType.AGENT, agent_id=agent_id
-        )
+        agent = ParticipantCache.get(ParticipantType.AGENT, agent_id)
         await agent.send_message(session_id, content)
-        logging.info(f"Agent {agent_id} sent message in session {session_id}.")
+        logging.debug("Agent %s sent a message in session %s.", agent_id, session_id)
 
     async def chatbot_send_message(
         self, session_id: uuid.UUID, bot_id: str, name: str, content: str
@@ -72,47 +92,307 @@ class ChatFacade:
             participant_type=ParticipantType.BOT, bot_id=bot_id, name=name
         )
         await chatbot.send_message(session_id, content)
-        logging.info(f"Chatbot {name} sent message in session {session_id}.")
+        logging.debug("Chatbot %s sent a message in session %s.", name, session_id)
+
+    async def send_messages(self, messages: List[MessageData]) -> List[uuid.UUID]:
+        """
+        Ingest a batch of messages, e.g. from an integration or a migration.
+
+        Customers and agents are checked once per distinct sender; the batch is
+        then stored as a whole by ``ChatService.send_messages``. Timestamps
+        with a time zone are converted to the naive local times stored.
+        """
+        checked = set()
+        for message in messages:
+            message.timestamp = self._local_time(message.timestamp)
+            sender = (message.participant_type, message.participant_id)
+            if sender in checked:
+                continue
+            if message.participant_type == ParticipantType.CUSTOMER:
+                if Repository.get_customer(message.participant_id) is None:  # type: ignore
+                    raise ValueError("Customer does not exist.")
+            elif message.participant_type == ParticipantType.AGENT:
+                if Repository.get_agent(message.participant_id) is None:  # type: ignore
+                    raise ValueError("Agent does not exist.")
+            checked.add(sender)
+
+        processed = await ChatService.send_messages(messages)
+        logging.info("Batch of %d messages ingested.", len(processed))
+        return [message.message_id for message in processed]
 
     async def create_support_ticket(
         self, agent_id: int, session_id: uuid.UUID, issue: str
     ) -> uuid.UUID:
-        agent = ChatParticipantFactory.create_participant(
-            participant_type=ParticipantType.AGENT, agent_id=agent_id
-        )
+        agent = ParticipantCache.get(ParticipantType.AGENT, agent_id)
         ticket_id = await agent.create_support_ticket(session_id, issue) # type: ignore
         logging.info(
-            f"Support ticket {ticket_id} created by agent {agent_id} for session {session_id}."
+            "Support ticket %s created by agent %s for session %s.", ticket_id, agent_id, session_id
         )
         return ticket_id
 
     async def resolve_support_ticket(self, agent_id: int, ticket_id: uuid.UUID):
-        agent = ChatParticipantFactory.create_participant(
-            participant_type=ParticipantType.AGENT, agent_id=agent_id
-        )
+        agent = ParticipantCache.get(ParticipantType.AGENT, agent_id)
         await agent.resolve_ticket(ticket_id) # type: ignore
-        logging.info(f"Support ticket {ticket_id} resolved by agent {agent_id}.")
+        logging.info("Support ticket %s resolved by agent %s.", ticket_id, agent_id)
+
+    def list_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> TicketPage:
+        """Return one page of the tickets matching all the given filters."""
+        if limit < 1 or offset < 0:
+            raise ValueError("limit must be positive and offset non-negative.")
+        total = Repository.count_tickets(status, agent_id, session_id)
+        tickets = Repository.list_tickets(status, agent_id, session_id, offset, offset + limit)
+        next_offset = offset + limit if offset + limit < total else None
+        return TicketPage(tickets=tickets, total=total, next_offset=next_offset)
+
+    def count_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+    ) -> int:
+        return Repository.count_tickets(status, agent_id, session_id)
+
+    def get_chat_history(
+        self,
+        session_id: uuid.UUID,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> List:
+        return self.get_chat_history_page(
+            session_id, limit=limit, before=before, after=after, since=since
+        ).messages
+
+    def get_chat_history_page(
+        self,
+        session_id: uuid.UUID,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> HistoryPage:
+        """
+        Return a page of the session history in send order.
+
+        Cursors are the ``next_cursor``/``prev_cursor`` tokens of an earlier page.
+        ``after`` returns the messages following a cursor, ``before`` the ones
+        preceding it and ``since`` only the messages sent after that time. With
+        ``limit`` the page is cut from the start, or from the end when only
+        ``before`` is given, so older history can be paged backwards.
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer.")
+
+        # Messages are kept in send order by the per-session index, so no
+        # scan or sort over the whole message table is needed here.
+        total = Repository.count_session_messages(session_id)
+        start = self._parse_cursor(after, total) if after is not None else 0
+        stop = self._parse_cursor(before, total) if before is not None else total
+        if since is not None:
+            since = self._local_time(since)
+            start = max(start, Repository.session_position_after(session_id, since))
+
+        if limit is not None and stop - start > limit:
+            if before is not None and after is None:
+                start = stop - limit
+            else:
+                stop = start + limit
+
+        stop = max(start, stop)
+        # A poll with nothing new gets an empty page without touching the store.
+        messages = (
+            Repository.get_session_messages(session_id, start, stop)
+            if start < stop
+            else []
+        )
+        return HistoryPage(
+            messages=messages,
+            next_cursor=str(stop),
+            prev_cursor=str(start) if start > 0 else None,
+        )
+
+    @staticmethod
+    def _local_time(value: datetime) -> datetime:
+        # Stored timestamps are naive local times.
+        if value.tzinfo is not None:
+            return value.astimezone().replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def _parse_cursor(cursor: str, total: int) -> int:
+        try:
+            position = int(cursor)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor!r}") from None
+        if position < 0:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        return min(position, total)
+
+    def search(
+        self,
+        query: str,
+        session_id: Optional[uuid.UUID] = None,
+        customer_id: Optional[int] = None,
+        agent_id: Optional[int] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> SearchPage:
+        """
+        Search the content of all messages, best matches first.
+
+        Words must all appear; quoted text must appear as a phrase. The search
+        can be narrowed to one session, or to the sessions of a customer or
+        handled by an agent.
+        """
+        if limit < 1 or offset < 0:
+            raise ValueError("limit must be positive and offset non-negative.")
+        session_ids = None
+        if session_id is not None:
+            session_ids = {session_id}
+        if customer_id is not None or agent_id is not None:
+            scoped = set(Repository.find_chat_session_ids(customer_id, agent_id))
+            session_ids = scoped if session_ids is None else session_ids & scoped
+
+        matches, total = SearchIndex.search(query, session_ids, limit, offset)
+        hits = []
+        for message_id, session_id, score in matches:
+            message = Repository.get_message(message_id, session_id)
+            if message is not None:
+                hits.append(SearchHit(message, score))
+        next_offset = offset + limit if offset + limit < total else None
+        return SearchPage(hits=hits, total=total, next_offset=next_offset)
+
+    def export_sessions(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        agent_id: Optional[int] = None,
+        compress: bool = False,
+        chunk_size: int = 64 * 1024,
+        page_size: int = 500,
+    ) -> Iterator[bytes]:
+        """
+        Export sessions with their messages as NDJSON, in chunks of about ``chunk_size`` bytes.
+
+        Each line is ``{"session": {...}, "messages": [...]}`` in the JSON
+        format of the history and session endpoints. With ``since`` or
+        ``until`` only the messages sent after ``since`` and up to ``until``
+        are included, and sessions without such messages are left out;
+        ``agent_id`` keeps the sessions handled by that agent. Sessions and
+        messages are read ``page_size`` at a time and each chunk is yielded
+        before the next is built, so memory use does not grow with the data.
+        ``compress`` gzips the stream.
+        """
+        if since is not None:
+            since = self._local_time(since)
+        if until is not None:
+            until = self._local_time(until)
+        if since is not None and until is not None and since > until:
+            raise ValueError("since must not be later than until.")
+        if chunk_size < 1 or page_size < 1:
+            raise ValueError("chunk_size and page_size must be positive integers.")
+        chunks = self._export_chunks(since, until, agent_id, chunk_size, page_size)
+        return self._gzip_chunks(chunks) if compress else chunks
+
+    def _export_chunks(
+        self,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        agent_id: Optional[int],
+        chunk_size: int,
+        page_size: int,
+    ) -> Iterator[bytes]:
+        parts: List[bytes] = []
+        size = 0
+        sessions = messages = 0
+        filtered = since is not None or until is not None
+        for session in Repository.iter_chat_sessions(page_size):
+            if agent_id is not None and session.support_agent_id != agent_id:
+                continue
+            # last_activity is never older than the newest message.
+            if since is not None and session.last_activity <= since:
+                continue
+            head = b'{"session":' + dumps(session_dict(session)) + b',"messages":['
+            exported = 0
+            total = Repository.count_session_messages(session.session_id)
+            for position in range(0, total, page_size):
+                page = Repository.get_session_messages(
+                    session.session_id, position, position + page_size
+                )
+                # Every page is filtered: imported messages need not be in
+                # timestamp order, so positions found by time cannot be trusted.
+                if filtered:
+                    page = [
+                        message
+                        for message in page
+                        if (since is None or message.timestamp > since)
+                        and (until is None or message.timestamp <= until)
+                    ]
+                if not page:
+                    continue
+                # Encoded directly: an export would only evict the hot entries
+                # of the message JSON cache.
+                encoded = b",".join(dumps(message_dict(message)) for message in page)
+                encoded = b"," + encoded if exported else head + encoded
+                exported += len(page)
+                parts.append(encoded)
+                size += len(encoded)
+                if size >= chunk_size:
+                    yield b"".join(parts)
+                    parts, size = [], 0
+            if not exported:
+                if filtered:
+                    continue
+                parts.append(head)
+                size += len(head)
+            sessions += 1
+            messages += exported
+            parts.append(b"]}\n")
+            size += 3
+            if size >= chunk_size:
+                yield b"".join(parts)
+                parts, size = [], 0
+        if parts:
+            yield b"".join(parts)
+        logging.info("Exported %d sessions with %d messages.", sessions, messages)
+
+    @staticmethod
+    def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(wbits=31)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def subscribe(self, session_id: uuid.UUID) -> Subscription:
+        """Subscribe to the messages sent in a session from now on."""
+        if Repository.get_chat_session(session_id) is None:
+            raise ValueError("Invalid chat session ID.")
+        return MessageHub.subscribe(session_id)
 
-    def get_chat_history(self, session_id: uuid.UUID) -> List:
-        messages = [
-            message
-            for message in Repository.messages.values()
-            if message.session_id == session_id
-        ]
-        messages.sort(key=lambda x: x.timestamp)
-        return messages
+    def unsubscribe(self, subscription: Subscription):
+        MessageHub.unsubscribe(subscription)
 
     def list_customers(self):
-        return list(Repository.customers.values())
+        return Repository.list_customers()
 
     def list_agents(self):
-        return list(Repository.agents.values())
+        return Repository.list_agents()
 
     def get_customer(self, customer_id: int):
-        return Repository.customers.get(customer_id)
+        return Repository.get_customer(customer_id)
 
     def get_agent(self, agent_id: int):
-        return Repository.agents.get(agent_id)
+        return Repository.get_agent(agent_id)
     
     def list_sessions(self):
-        return list(Repository.chat_sessions.values())
+        return Repository.list_chat_sessions()
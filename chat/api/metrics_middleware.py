@@ -0,0 +1,51 @@
+import time
+
+from chat.utils.metrics import Metrics
+
+REQUEST_SECONDS = Metrics.histogram(
+    "chat_http_request_duration_seconds",
+    "Latency of HTTP requests per route.",
+    ("method", "route"),
+)
+REQUEST_ERRORS = Metrics.counter(
+    "chat_http_errors",
+    "HTTP responses with a 4xx or 5xx status per route.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and counts the failed ones, labelled by route.
+
+    The route label is the path template such as ``/chats/{session_id}/end``,
+    so the number of series stays bounded; requests that match no route are
+    labelled ``unmatched``. Being a plain ASGI middleware, it does not buffer
+    or wrap responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method, path)
+            if status >= 400:
+                REQUEST_ERRORS.inc(method, path, str(status))
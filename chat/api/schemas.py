@@ -0,0 +1,83 @@
+"""
+Response schemas of the API routes that return stored data.
+
+They document the responses in the OpenAPI schema. The routes return
+``FastJSONResponse`` objects built by ``chat.api.serialization``, so FastAPI
+does not validate or re-encode the content against these models.
+"""
+from datetime import datetime
+from typing import List, Optional, Union
+import uuid
+
+from pydantic import BaseModel
+
+from chat.models.enums import MessageType, ParticipantType, SessionStatus, TicketStatus
+
+
+class MessageResponse(BaseModel):
+    message_id: uuid.UUID
+    session_id: uuid.UUID
+    participant_id: Union[int, str]
+    participant_type: ParticipantType
+    content: str
+    timestamp: datetime
+    message_type: MessageType
+
+
+class HistoryResponse(BaseModel):
+    messages: List[MessageResponse]
+    next_cursor: str
+    prev_cursor: Optional[str] = None
+
+
+class SearchHitResponse(BaseModel):
+    message: MessageResponse
+    score: float
+
+
+class SearchResponse(BaseModel):
+    hits: List[SearchHitResponse]
+    total: int
+    next_offset: Optional[int] = None
+
+
+class TicketResponse(BaseModel):
+    agent_id: int
+    session_id: uuid.UUID
+    issue: str
+    ticket_id: uuid.UUID
+    status: TicketStatus
+
+
+class TicketListResponse(BaseModel):
+    tickets: List[TicketResponse]
+    total: int
+    next_offset: Optional[int] = None
+
+
+class CustomerResponse(BaseModel):
+    customer_id: int
+    name: str
+    email: str
+
+
+class AgentResponse(BaseModel):
+    agent_id: int
+    name: str
+    email: str
+
+
+class SessionResponse(BaseModel):
+    session_id: uuid.UUID
+    customer_id: int
+    topic: str
+    support_agent_id: Optional[int] = None
+    # Class names of the session's message processing strategies.
+    strategies: List[str]
+    ended_at: Optional[datetime] = None
+    status: SessionStatus
+    last_activity: datetime
+
+
+class SessionListResponse(BaseModel):
+    sessions: List[SessionResponse]
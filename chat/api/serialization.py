@@ -0,0 +1,159 @@
+"""
+JSON encoding for the API responses that return stored data.
+
+Routes build plain dicts of strings and numbers, or pass pre-encoded bytes,
+to ``FastJSONResponse`` instead of letting FastAPI run every dataclass field
+through ``jsonable_encoder``. Stored messages never change, so
+``MessageJsonCache`` encodes each one once and reuses its bytes in every
+history page, search result and WebSocket frame it appears in. The output is
+the same JSON as before. ``orjson`` is used when installed, the standard
+``json`` module otherwise.
+"""
+from itertools import islice
+from typing import Dict, Iterable, List
+import json
+import threading
+import uuid
+
+from starlette.responses import JSONResponse
+
+from chat.config import settings
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.customer_data import CustomerData
+from chat.models.message_data import MessageData
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.repository import Repository
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    """Encode plain JSON values compactly, like ``JSONResponse`` does."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(
+        value, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSON response whose content is plain values, or JSON bytes sent as they are."""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def message_dict(message: MessageData) -> dict:
+    return {
+        "message_id": str(message.message_id),
+        "session_id": str(message.session_id),
+        "participant_id": message.participant_id,
+        "participant_type": message.participant_type.value,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat(),
+        "message_type": message.message_type.value,
+    }
+
+
+def session_dict(session: ChatSessionData) -> dict:
+    return {
+        "session_id": str(session.session_id),
+        "customer_id": session.customer_id,
+        "topic": session.topic,
+        "support_agent_id": session.support_agent_id,
+        # Strategies are listed by name; the objects are not serializable.
+        "strategies": [type(strategy).__name__ for strategy in session.strategies],
+        "ended_at": None if session.ended_at is None else session.ended_at.isoformat(),
+        "status": session.status.value,
+        "last_activity": session.last_activity.isoformat(),
+    }
+
+
+def customer_dict(customer: CustomerData) -> dict:
+    return {"customer_id": customer.customer_id, "name": customer.name, "email": customer.email}
+
+
+def agent_dict(agent: SupportAgentData) -> dict:
+    return {"agent_id": agent.agent_id, "name": agent.name, "email": agent.email}
+
+
+def ticket_dict(ticket: SupportTicketData) -> dict:
+    return {
+        "agent_id": ticket.agent_id,
+        "session_id": str(ticket.session_id),
+        "issue": ticket.issue,
+        "ticket_id": str(ticket.ticket_id),
+        "status": ticket.status.value,
+    }
+
+
+class MessageJsonCache:
+    """
+    The encoded JSON of recently served messages, by message id.
+
+    Messages are stored after processing and never change, so their bytes
+    stay valid until the repository is reconfigured or cleared. Hits are
+    plain dict reads; beyond ``max_entries`` the oldest entries are evicted,
+    which only costs encoding them again.
+    """
+
+    max_entries = settings.message_json_cache_size
+    _encoded: Dict[uuid.UUID, bytes] = {}
+    _generation = Repository.generation
+    _lock = threading.Lock()
+
+    @classmethod
+    def encode(cls, message: MessageData) -> bytes:
+        return cls.encode_many((message,))[0]
+
+    @classmethod
+    def encode_many(cls, messages: Iterable[MessageData]) -> List[bytes]:
+        generation = Repository.generation
+        encoded = cls._encoded if cls._generation == generation else {}
+        result = []
+        missing = []
+        for message in messages:
+            data = encoded.get(message.message_id)
+            if data is None:
+                data = dumps(message_dict(message))
+                missing.append((message.message_id, data))
+            result.append(data)
+        if missing:
+            cls._store(missing, generation)
+        return result
+
+    @classmethod
+    def _store(cls, entries, generation: int) -> None:
+        with cls._lock:
+            current = Repository.generation
+            if cls._generation != current:
+                cls._encoded.clear()
+                cls._generation = current
+            # Not cached if the repository changed while encoding.
+            if generation != current or cls.max_entries <= 0:
+                return
+            cls._encoded.update(entries)
+            overflow = len(cls._encoded) - cls.max_entries
+            if overflow > 0:
+                for key in list(islice(cls._encoded, overflow)):
+                    del cls._encoded[key]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._encoded.clear()
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls._encoded)
+
+
+def messages_json(messages: Iterable[MessageData]) -> bytes:
+    """Encode messages as a JSON array, from the cache where possible."""
+    return b"[" + b",".join(MessageJsonCache.encode_many(messages)) + b"]"
@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+from chat.models.message_data import MessageData
+
+
+class BaseBroker(ABC):
+    """
+    Message broker interface used by ``Broker``.
+
+    A broker carries stored messages to the ``MessageHub`` of every process
+    serving the app, which hands them to the subscribers of their sessions.
+    Delivery is best effort: a subscriber that misses messages catches up
+    through the history.
+    """
+
+    @abstractmethod
+    def publish(self, messages: Sequence[MessageData]) -> None:
+        """Deliver messages to the subscribers of their sessions, in every process."""
+
+    def close(self) -> None:
+        """Deliver what is still pending and release the resources held by the broker."""
@@ -0,0 +1,58 @@
+from typing import Sequence
+import atexit
+
+from chat.broker.base_broker import BaseBroker
+from chat.broker.memory_broker import InMemoryBroker
+from chat.broker.resp_broker import RespBroker
+from chat.config import Settings, settings
+from chat.models.message_data import MessageData
+
+
+def create_broker(config: Settings) -> BaseBroker:
+    """Build the message broker selected by the settings."""
+    if config.broker_backend == "memory":
+        return InMemoryBroker()
+    if config.broker_backend == "redis":
+        return RespBroker(
+            config.broker_url or config.redis_url,
+            channel=config.broker_channel,
+            batch_size=config.broker_batch_size,
+            flush_interval=config.broker_flush_interval,
+        )
+    raise ValueError(f"Unknown broker backend: {config.broker_backend}")
+
+
+class Broker:
+    """
+    The application-wide access point to the configured message broker.
+
+    ``ChatService`` publishes every stored message here; the broker hands it
+    to the ``MessageHub`` of every process. See ``InMemoryBroker`` and
+    ``RespBroker`` for the available brokers.
+    """
+
+    _backend: BaseBroker
+
+    @classmethod
+    def configure(cls, backend: BaseBroker):
+        cls._backend = backend
+
+    @classmethod
+    def backend(cls) -> BaseBroker:
+        return cls._backend
+
+    @classmethod
+    def publish(cls, message: MessageData):
+        cls._backend.publish((message,))
+
+    @classmethod
+    def publish_many(cls, messages: Sequence[MessageData]):
+        cls._backend.publish(messages)
+
+    @classmethod
+    def close(cls):
+        cls._backend.close()
+
+
+Broker.configure(create_broker(settings))
+atexit.register(Broker.close)
@@ -0,0 +1,13 @@
+from typing import Sequence
+
+from chat.broker.base_broker import BaseBroker
+from chat.models.message_data import MessageData
+from chat.services.message_hub import MessageHub
+
+
+class InMemoryBroker(BaseBroker):
+    """A broker for a single process: messages go straight to its ``MessageHub``."""
+
+    def publish(self, messages: Sequence[MessageData]) -> None:
+        for message in messages:
+            MessageHub.publish(message)
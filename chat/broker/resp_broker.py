@@ -0,0 +1,205 @@
+from typing import List, Optional, Sequence, Tuple
+import struct
+import threading
+import time
+import uuid
+
+from chat.broker.base_broker import BaseBroker
+from chat.models.message_data import MessageData
+from chat.repository import mutation_log
+from chat.repository.resp import RespConnection, parse_url
+from chat.services.message_hub import MessageHub
+from chat.services.search_index import SearchIndex
+from chat.utils.logging import logging
+from chat.utils.metrics import Metrics
+
+DELIVERY_LAG_SECONDS = Metrics.histogram(
+    "chat_broker_delivery_lag_seconds",
+    "Time from publishing a message in another process to handing it to this "
+    "process's subscribers.",
+)
+BATCH_MESSAGES = Metrics.histogram(
+    "chat_broker_batch_messages",
+    "Messages per frame published to the broker.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+PUBLISH_ERRORS = Metrics.counter(
+    "chat_broker_publish_errors",
+    "Messages that could not be sent to the broker and reached local subscribers only.",
+)
+
+# Origin broker and number of messages, then their publish times.
+_HEADER = struct.Struct("<16sI")
+_TIME = struct.Struct("<d")
+# Seconds before the receiver reconnects after losing the server.
+_RECONNECT_DELAY = 1.0
+
+
+def encode_frame(origin: bytes, batch: Sequence[Tuple[float, MessageData]]) -> bytes:
+    parts = [_HEADER.pack(origin, len(batch))]
+    parts += [_TIME.pack(published) for published, _ in batch]
+    parts += [mutation_log.encode_message(message) for _, message in batch]
+    return b"".join(parts)
+
+
+def decode_frame(frame: bytes) -> Tuple[bytes, List[Tuple[float, MessageData]]]:
+    origin, count = _HEADER.unpack_from(frame)
+    times = [
+        _TIME.unpack_from(frame, _HEADER.size + i * _TIME.size)[0] for i in range(count)
+    ]
+    records = frame[_HEADER.size + count * _TIME.size :]
+    messages = [message for _, message in mutation_log.decode_records(records)]
+    return origin, list(zip(times, messages))
+
+
+class RespBroker(BaseBroker):
+    """
+    A broker fanning messages out to every process through Redis pub/sub.
+
+    Messages go to the subscribers of the publishing process right away, and
+    to the other processes through one channel all of them subscribe to.
+    Publishing only queues them: a sender thread takes everything queued
+    since its previous round trip and publishes it as frames of up to
+    ``batch_size`` messages, so a burst costs few round trips while a lone
+    message is sent immediately. ``flush_interval`` optionally waits that
+    many seconds for more messages before sending. A receiver thread hands
+    the messages of other processes to the local ``MessageHub`` and
+    ``SearchIndex`` and records their delivery lag. Messages that cannot be sent are counted and
+    dropped; subscribers catch up through the history.
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://127.0.0.1:6379/0",
+        channel: str = "chat:messages",
+        batch_size: int = 256,
+        flush_interval: float = 0.0,
+    ):
+        self.url = url
+        self.channel = channel.encode()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.origin = uuid.uuid4().bytes
+        self._address = parse_url(url)
+        self._pending: List[Tuple[float, MessageData]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._publisher: Optional[RespConnection] = RespConnection(*self._address)
+        self._subscriber = self._subscribe()
+        self._sender = threading.Thread(target=self._send_loop, name="broker-sender", daemon=True)
+        self._receiver = threading.Thread(
+            target=self._receive_loop, name="broker-receiver", daemon=True
+        )
+        self._sender.start()
+        self._receiver.start()
+
+    def _subscribe(self) -> RespConnection:
+        # The subscriber waits for messages indefinitely.
+        connection = RespConnection(*self._address, timeout=None)
+        connection.execute("SUBSCRIBE", self.channel)
+        return connection
+
+    def publish(self, messages: Sequence[MessageData]) -> None:
+        for message in messages:
+            MessageHub.publish(message)
+        published = time.time()
+        with self._condition:
+            if self._closed:
+                return
+            self._pending.extend((published, message) for message in messages)
+            self._condition.notify()
+
+    def _send_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self.flush_interval > 0 and not self._closed:
+                    self._condition.wait_for(
+                        lambda: len(self._pending) >= self.batch_size or self._closed,
+                        timeout=self.flush_interval,
+                    )
+                pending, self._pending = self._pending, []
+                if not pending and self._closed:
+                    return
+            self._send(pending)
+
+    def _send(self, pending: List[Tuple[float, MessageData]]) -> None:
+        frames = [
+            encode_frame(self.origin, pending[start : start + self.batch_size])
+            for start in range(0, len(pending), self.batch_size)
+        ]
+        try:
+            if self._publisher is None:
+                self._publisher = RespConnection(*self._address)
+            self._publisher.pipeline([("PUBLISH", self.channel, frame) for frame in frames])
+        except OSError:
+            logging.exception("Could not publish %d messages to the broker.", len(pending))
+            if self._publisher is not None:
+                self._publisher.close()
+                self._publisher = None
+            if Metrics.enabled:
+                PUBLISH_ERRORS.inc(amount=len(pending))
+            return
+        if Metrics.enabled:
+            for start in range(0, len(pending), self.batch_size):
+                BATCH_MESSAGES.observe(len(pending[start : start + self.batch_size]))
+
+    def _receive_loop(self) -> None:
+        while not self._closed:
+            try:
+                reply = self._subscriber.read()
+            except (OSError, ValueError):
+                if self._closed:
+                    return
+                logging.warning("Lost the broker connection; reconnecting.")
+                self._reconnect()
+                continue
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                self._deliver(reply[2])
+
+    def _reconnect(self) -> None:
+        self._subscriber.close()
+        while not self._closed:
+            time.sleep(_RECONNECT_DELAY)
+            try:
+                self._subscriber = self._subscribe()
+                return
+            except OSError:
+                continue
+
+    def _deliver(self, frame: bytes) -> None:
+        try:
+            origin, batch = decode_frame(frame)
+        except Exception:
+            # Anything can be published on the channel; the receiver must survive it.
+            logging.warning(
+                "Ignored a malformed frame of %d bytes on the broker channel.",
+                len(frame),
+                exc_info=True,
+            )
+            return
+        if origin == self.origin:
+            # Already delivered locally when published.
+            return
+        for _, message in batch:
+            MessageHub.publish(message)
+        # Stored by another worker, so this worker's search finds them too.
+        SearchIndex.add_many(message for _, message in batch)
+        if Metrics.enabled:
+            now = time.time()
+            for published, _ in batch:
+                DELIVERY_LAG_SECONDS.observe(now - published)
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._sender.join()
+        self._subscriber.shutdown()
+        self._receiver.join()
+        self._subscriber.close()
+        if self._publisher is not None:
+            self._publisher.close()
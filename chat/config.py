@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from typing import Optional
+import os
+
+
+def _flag(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+@dataclass
+class Settings:
+    """
+    Application settings, read from ``CHAT_*`` environment variables.
+
+    ``repository_backend`` selects the storage: ``memory`` (default), ``sqlite``
+    or ``redis``, which several worker processes can share.
+    Setting ``durability_dir`` makes the memory backend log every mutation and
+    snapshot to that directory, so its state survives restarts.
+    """
+
+    repository_backend: str = "memory"
+    sqlite_path: str = "chat.db"
+    redis_url: str = "redis://127.0.0.1:6379/0"
+    redis_prefix: str = "chat:"
+    durability_dir: Optional[str] = None
+    snapshot_interval: int = 100_000
+    wal_fsync: bool = False
+    # How stored messages reach subscribers: ``memory`` within this process,
+    # ``redis`` across all processes sharing the server (redis_url by default).
+    broker_backend: str = "memory"
+    broker_url: Optional[str] = None
+    broker_channel: str = "chat:messages"
+    broker_batch_size: int = 256
+    broker_flush_interval: float = 0.0
+    # Pool sizes for strategies offloaded from the event loop; None picks
+    # the executor's default.
+    strategy_thread_workers: Optional[int] = None
+    strategy_process_workers: Optional[int] = None
+    # Translations cached per process; a TTL of 0 keeps them until evicted.
+    translation_cache_size: int = 10_000
+    translation_cache_ttl: Optional[float] = 3600.0
+    # Automatic assignment of new sessions to the least loaded agent.
+    auto_assign_agents: bool = True
+    agent_max_sessions: int = 5
+    queue_aging_seconds: float = 120.0
+    # Sessions idle this long are closed, and closed sessions are evicted
+    # from memory after the retention period; 0 turns either off.
+    session_idle_seconds: float = 1800.0
+    session_retention_seconds: float = 86400.0
+    session_sweep_interval: float = 60.0
+    session_sweep_batch: int = 100
+    # API worker processes serving the app, as passed to uvicorn or gunicorn
+    # through WEB_CONCURRENCY; checked against the per-worker services.
+    workers: int = 1
+    # Customer and agent handles kept by the facade between calls.
+    participant_cache_size: int = 10_000
+    # Seconds a cached handle is reused before the participant is read again;
+    # 0 keeps handles until they are evicted or invalidated.
+    participant_cache_ttl: float = 60.0
+    # Encoded JSON of messages kept for the history and search responses.
+    message_json_cache_size: int = 100_000
+    # Timings and counters exposed at /metrics.
+    metrics_enabled: bool = True
+    # Logs are written by a background thread, as JSON lines or plain text.
+    log_level: str = "INFO"
+    log_format: str = "json"
+    # Share of stored messages that are logged, and whether with content.
+    log_message_sample_rate: float = 1.0
+    log_message_content: bool = False
+    # Skip the caller, thread and process info of every record, process-wide.
+    log_lean_records: bool = False
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            repository_backend=os.environ.get("CHAT_REPOSITORY_BACKEND", cls.repository_backend),
+            sqlite_path=os.environ.get("CHAT_SQLITE_PATH", cls.sqlite_path),
+            redis_url=os.environ.get("CHAT_REDIS_URL", cls.redis_url),
+            redis_prefix=os.environ.get("CHAT_REDIS_PREFIX", cls.redis_prefix),
+            durability_dir=os.environ.get("CHAT_DURABILITY_DIR") or None,
+            snapshot_interval=int(
+                os.environ.get("CHAT_SNAPSHOT_INTERVAL", cls.snapshot_interval)
+            ),
+            wal_fsync=_flag("CHAT_WAL_FSYNC"),
+            broker_backend=os.environ.get("CHAT_BROKER", cls.broker_backend),
+            broker_url=os.environ.get("CHAT_BROKER_URL") or None,
+            broker_channel=os.environ.get("CHAT_BROKER_CHANNEL", cls.broker_channel),
+            broker_batch_size=int(os.environ.get("CHAT_BROKER_BATCH_SIZE", cls.broker_batch_size)),
+            broker_flush_interval=float(
+                os.environ.get("CHAT_BROKER_FLUSH_INTERVAL", cls.broker_flush_interval)
+            ),
+            strategy_thread_workers=_optional_int("CHAT_STRATEGY_THREAD_WORKERS"),
+            strategy_process_workers=_optional_int("CHAT_STRATEGY_PROCESS_WORKERS"),
+            translation_cache_size=int(
+                os.environ.get("CHAT_TRANSLATION_CACHE_SIZE", cls.translation_cache_size)
+            ),
+            translation_cache_ttl=float(
+                os.environ.get("CHAT_TRANSLATION_CACHE_TTL", cls.translation_cache_ttl)
+            )
+            or None,
+            auto_assign_agents=_flag("CHAT_AUTO_ASSIGN_AGENTS", cls.auto_assign_agents),
+            agent_max_sessions=int(
+                os.environ.get("CHAT_AGENT_MAX_SESSIONS", cls.agent_max_sessions)
+            ),
+            queue_aging_seconds=float(
+                os.environ.get("CHAT_QUEUE_AGING_SECONDS", cls.queue_aging_seconds)
+            ),
+            session_idle_seconds=float(
+                os.environ.get("CHAT_SESSION_IDLE_SECONDS", cls.session_idle_seconds)
+            ),
+            session_retention_seconds=float(
+                os.environ.get("CHAT_SESSION_RETENTION_SECONDS", cls.session_retention_seconds)
+            ),
+            session_sweep_interval=float(
+                os.environ.get("CHAT_SESSION_SWEEP_INTERVAL", cls.session_sweep_interval)
+            ),
+            session_sweep_batch=int(
+                os.environ.get("CHAT_SESSION_SWEEP_BATCH", cls.session_sweep_batch)
+            ),
+            workers=int(os.environ.get("WEB_CONCURRENCY", cls.workers)),
+            participant_cache_size=int(
+                os.environ.get("CHAT_PARTICIPANT_CACHE_SIZE", cls.participant_cache_size)
+            ),
+            participant_cache_ttl=float(
+                os.environ.get("CHAT_PARTICIPANT_CACHE_TTL", cls.participant_cache_ttl)
+            ),
+            message_json_cache_size=int(
+                os.environ.get("CHAT_MESSAGE_JSON_CACHE_SIZE", cls.message_json_cache_size)
+            ),
+            metrics_enabled=_flag("CHAT_METRICS", cls.metrics_enabled),
+            log_level=os.environ.get("CHAT_LOG_LEVEL", cls.log_level),
+            log_format=os.environ.get("CHAT_LOG_FORMAT", cls.log_format),
+            log_message_sample_rate=float(
+                os.environ.get("CHAT_LOG_MESSAGE_SAMPLE_RATE", cls.log_message_sample_rate)
+            ),
+            log_message_content=_flag("CHAT_LOG_MESSAGE_CONTENT"),
+            log_lean_records=_flag("CHAT_LOG_LEAN_RECORDS"),
+        )
+
+
+settings = Settings.from_env()
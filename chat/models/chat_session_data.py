@@ -1,15 +1,21 @@
 from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Optional, List
 import uuid
 
+from chat.models.enums import SessionStatus
 from chat.strategies.message_processing_strategy import MessageProcessingStrategy
 
 
 
-@dataclass
+@dataclass(slots=True)
 class ChatSessionData:
     session_id: uuid.UUID
     customer_id: int
     topic: str
     support_agent_id: Optional[int] = None
     strategies: List[MessageProcessingStrategy] = field(default_factory=list)
+    ended_at: Optional[datetime] = None
+    status: SessionStatus = SessionStatus.OPEN
+    # Creation or the timestamp of the newest stored message; set by the repository.
+    last_activity: datetime = field(default_factory=datetime.now)
@@ -19,3 +19,18 @@ class TicketStatus(Enum):
     IN_PROGRESS = "In Progress"
     RESOLVED = "Resolved"
     REASSIGNED = "Reassigned"
+
+
+class SessionStatus(Enum):
+    # Created, no agent and not queued for one.
+    OPEN = "Open"
+    # Queued until an agent is free.
+    WAITING = "Waiting"
+    ACTIVE = "Active"
+    CLOSED = "Closed"
+
+
+class ExecutionMode(Enum):
+    INLINE = "Inline"
+    THREAD = "Thread"
+    PROCESS = "Process"
@@ -0,0 +1,13 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from chat.models.message_data import MessageData
+
+
+@dataclass(slots=True)
+class HistoryPage:
+    messages: List[MessageData] = field(default_factory=list)
+    # Pass as ``after`` to fetch the messages sent after this page.
+    next_cursor: str = "0"
+    # Pass as ``before`` to fetch the messages sent before this page.
+    prev_cursor: Optional[str] = None
@@ -6,7 +6,7 @@ import uuid
 from chat.models.enums import MessageType, ParticipantType
 
 
-@dataclass
+@dataclass(slots=True)
 class MessageData:
     message_id: uuid.UUID = field(default_factory=uuid.uuid4)  # Auto-generate UUID
     session_id: uuid.UUID = field(default_factory=uuid.uuid4)  # Auto-generate UUID
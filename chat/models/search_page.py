@@ -0,0 +1,19 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from chat.models.message_data import MessageData
+
+
+@dataclass(slots=True)
+class SearchHit:
+    message: MessageData
+    score: float
+
+
+@dataclass(slots=True)
+class SearchPage:
+    hits: List[SearchHit] = field(default_factory=list)
+    # Number of matching messages over all pages.
+    total: int = 0
+    # Pass as ``offset`` to fetch the next page; None on the last page.
+    next_offset: Optional[int] = None
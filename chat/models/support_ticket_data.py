@@ -4,7 +4,7 @@ import uuid
 from chat.models.enums import TicketStatus
 
 
-@dataclass
+@dataclass(slots=True)
 class SupportTicketData:
     agent_id: int
     session_id: uuid.UUID
@@ -0,0 +1,13 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from chat.models.support_ticket_data import SupportTicketData
+
+
+@dataclass(slots=True)
+class TicketPage:
+    tickets: List[SupportTicketData] = field(default_factory=list)
+    # Number of matching tickets over all pages.
+    total: int = 0
+    # Pass as ``offset`` to fetch the next page; None on the last page.
+    next_offset: Optional[int] = None
@@ -10,7 +10,7 @@ from chat.strategies.message_processing_strategy import MessageProcessingStrateg
 
 class Customer(ChatParticipant):
     def __init__(self, customer_id: int):
-        customer = Repository.customers.get(customer_id)
+        customer = Repository.get_customer(customer_id)
         if not customer:
             raise ValueError("Customer does not exist.")
         self.customer_id = customer_id
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from typing import Tuple, Union
+import threading
+import time
+
+from chat.config import settings
+from chat.models.enums import ParticipantType
+from chat.participants.chat_participant import ChatParticipant
+from chat.participants.chat_participant_factory import ChatParticipantFactory
+from chat.repository.repository import Repository
+
+_Key = Tuple[ParticipantType, Union[int, str]]
+
+
+class ParticipantCache:
+    """
+    A bounded cache of the customer and agent handles the facade calls through.
+
+    Creating a ``Customer`` or ``SupportAgent`` looks the participant up in the
+    repository, which is a query on the SQLite backend; the handles hold no
+    per-call state, so one per participant is reused. Beyond ``max_entries``
+    the least recently used handles are evicted, which only costs a lookup
+    when they are needed again. Unknown participants are not cached, so they
+    keep raising ``ValueError``.
+
+    The cache is per worker. ``invalidate`` drops a handle when its
+    participant is re-created through this worker, and all are dropped when
+    the repository is reconfigured or cleared; a participant re-created by
+    another worker sharing the repository is read again once its handle is
+    ``ttl`` seconds old.
+    """
+
+    max_entries = settings.participant_cache_size
+    ttl = settings.participant_cache_ttl
+    # (participant type, id) -> (handle, monotonic time it expires at).
+    _handles: "OrderedDict[_Key, Tuple[ChatParticipant, float]]" = OrderedDict()
+    _generation = Repository.generation
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, participant_type: ParticipantType, participant_id: Union[int, str]):
+        key = (participant_type, participant_id)
+        generation = Repository.generation
+        if cls._generation == generation:
+            # A hit takes no lock.
+            entry = cls._handles.get(key)
+            if entry is not None and (cls.ttl <= 0 or entry[1] > time.monotonic()):
+                try:
+                    cls._handles.move_to_end(key)
+                except KeyError:
+                    # Evicted or invalidated meanwhile; the handle is still usable.
+                    pass
+                return entry[0]
+
+        handle = cls._create(participant_type, participant_id)
+        with cls._lock:
+            current = Repository.generation
+            if cls._generation != current:
+                cls._handles.clear()
+                cls._generation = current
+            # Not cached if the repository changed while the handle was built.
+            if generation == current and cls.max_entries > 0:
+                cls._handles[key] = (handle, time.monotonic() + cls.ttl)
+                cls._handles.move_to_end(key)
+                while len(cls._handles) > cls.max_entries:
+                    cls._handles.popitem(last=False)
+        return handle
+
+    @staticmethod
+    def _create(participant_type: ParticipantType, participant_id: Union[int, str]):
+        if participant_type == ParticipantType.CUSTOMER:
+            return ChatParticipantFactory.create_participant(
+                participant_type, customer_id=participant_id
+            )
+        if participant_type == ParticipantType.AGENT:
+            return ChatParticipantFactory.create_participant(
+                participant_type, agent_id=participant_id
+            )
+        raise ValueError(f"Participants of type {participant_type} are not cached.")
+
+    @classmethod
+    def invalidate(cls, participant_type: ParticipantType, participant_id: Union[int, str]):
+        with cls._lock:
+            cls._handles.pop((participant_type, participant_id), None)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._handles.clear()
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls._handles)
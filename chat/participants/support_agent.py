@@ -9,7 +9,7 @@ from chat.utils.logging import logging
 
 class SupportAgent(ChatParticipant):
     def __init__(self, agent_id: int):
-        agent = Repository.agents.get(agent_id)
+        agent = Repository.get_agent(agent_id)
         if not agent:
             raise ValueError("Agent does not exist.")
         self.agent_id = agent_id
@@ -21,7 +21,7 @@ class SupportAgent(ChatParticipant):
         return self._name
 
     async def handle_chat_session(self, session_id: uuid.UUID) -> None:
-        logging.debug(f"Agent {self.agent_id} handling session {session_id}")
+        logging.debug("Agent %s handling session %s", self.agent_id, session_id)
         await ChatService.assign_agent_to_session(session_id, self.agent_id)
 
     async def send_message(self, session_id: uuid.UUID, content: str) -> None:
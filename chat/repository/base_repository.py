@@ -0,0 +1,203 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Iterable, Iterator, List, Mapping, Optional
+import uuid
+
+from chat.models.customer_data import CustomerData
+from chat.models.enums import SessionStatus, TicketStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+
+
+class BaseRepository(ABC):
+    """
+    Storage backend interface used by ``Repository``.
+
+    Besides the methods below, every backend exposes its collections as the
+    read-only mappings ``customers``, ``agents``, ``chat_sessions``, ``messages``
+    and ``support_tickets``, keyed like the corresponding ``get_*`` methods.
+    Objects returned by a backend must not be mutated to change stored data;
+    use the update methods such as ``assign_agent`` instead.
+    """
+
+    customers: Mapping[int, CustomerData]
+    agents: Mapping[int, SupportAgentData]
+    chat_sessions: Mapping[uuid.UUID, ChatSessionData]
+    messages: Mapping[uuid.UUID, MessageData]
+    support_tickets: Mapping[uuid.UUID, SupportTicketData]
+
+    @abstractmethod
+    def add_customer(self, customer: CustomerData) -> None:
+        pass
+
+    @abstractmethod
+    def add_agent(self, agent: SupportAgentData) -> None:
+        pass
+
+    @abstractmethod
+    def add_chat_session(self, session: ChatSessionData) -> None:
+        pass
+
+    @abstractmethod
+    def add_message(self, message: MessageData) -> None:
+        """Store a message and advance its session's ``last_activity`` to it."""
+
+    def add_messages(self, messages: Iterable[MessageData]) -> None:
+        """Add several messages; backends override this to commit them together."""
+        for message in messages:
+            self.add_message(message)
+
+    @abstractmethod
+    def add_support_ticket(self, ticket: SupportTicketData) -> None:
+        pass
+
+    @abstractmethod
+    def assign_agent(self, session_id: uuid.UUID, agent_id: int) -> None:
+        """Assign an agent to a session, which makes an open session ``ACTIVE``."""
+
+    @abstractmethod
+    def set_session_status(self, session_id: uuid.UUID, status: SessionStatus) -> None:
+        """Record a status change other than assigning or ending, e.g. ``WAITING``."""
+
+    @abstractmethod
+    def end_chat_session(self, session_id: uuid.UUID, ended_at: datetime) -> None:
+        """
+        Mark a chat session as ended, with status ``CLOSED``.
+
+        Backends may move the messages of an ended session to more compact
+        storage; they stay readable through ``get_session_messages`` and
+        ``get_message``.
+        """
+
+    @abstractmethod
+    def update_ticket_status(self, ticket_id: uuid.UUID, status: TicketStatus) -> None:
+        pass
+
+    @abstractmethod
+    def get_customer(self, customer_id: int) -> Optional[CustomerData]:
+        pass
+
+    @abstractmethod
+    def get_agent(self, agent_id: int) -> Optional[SupportAgentData]:
+        pass
+
+    @abstractmethod
+    def get_chat_session(self, session_id: uuid.UUID) -> Optional[ChatSessionData]:
+        pass
+
+    @abstractmethod
+    def get_message(
+        self, message_id: uuid.UUID, session_id: Optional[uuid.UUID] = None
+    ) -> Optional[MessageData]:
+        """
+        Return a message by id.
+
+        ``session_id``, when the caller knows the message's session, lets
+        backends look only at that session's messages.
+        """
+
+    @abstractmethod
+    def get_support_ticket(self, ticket_id: uuid.UUID) -> Optional[SupportTicketData]:
+        pass
+
+    @abstractmethod
+    def list_customers(self) -> List[CustomerData]:
+        pass
+
+    @abstractmethod
+    def list_agents(self) -> List[SupportAgentData]:
+        pass
+
+    @abstractmethod
+    def list_chat_sessions(self) -> List[ChatSessionData]:
+        pass
+
+    @abstractmethod
+    def find_chat_session_ids(
+        self, customer_id: Optional[int] = None, agent_id: Optional[int] = None
+    ) -> List[uuid.UUID]:
+        """
+        Return the ids of the sessions of ``customer_id`` assigned to ``agent_id``.
+
+        A filter left as ``None`` matches every session. Backends answer from
+        an index, without reading the sessions themselves.
+        """
+
+    def iter_chat_sessions(self, batch_size: int = 1000) -> Iterator[ChatSessionData]:
+        """
+        Iterate over all sessions, reading ``batch_size`` of them at a time.
+
+        Backends that store sessions outside the process override this so a
+        full scan does not load every session at once.
+        """
+        return iter(self.list_chat_sessions())
+
+    @abstractmethod
+    def list_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> List[SupportTicketData]:
+        """
+        Return the tickets matching all the given filters.
+
+        ``start`` and ``stop`` are non-negative positions in a backend-defined
+        order, which stays the same while the tickets do not change.
+        """
+
+    @abstractmethod
+    def count_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+    ) -> int:
+        """Return the number of tickets matching all the given filters."""
+
+    @abstractmethod
+    def get_session_messages(
+        self, session_id: uuid.UUID, start: int = 0, stop: Optional[int] = None
+    ) -> List[MessageData]:
+        """
+        Return the messages of a session in the order they were added.
+
+        ``start`` and ``stop`` are positions in that order and work like a slice.
+        """
+
+    @abstractmethod
+    def count_session_messages(self, session_id: uuid.UUID) -> int:
+        pass
+
+    @abstractmethod
+    def session_position_after(self, session_id: uuid.UUID, timestamp: datetime) -> int:
+        """
+        Return the position of the first message of a session sent after ``timestamp``.
+
+        Relies on the messages of a session being added in timestamp order,
+        which ``ChatService`` enforces for imported timestamps.
+        """
+
+    @abstractmethod
+    def idle_sessions(self, before: datetime, limit: int) -> List[uuid.UUID]:
+        """Return up to ``limit`` sessions not ended whose last activity was before ``before``."""
+
+    @abstractmethod
+    def evict_chat_sessions(self, ended_before: datetime, limit: int) -> List[uuid.UUID]:
+        """
+        Drop up to ``limit`` sessions that ended before ``ended_before`` from memory.
+
+        Their messages and tickets go with them. Return the evicted
+        sessions. Backends that do not keep sessions in memory evict nothing.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """Release the resources held by the backend."""
@@ -0,0 +1,245 @@
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+import threading
+import uuid
+
+from chat.models.customer_data import CustomerData
+from chat.models.enums import SessionStatus, TicketStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository import mutation_log
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.mutation_log import MutationLog
+from chat.utils.logging import logging
+from chat.utils.metrics import Metrics
+
+
+class DurableInMemoryRepository(InMemoryRepository):
+    """
+    In-memory backend that survives restarts through a mutation log and snapshots.
+
+    Every mutation, including in-place ones such as ``assign_agent``, is encoded
+    outside the locks and appended to a ``MutationLog`` while the writer still
+    holds its collection lock, so the log order matches the memory order. After
+    ``snapshot_interval`` records a snapshot is written in a background thread:
+    the log is rotated while all writer locks are held, the collections are
+    copied, and the copy is serialized after the locks are released. On start
+    the newest snapshot is loaded and only the log tail after it is replayed.
+    """
+
+    def __init__(
+        self, directory: str, snapshot_interval: int = 100_000, fsync: bool = False
+    ):
+        super().__init__()
+        self.snapshot_interval = snapshot_interval
+        self._log = MutationLog(directory, fsync=fsync)
+        self._log_lock = Metrics.lock("mutation_log")
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._records_since_snapshot = 0
+        self._snapshot_pending = False
+        self._recover()
+
+    def _recover(self):
+        customers, agents = self.customers, self.agents
+        chat_sessions = self.chat_sessions
+        messages, session_messages = self.messages, self.session_messages
+        for op, value in self._log.recover():
+            if op == mutation_log.ADD_MESSAGE:
+                self._compact(value)
+                messages[value.message_id] = value
+                session_messages.setdefault(value.session_id, []).append(value)
+            elif op == mutation_log.ADD_CUSTOMER:
+                customers[value.customer_id] = value
+            elif op == mutation_log.ADD_AGENT:
+                agents[value.agent_id] = value
+            elif op == mutation_log.ADD_CHAT_SESSION:
+                self._store_session(value)
+            elif op == mutation_log.SESSION_STATE:
+                session_id, status, last_activity = value
+                session = chat_sessions.get(session_id)
+                if session is not None:
+                    session.status = status
+                    session.last_activity = last_activity
+            elif op == mutation_log.ADD_SUPPORT_TICKET:
+                self._store_ticket(value)
+            elif op == mutation_log.ASSIGN_AGENT:
+                self._assign(*value)
+            elif op == mutation_log.UPDATE_TICKET_STATUS:
+                ticket_id, status = value
+                self._set_ticket_status(ticket_id, status)
+            elif op == mutation_log.END_CHAT_SESSION:
+                self._archive(*value)
+            elif op == mutation_log.EVICT_CHAT_SESSION:
+                self._evict(value)
+            elif op == mutation_log.CLEAR:
+                self._clear_collections()
+        logging.info(
+            "Recovered %d messages and %d sessions from %s.",
+            len(messages),
+            len(chat_sessions),
+            self._log.directory,
+        )
+
+    def _append(self, record: bytes):
+        with self._log_lock:
+            self._log.append(record)
+            self._records_since_snapshot += 1
+            start_snapshot = (
+                self._records_since_snapshot >= self.snapshot_interval
+                and not self._snapshot_pending
+            )
+            if start_snapshot:
+                self._snapshot_pending = True
+        if start_snapshot:
+            self._snapshot_thread = threading.Thread(
+                target=self.snapshot, name="repository-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def add_customer(self, customer: CustomerData):
+        record = mutation_log.encode_customer(customer)
+        with self._customers_lock:
+            self.customers[customer.customer_id] = customer
+            self._append(record)
+
+    def add_agent(self, agent: SupportAgentData):
+        record = mutation_log.encode_agent(agent)
+        with self._agents_lock:
+            self.agents[agent.agent_id] = agent
+            self._append(record)
+
+    def add_chat_session(self, session: ChatSessionData):
+        record = mutation_log.encode_chat_session(session)
+        # The state record carries the creation time as the last activity.
+        record += mutation_log.encode_session_state(session)
+        with self._chat_sessions_lock:
+            self._store_session(session)
+            self._append(record)
+
+    def add_message(self, message: MessageData):
+        self._compact(message)
+        record = mutation_log.encode_message(message)
+        with self._message_locks[self._message_stripe(message.session_id)]:
+            self.session_messages.setdefault(message.session_id, []).append(message)
+            self.messages[message.message_id] = message
+            self._append(record)
+
+    def add_messages(self, messages: Iterable[MessageData]):
+        by_stripe: Dict[int, List[MessageData]] = {}
+        for message in messages:
+            self._compact(message)
+            by_stripe.setdefault(self._message_stripe(message.session_id), []).append(
+                message
+            )
+        for stripe, batch in by_stripe.items():
+            record = b"".join(mutation_log.encode_message(message) for message in batch)
+            with self._message_locks[stripe]:
+                for message in batch:
+                    self.session_messages.setdefault(message.session_id, []).append(
+                        message
+                    )
+                    self.messages[message.message_id] = message
+                self._append(record)
+
+    def add_support_ticket(self, ticket: SupportTicketData):
+        record = mutation_log.encode_support_ticket(ticket)
+        with self._support_tickets_lock:
+            self._store_ticket(ticket)
+            self._append(record)
+
+    def assign_agent(self, session_id: uuid.UUID, agent_id: int):
+        record = mutation_log.encode_assign_agent(session_id, agent_id)
+        with self._chat_sessions_lock:
+            self._assign(session_id, agent_id)
+            self._append(record)
+
+    def set_session_status(self, session_id: uuid.UUID, status: SessionStatus):
+        with self._chat_sessions_lock:
+            session = self.chat_sessions[session_id]
+            session.status = status
+            self._append(mutation_log.encode_session_state(session))
+
+    def update_ticket_status(self, ticket_id: uuid.UUID, status: TicketStatus):
+        record = mutation_log.encode_ticket_status(ticket_id, status)
+        with self._support_tickets_lock:
+            self._set_ticket_status(ticket_id, status)
+            self._append(record)
+
+    def end_chat_session(self, session_id: uuid.UUID, ended_at: datetime):
+        record = mutation_log.encode_end_chat_session(session_id, ended_at)
+        with self._chat_sessions_lock:
+            with self._message_locks[self._message_stripe(session_id)]:
+                self._archive(session_id, ended_at)
+                self._append(record)
+
+    def evict_chat_sessions(self, ended_before: datetime, limit: int) -> List[uuid.UUID]:
+        evicted = []
+        while len(evicted) < limit:
+            with self._chat_sessions_lock:
+                session_id = next(iter(self._ended_sessions), None)
+                if session_id is None or self._ended_sessions[session_id] >= ended_before:
+                    break
+                record = mutation_log.encode_evict_chat_session(session_id)
+                with self._support_tickets_lock, self._message_locks[
+                    self._message_stripe(session_id)
+                ]:
+                    self._evict(session_id)
+                    self._append(record)
+            evicted.append(session_id)
+        return evicted
+
+    def clear(self):
+        with ExitStack() as stack:
+            for lock in self._write_locks():
+                stack.enter_context(lock)
+            self._clear_collections()
+            self._append(mutation_log.encode_clear())
+
+    def snapshot(self):
+        """Write a snapshot of the current state and drop the log it replaces."""
+        with self._snapshot_lock:
+            with ExitStack() as stack:
+                for lock in self._write_locks():
+                    stack.enter_context(lock)
+                with self._log_lock:
+                    segment = self._log.rotate()
+                    self._records_since_snapshot = 0
+                    self._snapshot_pending = False
+                # Sessions and tickets may still change after the locks are
+                # released; replaying the idempotent updates in the new segment
+                # brings them back to the right state.
+                state = (
+                    list(self.customers.values()),
+                    list(self.agents.values()),
+                    list(self.chat_sessions.values()),
+                    list(self.archives.values()),
+                    list(self.messages.values()),
+                    list(self.support_tickets.values()),
+                )
+            self._log.write_snapshot(segment, self._snapshot_records(*state))
+
+    @staticmethod
+    def _snapshot_records(
+        customers, agents, chat_sessions, archives, messages, tickets
+    ) -> Iterator[bytes]:
+        yield from map(mutation_log.encode_customer, customers)
+        yield from map(mutation_log.encode_agent, agents)
+        for session in chat_sessions:
+            yield mutation_log.encode_chat_session(session)
+            yield mutation_log.encode_session_state(session)
+        ended_at = {session.session_id: session.ended_at for session in chat_sessions}
+        for block in archives:
+            yield from map(mutation_log.encode_message, block[:])
+            yield mutation_log.encode_end_chat_session(block.session_id, ended_at[block.session_id])
+        yield from map(mutation_log.encode_message, messages)
+        yield from map(mutation_log.encode_support_ticket, tickets)
+
+    def close(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        with self._log_lock:
+            self._log.close()
@@ -0,0 +1,453 @@
+from bisect import bisect_right
+from contextlib import ExitStack
+from datetime import datetime
+from heapq import heappop, heappush
+from itertools import islice
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import uuid
+
+from chat.models.customer_data import CustomerData
+from chat.models.enums import SessionStatus, TicketStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.base_repository import BaseRepository
+from chat.repository.message_archive import MessageBlock
+from chat.utils.metrics import Metrics
+
+
+class InMemoryRepository(BaseRepository):
+    """
+    A thread-safe repository backend keeping all data in process memory.
+
+    This class stores customers, agents, chat sessions, messages, and support tickets
+    in dictionaries. Writers are synchronized with one lock per collection, and
+    messages with one of ``MESSAGE_LOCK_STRIPES`` locks picked by session, so writes
+    to unrelated collections or sessions do not contend. Reads take no lock: a
+    single dict lookup, list slice or copy is atomic in CPython, and objects are
+    only published into the collections once they are fully built.
+
+    Messages are additionally indexed per session in insertion order, so reading
+    the history of one session never has to scan the messages of all the others.
+    Stored messages share their session's id object and, while the session is
+    open, one object per participant id instead of each carrying equal copies.
+    When a session ends,
+    its messages are moved out of ``messages`` into a columnar ``MessageBlock``,
+    which ``get_session_messages`` and ``get_message`` read transparently.
+
+    Sessions not ended yet are also kept apart, with a heap of their last
+    activity for the idle sweep, and ended ones in the order they ended, so
+    eviction takes them from the front. Eviction drops everything kept for a
+    session, its tickets included.
+
+    Tickets are indexed by status, agent, agent and status, and session. Each
+    index maps a key to a dict of its tickets, whose size is the live count;
+    a status change moves the ticket between dicts under the tickets lock.
+    """
+
+    MESSAGE_LOCK_STRIPES = 64
+
+    def __init__(self):
+        # With metrics enabled, the locks report their wait and hold times.
+        self._customers_lock = Metrics.lock("customers")
+        self._agents_lock = Metrics.lock("agents")
+        self._chat_sessions_lock = Metrics.lock("chat_sessions")
+        self._support_tickets_lock = Metrics.lock("support_tickets")
+        self._message_locks = [
+            Metrics.lock("messages") for _ in range(self.MESSAGE_LOCK_STRIPES)
+        ]
+
+        self.customers: Dict[int, CustomerData] = {}
+        self.agents: Dict[int, SupportAgentData] = {}
+        self.chat_sessions: Dict[uuid.UUID, ChatSessionData] = {}
+        self.messages: Dict[uuid.UUID, MessageData] = {}
+        self.session_messages: Dict[uuid.UUID, Union[List[MessageData], MessageBlock]] = {}
+        self.support_tickets: Dict[uuid.UUID, SupportTicketData] = {}
+        self.archives: Dict[uuid.UUID, MessageBlock] = {}
+        self._open_sessions: Dict[uuid.UUID, ChatSessionData] = {}
+        # (last activity when pushed, session id); entries of ended sessions
+        # are dropped when they come up.
+        self._activity_heap: List[Tuple[datetime, uuid.UUID]] = []
+        self._ended_sessions: Dict[uuid.UUID, datetime] = {}
+        self._tickets_by_status: Dict[TicketStatus, Dict[uuid.UUID, SupportTicketData]] = {}
+        self._tickets_by_agent: Dict[int, Dict[uuid.UUID, SupportTicketData]] = {}
+        self._tickets_by_agent_status: Dict[
+            Tuple[int, TicketStatus], Dict[uuid.UUID, SupportTicketData]
+        ] = {}
+        self._tickets_by_session: Dict[uuid.UUID, Dict[uuid.UUID, SupportTicketData]] = {}
+        self._sessions_by_customer: Dict[int, Dict[uuid.UUID, None]] = {}
+        self._sessions_by_agent: Dict[int, Dict[uuid.UUID, None]] = {}
+        # Participant ids interned per open session; archive blocks keep
+        # their own, so the tables go when the session ends.
+        self._participant_ids: Dict[uuid.UUID, Dict[Union[int, str], Union[int, str]]] = {}
+
+    def _message_stripe(self, session_id: uuid.UUID) -> int:
+        return hash(session_id) % self.MESSAGE_LOCK_STRIPES
+
+    def _compact(self, message: MessageData):
+        session = self.chat_sessions.get(message.session_id)
+        if session is None or session.ended_at is not None:
+            return
+        message.session_id = session.session_id
+        # Recording the activity here also restores it on log replay.
+        if message.timestamp > session.last_activity:
+            session.last_activity = message.timestamp
+        participant_ids = self._participant_ids.setdefault(session.session_id, {})
+        participant_id = message.participant_id
+        message.participant_id = participant_ids.setdefault(participant_id, participant_id)
+
+    def add_customer(self, customer: CustomerData):
+        with self._customers_lock:
+            self.customers[customer.customer_id] = customer
+
+    def add_agent(self, agent: SupportAgentData):
+        with self._agents_lock:
+            self.agents[agent.agent_id] = agent
+
+    def add_chat_session(self, session: ChatSessionData):
+        with self._chat_sessions_lock:
+            self._store_session(session)
+
+    def _store_session(self, session: ChatSessionData):
+        previous = self.chat_sessions.get(session.session_id)
+        if previous is not None:
+            self._unindex_session(previous)
+        self.chat_sessions[session.session_id] = session
+        self._index_session(session)
+        if session.ended_at is None and session.session_id not in self._open_sessions:
+            heappush(self._activity_heap, (session.last_activity, session.session_id))
+        if session.ended_at is None:
+            self._open_sessions[session.session_id] = session
+
+    def add_message(self, message: MessageData):
+        self._compact(message)
+        with self._message_locks[self._message_stripe(message.session_id)]:
+            self.session_messages.setdefault(message.session_id, []).append(message)
+            self.messages[message.message_id] = message
+
+    def add_messages(self, messages: Iterable[MessageData]):
+        # Take each stripe lock once for all of its messages.
+        by_stripe: Dict[int, List[MessageData]] = {}
+        for message in messages:
+            self._compact(message)
+            by_stripe.setdefault(self._message_stripe(message.session_id), []).append(
+                message
+            )
+        for stripe, batch in by_stripe.items():
+            with self._message_locks[stripe]:
+                for message in batch:
+                    self.session_messages.setdefault(message.session_id, []).append(
+                        message
+                    )
+                    self.messages[message.message_id] = message
+
+    def add_support_ticket(self, ticket: SupportTicketData):
+        with self._support_tickets_lock:
+            self._store_ticket(ticket)
+
+    def assign_agent(self, session_id: uuid.UUID, agent_id: int):
+        with self._chat_sessions_lock:
+            self._assign(session_id, agent_id)
+
+    def _assign(self, session_id: uuid.UUID, agent_id: int):
+        session = self.chat_sessions[session_id]
+        self._unindex_session(session)
+        session.support_agent_id = agent_id
+        self._index_session(session)
+        if session.ended_at is None:
+            session.status = SessionStatus.ACTIVE
+
+    def _session_indexes(self, session: ChatSessionData):
+        indexes = [(self._sessions_by_customer, session.customer_id)]
+        if session.support_agent_id is not None:
+            indexes.append((self._sessions_by_agent, session.support_agent_id))
+        return indexes
+
+    def _index_session(self, session: ChatSessionData):
+        for index, key in self._session_indexes(session):
+            index.setdefault(key, {})[session.session_id] = None
+
+    def _unindex_session(self, session: ChatSessionData):
+        for index, key in self._session_indexes(session):
+            sessions = index.get(key, {})
+            sessions.pop(session.session_id, None)
+            if not sessions:
+                index.pop(key, None)
+
+    def set_session_status(self, session_id: uuid.UUID, status: SessionStatus):
+        with self._chat_sessions_lock:
+            self.chat_sessions[session_id].status = status
+
+    def update_ticket_status(self, ticket_id: uuid.UUID, status: TicketStatus):
+        with self._support_tickets_lock:
+            self._set_ticket_status(ticket_id, status)
+
+    def _ticket_indexes(self, ticket: SupportTicketData):
+        return (
+            (self._tickets_by_status, ticket.status),
+            (self._tickets_by_agent, ticket.agent_id),
+            (self._tickets_by_agent_status, (ticket.agent_id, ticket.status)),
+            (self._tickets_by_session, ticket.session_id),
+        )
+
+    def _index_ticket(self, ticket: SupportTicketData):
+        for index, key in self._ticket_indexes(ticket):
+            index.setdefault(key, {})[ticket.ticket_id] = ticket
+
+    def _unindex_ticket(self, ticket: SupportTicketData):
+        for index, key in self._ticket_indexes(ticket):
+            tickets = index[key]
+            del tickets[ticket.ticket_id]
+            if not tickets:
+                del index[key]
+
+    def _store_ticket(self, ticket: SupportTicketData):
+        previous = self.support_tickets.get(ticket.ticket_id)
+        if previous is not None:
+            self._unindex_ticket(previous)
+        self.support_tickets[ticket.ticket_id] = ticket
+        self._index_ticket(ticket)
+
+    def _set_ticket_status(self, ticket_id: uuid.UUID, status: TicketStatus):
+        ticket = self.support_tickets[ticket_id]
+        if ticket.status is status:
+            return
+        self._unindex_ticket(ticket)
+        ticket.status = status
+        self._index_ticket(ticket)
+
+    def end_chat_session(self, session_id: uuid.UUID, ended_at: datetime):
+        with self._chat_sessions_lock:
+            with self._message_locks[self._message_stripe(session_id)]:
+                self._archive(session_id, ended_at)
+
+    def _archive(self, session_id: uuid.UUID, ended_at: datetime):
+        session = self.chat_sessions[session_id]
+        session.ended_at = ended_at
+        session.status = SessionStatus.CLOSED
+        self._open_sessions.pop(session_id, None)
+        self._participant_ids.pop(session_id, None)
+        self._ended_sessions[session_id] = ended_at
+        messages = self.session_messages.get(session_id, [])
+        if isinstance(messages, MessageBlock):
+            return
+        block = MessageBlock(session.session_id, messages)
+        # Publish the block before dropping the messages, so lock-free readers
+        # always find every message in one place or the other.
+        self.archives[session_id] = block
+        self.session_messages[session_id] = block
+        for message in messages:
+            del self.messages[message.message_id]
+
+    def idle_sessions(self, before: datetime, limit: int) -> List[uuid.UUID]:
+        # Heap entries are never newer than the session's last activity, so
+        # the sweep stops at the first entry that is not before ``before``;
+        # entries of sessions active since they were pushed are pushed again.
+        idle: Dict[uuid.UUID, ChatSessionData] = {}
+        with self._chat_sessions_lock:
+            heap = self._activity_heap
+            while heap and heap[0][0] < before and len(idle) < limit:
+                _, session_id = heappop(heap)
+                session = self._open_sessions.get(session_id)
+                if session is None or session_id in idle:
+                    continue
+                if session.last_activity < before:
+                    idle[session_id] = session
+                else:
+                    heappush(heap, (session.last_activity, session_id))
+            # Kept until they are ended.
+            for session_id, session in idle.items():
+                heappush(heap, (session.last_activity, session_id))
+        return list(idle)
+
+    def evict_chat_sessions(self, ended_before: datetime, limit: int) -> List[uuid.UUID]:
+        evicted = []
+        # One session per lock hold, so writers wait for at most one eviction.
+        while len(evicted) < limit:
+            with self._chat_sessions_lock:
+                session_id = next(iter(self._ended_sessions), None)
+                if session_id is None or self._ended_sessions[session_id] >= ended_before:
+                    break
+                with self._support_tickets_lock, self._message_locks[
+                    self._message_stripe(session_id)
+                ]:
+                    self._evict(session_id)
+            evicted.append(session_id)
+        return evicted
+
+    def _evict(self, session_id: uuid.UUID):
+        # Ended sessions keep their messages in an archive block only.
+        self._ended_sessions.pop(session_id, None)
+        self.archives.pop(session_id, None)
+        self.session_messages.pop(session_id, None)
+        session = self.chat_sessions.pop(session_id, None)
+        if session is not None:
+            self._unindex_session(session)
+        self._participant_ids.pop(session_id, None)
+        for ticket in list(self._tickets_by_session.get(session_id, {}).values()):
+            self._unindex_ticket(ticket)
+            del self.support_tickets[ticket.ticket_id]
+
+    def get_customer(self, customer_id: int) -> Optional[CustomerData]:
+        return self.customers.get(customer_id)
+
+    def get_agent(self, agent_id: int) -> Optional[SupportAgentData]:
+        return self.agents.get(agent_id)
+
+    def get_chat_session(self, session_id: uuid.UUID) -> Optional[ChatSessionData]:
+        return self.chat_sessions.get(session_id)
+
+    def get_message(
+        self, message_id: uuid.UUID, session_id: Optional[uuid.UUID] = None
+    ) -> Optional[MessageData]:
+        message = self.messages.get(message_id)
+        if message is not None:
+            return message
+        if session_id is not None:
+            block = self.archives.get(session_id)
+            return None if block is None else block.find(message_id)
+        # Without the session, every archive block has to be searched.
+        for block in list(self.archives.values()):
+            message = block.find(message_id)
+            if message is not None:
+                return message
+        return None
+
+    def get_support_ticket(self, ticket_id: uuid.UUID) -> Optional[SupportTicketData]:
+        return self.support_tickets.get(ticket_id)
+
+    def _matching_tickets(
+        self,
+        status: Optional[TicketStatus],
+        agent_id: Optional[int],
+        session_id: Optional[uuid.UUID],
+    ) -> Tuple[Iterable[SupportTicketData], bool]:
+        """Return the tickets of the narrowest index and whether they all match."""
+        if session_id is not None:
+            # Sessions have few tickets; filter those of the session directly.
+            tickets = self._tickets_by_session.get(session_id, {}).values()
+            return tickets, status is None and agent_id is None
+        if agent_id is not None and status is not None:
+            return self._tickets_by_agent_status.get((agent_id, status), {}).values(), True
+        if agent_id is not None:
+            return self._tickets_by_agent.get(agent_id, {}).values(), True
+        if status is not None:
+            return self._tickets_by_status.get(status, {}).values(), True
+        return self.support_tickets.values(), True
+
+    def list_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> List[SupportTicketData]:
+        # The index dicts change size on writes, so iterate them under the lock.
+        with self._support_tickets_lock:
+            tickets, exact = self._matching_tickets(status, agent_id, session_id)
+            if not exact:
+                tickets = (
+                    ticket
+                    for ticket in tickets
+                    if (status is None or ticket.status is status)
+                    and (agent_id is None or ticket.agent_id == agent_id)
+                )
+            return list(islice(tickets, start, stop))
+
+    def count_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+    ) -> int:
+        with self._support_tickets_lock:
+            tickets, exact = self._matching_tickets(status, agent_id, session_id)
+            if exact:
+                return len(tickets)  # type: ignore[arg-type]
+            return sum(
+                1
+                for ticket in tickets
+                if (status is None or ticket.status is status)
+                and (agent_id is None or ticket.agent_id == agent_id)
+            )
+
+    def list_customers(self) -> List[CustomerData]:
+        return list(self.customers.values())
+
+    def list_agents(self) -> List[SupportAgentData]:
+        return list(self.agents.values())
+
+    def list_chat_sessions(self) -> List[ChatSessionData]:
+        return list(self.chat_sessions.values())
+
+    def find_chat_session_ids(
+        self, customer_id: Optional[int] = None, agent_id: Optional[int] = None
+    ) -> List[uuid.UUID]:
+        # Copied first, as writers may change the indexes meanwhile.
+        by_customer = None if customer_id is None else list(
+            self._sessions_by_customer.get(customer_id, ())
+        )
+        by_agent = None if agent_id is None else list(self._sessions_by_agent.get(agent_id, ()))
+        if by_customer is None and by_agent is None:
+            return list(self.chat_sessions)
+        if by_customer is None or by_agent is None:
+            return by_customer if by_agent is None else by_agent
+        agent_sessions = set(by_agent)
+        return [session_id for session_id in by_customer if session_id in agent_sessions]
+
+    def get_session_messages(
+        self, session_id: uuid.UUID, start: int = 0, stop: Optional[int] = None
+    ) -> List[MessageData]:
+        return self.session_messages.get(session_id, [])[start:stop]
+
+    def count_session_messages(self, session_id: uuid.UUID) -> int:
+        return len(self.session_messages.get(session_id, ()))
+
+    def session_position_after(self, session_id: uuid.UUID, timestamp: datetime) -> int:
+        messages = self.session_messages.get(session_id, [])
+        if isinstance(messages, MessageBlock):
+            return messages.position_after(timestamp)
+        # Concurrent appends only extend the list past the positions searched.
+        return bisect_right(
+            messages,
+            timestamp,
+            key=attrgetter("timestamp"),
+        )
+
+    def _write_locks(self) -> list:
+        """All writer locks, in the order they must be taken together."""
+        return [
+            self._customers_lock,
+            self._agents_lock,
+            self._chat_sessions_lock,
+            self._support_tickets_lock,
+            *self._message_locks,
+        ]
+
+    def clear(self):
+        with ExitStack() as stack:
+            for lock in self._write_locks():
+                stack.enter_context(lock)
+            self._clear_collections()
+
+    def _clear_collections(self):
+        self.customers.clear()
+        self.agents.clear()
+        self.chat_sessions.clear()
+        self.messages.clear()
+        self.session_messages.clear()
+        self.archives.clear()
+        self._open_sessions.clear()
+        self._activity_heap.clear()
+        self._ended_sessions.clear()
+        self.support_tickets.clear()
+        self._tickets_by_status.clear()
+        self._tickets_by_agent.clear()
+        self._tickets_by_agent_status.clear()
+        self._tickets_by_session.clear()
+        self._sessions_by_customer.clear()
+        self._sessions_by_agent.clear()
+        self._participant_ids.clear()
@@ -0,0 +1,134 @@
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+import uuid
+
+from chat.models.enums import MessageType, ParticipantType
+from chat.models.message_data import MessageData
+
+_PARTICIPANT_TYPES = list(ParticipantType)
+_PARTICIPANT_TYPE_CODES = {member: code for code, member in enumerate(_PARTICIPANT_TYPES)}
+_MESSAGE_TYPES = list(MessageType)
+_MESSAGE_TYPE_CODES = {member: code for code, member in enumerate(_MESSAGE_TYPES)}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class MessageBlock:
+    """
+    The messages of an ended session, stored column by column.
+
+    Instead of one object per message, a block keeps parallel arrays of message
+    ids, timestamps in microseconds and small-int codes for participant and
+    message types, participant ids as indexes into a table of the distinct ids,
+    and all contents in one UTF-8 buffer with offsets. Indexing or slicing a
+    block builds ``MessageData`` objects for just the requested positions.
+
+    A block is immutable; an ended session accepts no new messages.
+    """
+
+    __slots__ = (
+        "session_id",
+        "_ids",
+        "_timestamps",
+        "_participant_types",
+        "_message_types",
+        "_participants",
+        "_participant_indexes",
+        "_text",
+        "_offsets",
+    )
+
+    def __init__(self, session_id: uuid.UUID, messages: Iterable[MessageData]):
+        self.session_id = session_id
+        ids = bytearray()
+        self._timestamps = array("q")
+        self._participant_types = array("B")
+        self._message_types = array("B")
+        self._participants: List[Union[int, str]] = []
+        self._participant_indexes = array("I")
+        self._offsets = array("Q", [0])
+        participant_codes: Dict[Union[int, str], int] = {}
+        contents = []
+        end = 0
+        for message in messages:
+            ids += message.message_id.bytes
+            self._timestamps.append((message.timestamp - _EPOCH) // _MICROSECOND)
+            self._participant_types.append(_PARTICIPANT_TYPE_CODES[message.participant_type])
+            self._message_types.append(_MESSAGE_TYPE_CODES[message.message_type])
+            code = participant_codes.get(message.participant_id)
+            if code is None:
+                code = participant_codes[message.participant_id] = len(self._participants)
+                self._participants.append(message.participant_id)
+            self._participant_indexes.append(code)
+            content = message.content.encode("utf-8", "surrogatepass")
+            contents.append(content)
+            end += len(content)
+            self._offsets.append(end)
+        self._ids = bytes(ids)
+        self._text = b"".join(contents)
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._message(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message block index out of range")
+        return self._message(index)
+
+    def _message(self, i: int) -> MessageData:
+        return MessageData(
+            message_id=uuid.UUID(bytes=self._ids[i * 16 : i * 16 + 16]),
+            session_id=self.session_id,
+            participant_id=self._participants[self._participant_indexes[i]],
+            participant_type=_PARTICIPANT_TYPES[self._participant_types[i]],
+            content=self._text[self._offsets[i] : self._offsets[i + 1]].decode(
+                "utf-8", "surrogatepass"
+            ),
+            timestamp=_EPOCH + timedelta(microseconds=self._timestamps[i]),
+            message_type=_MESSAGE_TYPES[self._message_types[i]],
+        )
+
+    def append(self, message: MessageData):
+        raise ValueError(f"Chat session {self.session_id} has ended and accepts no messages.")
+
+    def find(self, message_id: uuid.UUID) -> Optional[MessageData]:
+        """Return the message with the given id, or None if it is not in this block."""
+        raw = message_id.bytes
+        start = self._ids.find(raw)
+        while start >= 0:
+            if start % 16 == 0:
+                return self._message(start // 16)
+            start = self._ids.find(raw, start + 1)
+        return None
+
+    def position_after(self, timestamp: datetime) -> int:
+        """Return the position of the first message sent after ``timestamp``."""
+        return bisect_right(self._timestamps, (timestamp - _EPOCH) // _MICROSECOND)
+
+    def count_by_participant_type(self) -> Dict[ParticipantType, int]:
+        return {
+            member: self._participant_types.count(code)
+            for code, member in enumerate(_PARTICIPANT_TYPES)
+        }
+
+    def nbytes(self) -> int:
+        """Return the size of the block's columns and text buffer in bytes."""
+        columns = (
+            self._timestamps,
+            self._participant_types,
+            self._message_types,
+            self._participant_indexes,
+            self._offsets,
+        )
+        return (
+            len(self._ids)
+            + len(self._text)
+            + sum(len(column) * column.itemsize for column in columns)
+        )
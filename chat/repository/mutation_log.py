@@ -0,0 +1,373 @@
+"""
+Compact binary encoding of repository mutations and the segmented log storing them.
+
+Every record is framed as ``op (u8) | payload length (u32) | crc32 (u32) | payload``.
+Payloads use fixed-width little-endian fields, raw 16-byte UUIDs, small-int codes
+for enums and length-prefixed UTF-8 strings; session strategies are stored as
+``StrategyRegistry`` JSON. A torn or corrupt record at the end of the last
+segment (e.g. after a crash mid-write) ends the replay there.
+"""
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+import os
+import struct
+import zlib
+import uuid
+
+from chat.models.customer_data import CustomerData
+from chat.models.enums import MessageType, ParticipantType, SessionStatus, TicketStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.strategies.strategy_registry import StrategyRegistry
+
+ADD_CUSTOMER = 1
+ADD_AGENT = 2
+ADD_CHAT_SESSION = 3
+ADD_MESSAGE = 4
+ADD_SUPPORT_TICKET = 5
+ASSIGN_AGENT = 6
+UPDATE_TICKET_STATUS = 7
+CLEAR = 8
+END_CHAT_SESSION = 9
+SESSION_STATE = 10
+EVICT_CHAT_SESSION = 11
+
+_FRAME = struct.Struct("<BII")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_MESSAGE = struct.Struct("<16s16sBBq")
+_SESSION = struct.Struct("<16sq")
+_TICKET = struct.Struct("<16s16sqB")
+_ASSIGN = struct.Struct("<16sq")
+_TICKET_STATUS = struct.Struct("<16sB")
+_END_SESSION = struct.Struct("<16sq")
+_SESSION_STATE = struct.Struct("<16sBq")
+
+_PARTICIPANT_TYPES = list(ParticipantType)
+_PARTICIPANT_TYPE_CODES = {member: code for code, member in enumerate(_PARTICIPANT_TYPES)}
+_MESSAGE_TYPES = list(MessageType)
+_MESSAGE_TYPE_CODES = {member: code for code, member in enumerate(_MESSAGE_TYPES)}
+_TICKET_STATUSES = list(TicketStatus)
+_TICKET_STATUS_CODES = {member: code for code, member in enumerate(_TICKET_STATUSES)}
+_SESSION_STATUSES = list(SessionStatus)
+_SESSION_STATUS_CODES = {member: code for code, member in enumerate(_SESSION_STATUSES)}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _str(value: str) -> bytes:
+    data = value.encode()
+    return _U32.pack(len(data)) + data
+
+
+def _read_str(buf, offset: int) -> Tuple[str, int]:
+    (length,) = _U32.unpack_from(buf, offset)
+    offset += 4
+    return str(buf[offset : offset + length], "utf-8"), offset + length
+
+
+def _optional_int(value: Optional[int]) -> bytes:
+    return b"\x00" if value is None else b"\x01" + _I64.pack(value)
+
+
+def _read_optional_int(buf, offset: int) -> Tuple[Optional[int], int]:
+    if buf[offset] == 0:
+        return None, offset + 1
+    return _I64.unpack_from(buf, offset + 1)[0], offset + 9
+
+
+def _participant_id(value) -> bytes:
+    if isinstance(value, int):
+        return b"\x00" + _I64.pack(value)
+    return b"\x01" + _str(value)
+
+
+def _read_participant_id(buf, offset: int):
+    if buf[offset] == 0:
+        return _I64.unpack_from(buf, offset + 1)[0], offset + 9
+    return _read_str(buf, offset + 1)
+
+
+def encode(op: int, payload: bytes) -> bytes:
+    return _FRAME.pack(op, len(payload), zlib.crc32(payload)) + payload
+
+
+def encode_customer(customer: CustomerData) -> bytes:
+    return encode(
+        ADD_CUSTOMER,
+        _I64.pack(customer.customer_id) + _str(customer.name) + _str(customer.email),
+    )
+
+
+def encode_agent(agent: SupportAgentData) -> bytes:
+    return encode(
+        ADD_AGENT, _I64.pack(agent.agent_id) + _str(agent.name) + _str(agent.email)
+    )
+
+
+def encode_chat_session(session: ChatSessionData) -> bytes:
+    strategies = StrategyRegistry.encode(session.strategies) if session.strategies else b""
+    return encode(
+        ADD_CHAT_SESSION,
+        _SESSION.pack(session.session_id.bytes, session.customer_id)
+        + _str(session.topic)
+        + _optional_int(session.support_agent_id)
+        + _U32.pack(len(strategies))
+        + strategies,
+    )
+
+
+def encode_message(message: MessageData) -> bytes:
+    return encode(
+        ADD_MESSAGE,
+        _MESSAGE.pack(
+            message.message_id.bytes,
+            message.session_id.bytes,
+            _PARTICIPANT_TYPE_CODES[message.participant_type],
+            _MESSAGE_TYPE_CODES[message.message_type],
+            (message.timestamp - _EPOCH) // _MICROSECOND,
+        )
+        + _participant_id(message.participant_id)
+        + _str(message.content),
+    )
+
+
+def encode_support_ticket(ticket: SupportTicketData) -> bytes:
+    return encode(
+        ADD_SUPPORT_TICKET,
+        _TICKET.pack(
+            ticket.ticket_id.bytes,
+            ticket.session_id.bytes,
+            ticket.agent_id,
+            _TICKET_STATUS_CODES[ticket.status],
+        )
+        + _str(ticket.issue),
+    )
+
+
+def encode_assign_agent(session_id: uuid.UUID, agent_id: int) -> bytes:
+    return encode(ASSIGN_AGENT, _ASSIGN.pack(session_id.bytes, agent_id))
+
+
+def encode_ticket_status(ticket_id: uuid.UUID, status: TicketStatus) -> bytes:
+    return encode(
+        UPDATE_TICKET_STATUS,
+        _TICKET_STATUS.pack(ticket_id.bytes, _TICKET_STATUS_CODES[status]),
+    )
+
+
+def encode_end_chat_session(session_id: uuid.UUID, ended_at: datetime) -> bytes:
+    return encode(
+        END_CHAT_SESSION,
+        _END_SESSION.pack(session_id.bytes, (ended_at - _EPOCH) // _MICROSECOND),
+    )
+
+
+def encode_session_state(session: ChatSessionData) -> bytes:
+    return encode(
+        SESSION_STATE,
+        _SESSION_STATE.pack(
+            session.session_id.bytes,
+            _SESSION_STATUS_CODES[session.status],
+            (session.last_activity - _EPOCH) // _MICROSECOND,
+        ),
+    )
+
+
+def encode_evict_chat_session(session_id: uuid.UUID) -> bytes:
+    return encode(EVICT_CHAT_SESSION, session_id.bytes)
+
+
+def encode_clear() -> bytes:
+    return encode(CLEAR, b"")
+
+
+def _decode(op: int, buf, offset: int, session_ids: dict):
+    if op == ADD_MESSAGE:
+        message_id, raw_session_id, ptype, mtype, micros = _MESSAGE.unpack_from(buf, offset)
+        participant_id, offset = _read_participant_id(buf, offset + _MESSAGE.size)
+        content, _ = _read_str(buf, offset)
+        # Messages of a session share one UUID object, which saves both the
+        # parsing time and the memory of a copy per message.
+        session_id = session_ids.get(raw_session_id)
+        if session_id is None:
+            session_id = session_ids[raw_session_id] = uuid.UUID(bytes=raw_session_id)
+        return MessageData(
+            message_id=uuid.UUID(bytes=message_id),
+            session_id=session_id,
+            participant_id=participant_id,
+            participant_type=_PARTICIPANT_TYPES[ptype],
+            content=content,
+            timestamp=_EPOCH + timedelta(microseconds=micros),
+            message_type=_MESSAGE_TYPES[mtype],
+        )
+    if op in (ADD_CUSTOMER, ADD_AGENT):
+        (identifier,) = _I64.unpack_from(buf, offset)
+        name, offset = _read_str(buf, offset + 8)
+        email, _ = _read_str(buf, offset)
+        model = CustomerData if op == ADD_CUSTOMER else SupportAgentData
+        return model(identifier, name, email)
+    if op == ADD_CHAT_SESSION:
+        session_id, customer_id = _SESSION.unpack_from(buf, offset)
+        topic, offset = _read_str(buf, offset + _SESSION.size)
+        support_agent_id, offset = _read_optional_int(buf, offset)
+        (length,) = _U32.unpack_from(buf, offset)
+        strategies = (
+            StrategyRegistry.decode(bytes(buf[offset + 4 : offset + 4 + length])) if length else []
+        )
+        return ChatSessionData(
+            uuid.UUID(bytes=session_id), customer_id, topic, support_agent_id, strategies
+        )
+    if op == ADD_SUPPORT_TICKET:
+        ticket_id, session_id, agent_id, status = _TICKET.unpack_from(buf, offset)
+        issue, _ = _read_str(buf, offset + _TICKET.size)
+        return SupportTicketData(
+            agent_id,
+            uuid.UUID(bytes=session_id),
+            issue,
+            uuid.UUID(bytes=ticket_id),
+            _TICKET_STATUSES[status],
+        )
+    if op == ASSIGN_AGENT:
+        session_id, agent_id = _ASSIGN.unpack_from(buf, offset)
+        return uuid.UUID(bytes=session_id), agent_id
+    if op == UPDATE_TICKET_STATUS:
+        ticket_id, status = _TICKET_STATUS.unpack_from(buf, offset)
+        return uuid.UUID(bytes=ticket_id), _TICKET_STATUSES[status]
+    if op == END_CHAT_SESSION:
+        session_id, micros = _END_SESSION.unpack_from(buf, offset)
+        return uuid.UUID(bytes=session_id), _EPOCH + timedelta(microseconds=micros)
+    if op == SESSION_STATE:
+        session_id, status, micros = _SESSION_STATE.unpack_from(buf, offset)
+        return (
+            uuid.UUID(bytes=session_id),
+            _SESSION_STATUSES[status],
+            _EPOCH + timedelta(microseconds=micros),
+        )
+    if op == EVICT_CHAT_SESSION:
+        return uuid.UUID(bytes=bytes(buf[offset : offset + 16]))
+    if op == CLEAR:
+        return None
+    raise ValueError(f"Unknown mutation log record type: {op}")
+
+
+def intact_length(data: bytes) -> int:
+    """Return the length of the prefix of ``data`` made of intact records."""
+    buf = memoryview(data)
+    offset = 0
+    end = len(data)
+    while offset + _FRAME.size <= end:
+        _, length, crc = _FRAME.unpack_from(buf, offset)
+        start = offset + _FRAME.size
+        if start + length > end or zlib.crc32(buf[start : start + length]) != crc:
+            break
+        offset = start + length
+    return offset
+
+
+def decode_records(data: bytes) -> Iterator[Tuple[int, object]]:
+    """Yield ``(op, value)`` for every intact record in ``data``."""
+    buf = memoryview(data)
+    session_ids: dict = {}
+    offset = 0
+    end = len(data)
+    while offset + _FRAME.size <= end:
+        op, length, crc = _FRAME.unpack_from(buf, offset)
+        start = offset + _FRAME.size
+        if start + length > end or zlib.crc32(buf[start : start + length]) != crc:
+            return
+        yield op, _decode(op, buf, start, session_ids)
+        offset = start + length
+
+
+class MutationLog:
+    """
+    Append-only log of repository mutations split into numbered segment files.
+
+    A snapshot numbered ``n`` holds the state after every segment below ``n``,
+    so recovery loads the newest snapshot and replays segments from ``n`` on.
+    Writes are flushed to the OS on every append, which survives a process
+    crash; with ``fsync`` they are also forced to disk.
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        self.directory = os.fspath(directory)
+        self.fsync = fsync
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        self.segment = segments[-1] if segments else 0
+        self._file = open(self._segment_path(self.segment), "ab")
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"wal-{segment:08d}.log")
+
+    def _snapshot_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"snapshot-{segment:08d}.bin")
+
+    def _numbered(self, prefix: str) -> List[int]:
+        return sorted(
+            int(name[len(prefix) : name.index(".")])
+            for name in os.listdir(self.directory)
+            if name.startswith(prefix) and not name.endswith(".tmp")
+        )
+
+    def segments(self) -> List[int]:
+        return self._numbered("wal-")
+
+    def snapshots(self) -> List[int]:
+        return self._numbered("snapshot-")
+
+    def append(self, record: bytes) -> None:
+        self._file.write(record)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def rotate(self) -> int:
+        """Start a new segment and return its number."""
+        self._file.close()
+        self.segment += 1
+        self._file = open(self._segment_path(self.segment), "ab")
+        return self.segment
+
+    def write_snapshot(self, segment: int, records: Iterator[bytes]) -> None:
+        """Atomically write a snapshot and drop the files it supersedes."""
+        path = self._snapshot_path(segment)
+        with open(path + ".tmp", "wb") as file:
+            for record in records:
+                file.write(record)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+        for old in self.snapshots():
+            if old < segment:
+                os.remove(self._snapshot_path(old))
+        for old in self.segments():
+            if old < segment:
+                os.remove(self._segment_path(old))
+
+    def recover(self) -> Iterator[Tuple[int, object]]:
+        """Yield the records of the newest snapshot followed by the log tail."""
+        snapshots = self.snapshots()
+        first_segment = 0
+        if snapshots:
+            first_segment = snapshots[-1]
+            with open(self._snapshot_path(first_segment), "rb") as file:
+                yield from decode_records(file.read())
+        for segment in self.segments():
+            if segment >= first_segment:
+                with open(self._segment_path(segment), "rb") as file:
+                    data = file.read()
+                yield from decode_records(data)
+                if segment == self.segment:
+                    # Cut off a torn tail so new records are appended after
+                    # the last intact one.
+                    length = intact_length(data)
+                    if length < len(data):
+                        os.truncate(self._segment_path(segment), length)
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,619 @@
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import threading
+import time
+import uuid
+
+from chat.models.customer_data import CustomerData
+from chat.models.enums import SessionStatus, TicketStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository import mutation_log
+from chat.repository.base_repository import BaseRepository
+from chat.repository.resp import RespConnection, RespError, parse_url
+from chat.strategies.strategy_registry import StrategyRegistry
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Commands per round trip when reading many sessions or deleting many keys.
+_CHUNK = 1000
+
+
+def _to_micros(timestamp: datetime) -> int:
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(micros) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(float(micros)))
+
+
+def _decode(record: bytes):
+    # Records are stored in the mutation log's binary encoding.
+    return next(mutation_log.decode_records(record))[1]
+
+
+@lru_cache(maxsize=1024)
+def _load_strategies(blob: bytes) -> list:
+    return StrategyRegistry.decode(blob)
+
+
+def _int_key(field: bytes) -> int:
+    return int(field)
+
+
+def _uuid_key(field: bytes) -> uuid.UUID:
+    return uuid.UUID(bytes=field)
+
+
+class _Hash(Mapping):
+    """A read-only mapping view over one hash of encoded records."""
+
+    def __init__(
+        self,
+        repository: "RedisRepository",
+        key: bytes,
+        encode_key: Callable,
+        decode_key: Callable,
+    ):
+        self._repository = repository
+        self._key = key
+        self._encode_key = encode_key
+        self._decode_key = decode_key
+
+    def get(self, key, default=None):
+        try:
+            field = self._encode_key(key)
+        except (AttributeError, TypeError, ValueError):
+            return default
+        record = self._repository._execute("HGET", self._key, field)
+        return default if record is None else _decode(record)
+
+    def __getitem__(self, key):
+        model = self.get(key)
+        if model is None:
+            raise KeyError(key)
+        return model
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator:
+        fields = self._repository._execute("HKEYS", self._key)
+        return (self._decode_key(field) for field in fields)
+
+    def __len__(self) -> int:
+        return self._repository._execute("HLEN", self._key)
+
+    def values(self) -> List:  # type: ignore[override]
+        pairs = self._repository._execute("HGETALL", self._key)
+        return [_decode(record) for record in pairs[1::2]]
+
+
+class _Sessions(Mapping):
+    """A read-only mapping view over the session hashes, in creation order."""
+
+    def __init__(self, repository: "RedisRepository"):
+        self._repository = repository
+
+    def get(self, key, default=None):
+        if not isinstance(key, uuid.UUID):
+            return default
+        session = self._repository.get_chat_session(key)
+        return default if session is None else session
+
+    def __getitem__(self, key):
+        session = self.get(key)
+        if session is None:
+            raise KeyError(key)
+        return session
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator:
+        members = self._repository._execute("ZRANGE", self._repository._sessions, 0, -1)
+        return (uuid.UUID(bytes=member) for member in members)
+
+    def __len__(self) -> int:
+        return self._repository._execute("ZCARD", self._repository._sessions)
+
+    def values(self) -> List:  # type: ignore[override]
+        return self._repository.list_chat_sessions()
+
+
+class RedisRepository(BaseRepository):
+    """
+    A repository backend keeping all data in a Redis server.
+
+    Unlike the other backends its state is shared by every process connected
+    to the same server, so several API workers can serve the same sessions.
+    Each session is a hash, with its message ids in a list in the order they
+    were added and their timestamps in a sorted set for
+    ``session_position_after``. Sorted sets order the sessions and tickets by
+    creation and track last activity, for all sessions and for the open ones
+    that ``idle_sessions`` looks at. Customers, agents, messages and tickets
+    are kept in one hash each, as records in the mutation log's encoding.
+
+    Writes are pipelined, so adding a message or a batch of them is one round
+    trip. Updates that depend on the current state, like assigning an agent,
+    run as ``WATCH``/``MULTI``/``EXEC`` transactions and retry on conflict.
+    Every thread uses a connection of its own. ``chat.repository.resp_server``
+    provides a stand-in server for tests and local development.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", prefix: str = "chat:"):
+        self.url = url
+        self.prefix = prefix.encode()
+        self._address = parse_url(url)
+        self._local = threading.local()
+        self._connections: List[RespConnection] = []
+        self._connections_lock = threading.Lock()
+
+        self._customers = self._key("customers")
+        self._agents = self._key("agents")
+        self._messages = self._key("messages")
+        self._tickets = self._key("tickets")
+        self._sessions = self._key("sessions")
+        self._activity = self._key("sessions:activity")
+        self._idle = self._key("sessions:idle")
+        self._ticket_order = self._key("tickets:order")
+
+        self.customers = _Hash(self, self._customers, lambda key: b"%d" % key, _int_key)
+        self.agents = _Hash(self, self._agents, lambda key: b"%d" % key, _int_key)
+        self.chat_sessions = _Sessions(self)
+        self.messages = _Hash(self, self._messages, lambda key: key.bytes, _uuid_key)
+        self.support_tickets = _Hash(self, self._tickets, lambda key: key.bytes, _uuid_key)
+        # Fail early if the server cannot be reached.
+        self._execute("PING")
+
+    def _key(self, name: str) -> bytes:
+        return self.prefix + name.encode()
+
+    def _session_key(self, session_id: uuid.UUID, suffix: str = "") -> bytes:
+        return self._key(f"session:{session_id.hex}{suffix}")
+
+    def _customer_sessions_key(self, customer_id: int) -> bytes:
+        return self._key(f"sessions:customer:{customer_id}")
+
+    def _agent_sessions_key(self, agent_id: int) -> bytes:
+        return self._key(f"sessions:agent:{agent_id}")
+
+    def _connection(self) -> RespConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = RespConnection(*self._address)
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _drop_connection(self) -> None:
+        # A connection that failed mid-reply is out of sync; the next call reconnects.
+        connection = self._local.__dict__.pop("connection", None)
+        if connection is not None:
+            with self._connections_lock:
+                self._connections.remove(connection)
+            connection.close()
+
+    def _execute(self, *args):
+        try:
+            return self._connection().execute(*args)
+        except OSError:
+            self._drop_connection()
+            raise
+
+    def _pipeline(self, commands: Sequence[Sequence]) -> list:
+        try:
+            replies = self._connection().pipeline(commands)
+        except OSError:
+            self._drop_connection()
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def _transaction(self, keys: Sequence[bytes], read: Callable, write: Callable) -> list:
+        """
+        Run ``write(read())`` atomically, retrying while ``keys`` change meanwhile.
+
+        ``read`` returns the current state through ``_pipeline``; ``write``
+        returns the commands to apply, or raises to abort.
+        """
+        while True:
+            self._execute("WATCH", *keys)
+            try:
+                commands = write(read())
+            except BaseException:
+                self._execute("UNWATCH")
+                raise
+            replies = self._pipeline([("MULTI",), *commands, ("EXEC",)])
+            if replies[-1] is not None:
+                return replies[-1]
+
+    @staticmethod
+    def _order_score() -> int:
+        # Wall-clock microseconds order records created by different workers.
+        return time.time_ns() // 1000
+
+    def add_customer(self, customer: CustomerData):
+        self._execute(
+            "HSET",
+            self._customers,
+            b"%d" % customer.customer_id,
+            mutation_log.encode_customer(customer),
+        )
+
+    def add_agent(self, agent: SupportAgentData):
+        self._execute(
+            "HSET", self._agents, b"%d" % agent.agent_id, mutation_log.encode_agent(agent)
+        )
+
+    def add_chat_session(self, session: ChatSessionData):
+        key = self._session_key(session.session_id)
+        member = session.session_id.bytes
+        last_activity = _to_micros(session.last_activity)
+        order_score = self._order_score()
+        fields = [b"customer_id", session.customer_id, b"topic", session.topic]
+        fields += [b"status", session.status.value]
+        # Sessions are stored once, when created, so their customer and
+        # agent indexes only gain entries here.
+        indexes = [("ZADD", self._customer_sessions_key(session.customer_id), order_score, member)]
+        if session.support_agent_id is not None:
+            fields += [b"agent", session.support_agent_id]
+            indexes.append(
+                ("ZADD", self._agent_sessions_key(session.support_agent_id), order_score, member)
+            )
+        if session.strategies:
+            fields += [b"strategies", StrategyRegistry.encode(session.strategies)]
+        if session.ended_at is not None:
+            fields += [b"ended_at", _to_micros(session.ended_at)]
+            idle = ("ZREM", self._idle, member)
+        else:
+            idle = ("ZADD", self._idle, last_activity, member)
+        self._pipeline(
+            [
+                ("MULTI",),
+                ("DEL", key),
+                ("HSET", key, *fields),
+                ("ZADD", self._sessions, "NX", order_score, member),
+                ("ZADD", self._activity, last_activity, member),
+                idle,
+                *indexes,
+                ("EXEC",),
+            ]
+        )
+
+    def add_message(self, message: MessageData):
+        self.add_messages((message,))
+
+    def add_messages(self, messages: Iterable[MessageData]):
+        records = []
+        by_session: Dict[uuid.UUID, List[MessageData]] = {}
+        for message in messages:
+            records += [message.message_id.bytes, mutation_log.encode_message(message)]
+            by_session.setdefault(message.session_id, []).append(message)
+        if not records:
+            return
+        # The records go first, so a reader never finds an id without its message.
+        commands = [("HSET", self._messages, *records)]
+        for session_id, session_messages in by_session.items():
+            ids = [message.message_id.bytes for message in session_messages]
+            times = []
+            for message in session_messages:
+                times += [_to_micros(message.timestamp), message.message_id.bytes]
+            last_activity = max(times[::2])
+            commands += [
+                ("RPUSH", self._session_key(session_id, ":messages"), *ids),
+                ("ZADD", self._session_key(session_id, ":times"), *times),
+                # Only sessions that exist, and only forward.
+                ("ZADD", self._activity, "XX", "GT", last_activity, session_id.bytes),
+                ("ZADD", self._idle, "XX", "GT", last_activity, session_id.bytes),
+            ]
+        self._pipeline(commands)
+
+    def add_support_ticket(self, ticket: SupportTicketData):
+        member = ticket.ticket_id.bytes
+        score = self._order_score()
+        self._pipeline(
+            [
+                ("MULTI",),
+                ("HSET", self._tickets, member, mutation_log.encode_support_ticket(ticket)),
+                *(
+                    ("ZADD", index, score, member)
+                    for index in self._ticket_indexes(ticket)
+                ),
+                ("EXEC",),
+            ]
+        )
+
+    def _ticket_indexes(self, ticket: SupportTicketData) -> List[bytes]:
+        status = ticket.status.value
+        return [
+            self._ticket_order,
+            self._key(f"tickets:status:{status}"),
+            self._key(f"tickets:agent:{ticket.agent_id}"),
+            self._key(f"tickets:agent:{ticket.agent_id}:{status}"),
+            self._key(f"tickets:session:{ticket.session_id.hex}"),
+        ]
+
+    def _update_session(self, session_id: uuid.UUID, update: Callable) -> None:
+        """Apply ``update(fields)`` to a session's hash; ``KeyError`` if it does not exist."""
+        key = self._session_key(session_id)
+
+        def read():
+            return self._pipeline([("HGETALL", key)])[0]
+
+        def write(pairs):
+            if not pairs:
+                raise KeyError(session_id)
+            return update(dict(zip(pairs[::2], pairs[1::2])))
+
+        self._transaction([key], read, write)
+
+    def assign_agent(self, session_id: uuid.UUID, agent_id: int):
+        key = self._session_key(session_id)
+
+        member = session_id.bytes
+
+        def update(fields):
+            commands = []
+            if b"agent" in fields:
+                commands.append(("ZREM", self._agent_sessions_key(int(fields[b"agent"])), member))
+            commands.append(
+                ("ZADD", self._agent_sessions_key(agent_id), self._order_score(), member)
+            )
+            if b"ended_at" in fields:
+                return [*commands, ("HSET", key, b"agent", agent_id)]
+            return [
+                *commands,
+                ("HSET", key, b"agent", agent_id, b"status", SessionStatus.ACTIVE.value),
+            ]
+
+        self._update_session(session_id, update)
+
+    def set_session_status(self, session_id: uuid.UUID, status: SessionStatus):
+        key = self._session_key(session_id)
+        self._update_session(session_id, lambda fields: [("HSET", key, b"status", status.value)])
+
+    def end_chat_session(self, session_id: uuid.UUID, ended_at: datetime):
+        key = self._session_key(session_id)
+        self._update_session(
+            session_id,
+            lambda fields: [
+                (
+                    "HSET",
+                    key,
+                    b"ended_at",
+                    _to_micros(ended_at),
+                    b"status",
+                    SessionStatus.CLOSED.value,
+                ),
+                ("ZREM", self._idle, session_id.bytes),
+            ],
+        )
+
+    def update_ticket_status(self, ticket_id: uuid.UUID, status: TicketStatus):
+        member = ticket_id.bytes
+
+        def read():
+            return self._pipeline(
+                [("HGET", self._tickets, member), ("ZSCORE", self._ticket_order, member)]
+            )
+
+        def write(current):
+            record, score = current
+            if record is None:
+                raise KeyError(ticket_id)
+            ticket = _decode(record)
+            commands = [("ZREM", index, member) for index in self._ticket_indexes(ticket)]
+            ticket.status = status
+            record = mutation_log.encode_support_ticket(ticket)
+            commands.append(("HSET", self._tickets, member, record))
+            commands += [("ZADD", index, score, member) for index in self._ticket_indexes(ticket)]
+            return commands
+
+        self._transaction([self._tickets], read, write)
+
+    def get_customer(self, customer_id: int) -> Optional[CustomerData]:
+        return self.customers.get(customer_id)
+
+    def get_agent(self, agent_id: int) -> Optional[SupportAgentData]:
+        return self.agents.get(agent_id)
+
+    def _session_commands(self, session_id: uuid.UUID) -> List[tuple]:
+        return [
+            ("HGETALL", self._session_key(session_id)),
+            ("ZSCORE", self._activity, session_id.bytes),
+        ]
+
+    @staticmethod
+    def _session(session_id: uuid.UUID, pairs: list, last_activity) -> Optional[ChatSessionData]:
+        if not pairs:
+            return None
+        fields = dict(zip(pairs[::2], pairs[1::2]))
+        agent = fields.get(b"agent")
+        strategies = fields.get(b"strategies")
+        ended_at = fields.get(b"ended_at")
+        return ChatSessionData(
+            session_id=session_id,
+            customer_id=int(fields[b"customer_id"]),
+            topic=fields[b"topic"].decode(),
+            support_agent_id=None if agent is None else int(agent),
+            strategies=list(_load_strategies(strategies)) if strategies else [],
+            ended_at=None if ended_at is None else _from_micros(ended_at),
+            status=SessionStatus(fields[b"status"].decode()),
+            last_activity=_from_micros(last_activity or 0),
+        )
+
+    def get_chat_session(self, session_id: uuid.UUID) -> Optional[ChatSessionData]:
+        pairs, last_activity = self._pipeline(self._session_commands(session_id))
+        return self._session(session_id, pairs, last_activity)
+
+    def get_message(
+        self, message_id: uuid.UUID, session_id: Optional[uuid.UUID] = None
+    ) -> Optional[MessageData]:
+        return self.messages.get(message_id)
+
+    def get_support_ticket(self, ticket_id: uuid.UUID) -> Optional[SupportTicketData]:
+        return self.support_tickets.get(ticket_id)
+
+    def list_customers(self) -> List[CustomerData]:
+        return sorted(self.customers.values(), key=lambda customer: customer.customer_id)
+
+    def list_agents(self) -> List[SupportAgentData]:
+        return sorted(self.agents.values(), key=lambda agent: agent.agent_id)
+
+    def list_chat_sessions(self) -> List[ChatSessionData]:
+        return list(self.iter_chat_sessions(_CHUNK))
+
+    def find_chat_session_ids(
+        self, customer_id: Optional[int] = None, agent_id: Optional[int] = None
+    ) -> List[uuid.UUID]:
+        keys = []
+        if customer_id is not None:
+            keys.append(self._customer_sessions_key(customer_id))
+        if agent_id is not None:
+            keys.append(self._agent_sessions_key(agent_id))
+        if not keys:
+            keys.append(self._sessions)
+        replies = self._pipeline([("ZRANGE", key, 0, -1) for key in keys])
+        members = replies[0]
+        if len(replies) > 1:
+            agent_members = set(replies[1])
+            members = [member for member in members if member in agent_members]
+        return [uuid.UUID(bytes=member) for member in members]
+
+    def iter_chat_sessions(self, batch_size: int = 1000) -> Iterator[ChatSessionData]:
+        # Sessions are ordered by creation, so new ones only extend the range.
+        start = 0
+        while True:
+            members = self._execute("ZRANGE", self._sessions, start, start + batch_size - 1)
+            chunk = [uuid.UUID(bytes=member) for member in members]
+            if not chunk:
+                return
+            replies = self._pipeline(
+                [command for session_id in chunk for command in self._session_commands(session_id)]
+            )
+            for i, session_id in enumerate(chunk):
+                session = self._session(session_id, replies[2 * i], replies[2 * i + 1])
+                if session is not None:
+                    yield session
+            if len(chunk) < batch_size:
+                return
+            start += batch_size
+
+    def _ticket_index(
+        self,
+        status: Optional[TicketStatus],
+        agent_id: Optional[int],
+        session_id: Optional[uuid.UUID],
+    ) -> Tuple[bytes, bool]:
+        """Return the index to read and whether it matches the filters exactly."""
+        if session_id is not None:
+            return self._key(f"tickets:session:{session_id.hex}"), (
+                status is None and agent_id is None
+            )
+        if agent_id is not None and status is not None:
+            return self._key(f"tickets:agent:{agent_id}:{status.value}"), True
+        if agent_id is not None:
+            return self._key(f"tickets:agent:{agent_id}"), True
+        if status is not None:
+            return self._key(f"tickets:status:{status.value}"), True
+        return self._ticket_order, True
+
+    def _tickets_by_ids(self, members: list) -> List[SupportTicketData]:
+        if not members:
+            return []
+        records = self._execute("HMGET", self._tickets, *members)
+        return [_decode(record) for record in records if record is not None]
+
+    def _filtered_tickets(self, index, status, agent_id) -> List[SupportTicketData]:
+        # A session has few tickets; the other filters are checked here.
+        return [
+            ticket
+            for ticket in self._tickets_by_ids(self._execute("ZRANGE", index, 0, -1))
+            if (status is None or ticket.status == status)
+            and (agent_id is None or ticket.agent_id == agent_id)
+        ]
+
+    def list_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> List[SupportTicketData]:
+        index, exact = self._ticket_index(status, agent_id, session_id)
+        if not exact:
+            return self._filtered_tickets(index, status, agent_id)[start:stop]
+        if stop is not None and stop <= start:
+            return []
+        members = self._execute("ZRANGE", index, start, -1 if stop is None else stop - 1)
+        return self._tickets_by_ids(members)
+
+    def count_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+    ) -> int:
+        index, exact = self._ticket_index(status, agent_id, session_id)
+        if not exact:
+            return len(self._filtered_tickets(index, status, agent_id))
+        return self._execute("ZCARD", index)
+
+    def get_session_messages(
+        self, session_id: uuid.UUID, start: int = 0, stop: Optional[int] = None
+    ) -> List[MessageData]:
+        key = self._session_key(session_id, ":messages")
+        if start < 0 or (stop is not None and stop < 0):
+            start, stop, _ = slice(start, stop).indices(self._execute("LLEN", key))
+        if stop is not None and stop <= start:
+            return []
+        ids = self._execute("LRANGE", key, start, -1 if stop is None else stop - 1)
+        if not ids:
+            return []
+        records = self._execute("HMGET", self._messages, *ids)
+        return [_decode(record) for record in records if record is not None]
+
+    def count_session_messages(self, session_id: uuid.UUID) -> int:
+        return self._execute("LLEN", self._session_key(session_id, ":messages"))
+
+    def session_position_after(self, session_id: uuid.UUID, timestamp: datetime) -> int:
+        return self._execute(
+            "ZCOUNT", self._session_key(session_id, ":times"), "-inf", _to_micros(timestamp)
+        )
+
+    def idle_sessions(self, before: datetime, limit: int) -> List[uuid.UUID]:
+        members = self._execute(
+            "ZRANGEBYSCORE", self._idle, "-inf", f"({_to_micros(before)}", "LIMIT", 0, limit
+        )
+        return [uuid.UUID(bytes=member) for member in members]
+
+    def evict_chat_sessions(self, ended_before: datetime, limit: int) -> List[uuid.UUID]:
+        # The data lives in the server, not in this process.
+        return []
+
+    def clear(self):
+        """Delete every key under the prefix."""
+        cursor = b"0"
+        while True:
+            cursor, keys = self._execute(
+                "SCAN", cursor, "MATCH", self.prefix + b"*", "COUNT", _CHUNK
+            )
+            for start in range(0, len(keys), _CHUNK):
+                self._execute("DEL", *keys[start : start + _CHUNK])
+            if cursor == b"0":
+                break
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -1,81 +1,230 @@
-from typing import Dict, Optional
+from datetime import datetime
+from typing import Iterable, Iterator, List, Mapping, Optional
 import uuid
-import threading
 
+from chat.config import Settings, settings
 from chat.models.customer_data import CustomerData
-from chat.models.enums import MessageType, ParticipantType
+from chat.models.enums import MessageType, ParticipantType, SessionStatus, TicketStatus
 from chat.models.support_agent_data import SupportAgentData
 from chat.models.chat_session_data import ChatSessionData
 from chat.models.message_data import MessageData
 from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.base_repository import BaseRepository
+from chat.repository.durable_memory_repository import DurableInMemoryRepository
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.redis_repository import RedisRepository
+from chat.repository.sqlite_repository import SQLiteRepository
+from chat.utils.metrics import Metrics
+
+
+def create_repository(config: Settings) -> BaseRepository:
+    """Build the storage backend selected by the settings."""
+    if config.repository_backend == "memory":
+        if config.durability_dir:
+            return DurableInMemoryRepository(
+                config.durability_dir,
+                snapshot_interval=config.snapshot_interval,
+                fsync=config.wal_fsync,
+            )
+        return InMemoryRepository()
+    if config.repository_backend == "sqlite":
+        return SQLiteRepository(config.sqlite_path)
+    if config.repository_backend == "redis":
+        return RedisRepository(config.redis_url, config.redis_prefix)
+    raise ValueError(f"Unknown repository backend: {config.repository_backend}")
 
 
 class Repository:
     """
-    A thread-safe repository class for managing in-memory data storage.
+    The application-wide access point to the configured storage backend.
 
-    This class stores customers, agents, chat sessions, messages, and support tickets
-    in shared dictionaries. All operations are synchronized using a threading lock
-    to ensure thread safety in a concurrent environment.
+    All methods delegate to the backend installed with ``configure``; by default
+    that is the one selected by ``chat.config.settings``. The backend's
+    collections are exposed as read-only mappings such as ``Repository.messages``.
+    See ``InMemoryRepository``, ``SQLiteRepository`` and ``RedisRepository``
+    for the available backends.
     """
 
-    _lock = threading.Lock()
+    _backend: BaseRepository
+    # Incremented whenever the backend is replaced or cleared, so caches of
+    # repository data can tell that they are stale.
+    generation: int = 0
+
+    customers: Mapping[int, CustomerData]
+    agents: Mapping[int, SupportAgentData]
+    chat_sessions: Mapping[uuid.UUID, ChatSessionData]
+    messages: Mapping[uuid.UUID, MessageData]
+    support_tickets: Mapping[uuid.UUID, SupportTicketData]
 
-    customers: Dict[int, CustomerData] = {}
-    agents: Dict[int, SupportAgentData] = {}
-    chat_sessions: Dict[uuid.UUID, ChatSessionData] = {}
-    messages: Dict[uuid.UUID, MessageData] = {}
-    support_tickets: Dict[uuid.UUID, SupportTicketData] = {}
+    @classmethod
+    def configure(cls, backend: BaseRepository):
+        cls._backend = backend
+        cls.generation += 1
+        cls.customers = backend.customers
+        cls.agents = backend.agents
+        cls.chat_sessions = backend.chat_sessions
+        cls.messages = backend.messages
+        cls.support_tickets = backend.support_tickets
+
+    @classmethod
+    def backend(cls) -> BaseRepository:
+        return cls._backend
 
     @classmethod
     def add_customer(cls, customer: CustomerData):
-        with cls._lock:
-            cls.customers[customer.customer_id] = customer
+        cls._backend.add_customer(customer)
 
     @classmethod
     def add_agent(cls, agent: SupportAgentData):
-        with cls._lock:
-            cls.agents[agent.agent_id] = agent
+        cls._backend.add_agent(agent)
 
     @classmethod
     def add_chat_session(cls, session: ChatSessionData):
-        with cls._lock:
-            cls.chat_sessions[session.session_id] = session
+        cls._backend.add_chat_session(session)
 
     @classmethod
     def add_message(cls, message: MessageData):
-        with cls._lock:
-            cls.messages[message.message_id] = message
+        cls._backend.add_message(message)
+
+    @classmethod
+    def add_messages(cls, messages: Iterable[MessageData]):
+        cls._backend.add_messages(messages)
 
     @classmethod
     def add_support_ticket(cls, ticket: SupportTicketData):
-        with cls._lock:
-            cls.support_tickets[ticket.ticket_id] = ticket
+        cls._backend.add_support_ticket(ticket)
+
+    @classmethod
+    def assign_agent(cls, session_id: uuid.UUID, agent_id: int):
+        cls._backend.assign_agent(session_id, agent_id)
+
+    @classmethod
+    def set_session_status(cls, session_id: uuid.UUID, status: SessionStatus):
+        cls._backend.set_session_status(session_id, status)
+
+    @classmethod
+    def update_ticket_status(cls, ticket_id: uuid.UUID, status: TicketStatus):
+        cls._backend.update_ticket_status(ticket_id, status)
+
+    @classmethod
+    def end_chat_session(cls, session_id: uuid.UUID, ended_at: datetime):
+        cls._backend.end_chat_session(session_id, ended_at)
 
     @classmethod
     def get_customer(cls, customer_id: int) -> Optional[CustomerData]:
-        with cls._lock:
-            return cls.customers.get(customer_id)
+        return cls._backend.get_customer(customer_id)
 
     @classmethod
     def get_agent(cls, agent_id: int) -> Optional[SupportAgentData]:
-        with cls._lock:
-            return cls.agents.get(agent_id)
+        return cls._backend.get_agent(agent_id)
 
     @classmethod
     def get_chat_session(cls, session_id: uuid.UUID) -> Optional[ChatSessionData]:
-        with cls._lock:
-            return cls.chat_sessions.get(session_id)
+        return cls._backend.get_chat_session(session_id)
 
     @classmethod
-    def get_message(cls, message_id: uuid.UUID) -> Optional[MessageData]:
-        with cls._lock:
-            return cls.messages.get(message_id)
+    def get_message(
+        cls, message_id: uuid.UUID, session_id: Optional[uuid.UUID] = None
+    ) -> Optional[MessageData]:
+        return cls._backend.get_message(message_id, session_id)
 
     @classmethod
     def get_support_ticket(cls, ticket_id: uuid.UUID) -> Optional[SupportTicketData]:
-        with cls._lock:
-            return cls.support_tickets.get(ticket_id)
+        return cls._backend.get_support_ticket(ticket_id)
+
+    @classmethod
+    def list_customers(cls) -> List[CustomerData]:
+        return cls._backend.list_customers()
+
+    @classmethod
+    def list_agents(cls) -> List[SupportAgentData]:
+        return cls._backend.list_agents()
+
+    @classmethod
+    def list_chat_sessions(cls) -> List[ChatSessionData]:
+        return cls._backend.list_chat_sessions()
+
+    @classmethod
+    def find_chat_session_ids(
+        cls, customer_id: Optional[int] = None, agent_id: Optional[int] = None
+    ) -> List[uuid.UUID]:
+        return cls._backend.find_chat_session_ids(customer_id, agent_id)
+
+    @classmethod
+    def iter_chat_sessions(cls, batch_size: int = 1000) -> Iterator[ChatSessionData]:
+        return cls._backend.iter_chat_sessions(batch_size)
+
+    @classmethod
+    def list_tickets(
+        cls,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> List[SupportTicketData]:
+        """Return the tickets matching all the given filters; see ``BaseRepository``."""
+        return cls._backend.list_tickets(status, agent_id, session_id, start, stop)
+
+    @classmethod
+    def count_tickets(
+        cls,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+    ) -> int:
+        return cls._backend.count_tickets(status, agent_id, session_id)
+
+    @classmethod
+    def get_session_messages(
+        cls, session_id: uuid.UUID, start: int = 0, stop: Optional[int] = None
+    ) -> List[MessageData]:
+        """
+        Return the messages of a session in the order they were added.
+
+        ``start`` and ``stop`` are positions in that order and work like a slice.
+        """
+        return cls._backend.get_session_messages(session_id, start, stop)
+
+    @classmethod
+    def count_session_messages(cls, session_id: uuid.UUID) -> int:
+        return cls._backend.count_session_messages(session_id)
+
+    @classmethod
+    def session_position_after(cls, session_id: uuid.UUID, timestamp: datetime) -> int:
+        """Return the position of the first message of a session sent after ``timestamp``."""
+        return cls._backend.session_position_after(session_id, timestamp)
+
+    @classmethod
+    def idle_sessions(cls, before: datetime, limit: int) -> List[uuid.UUID]:
+        """Return up to ``limit`` sessions not ended whose last activity was before ``before``."""
+        return cls._backend.idle_sessions(before, limit)
+
+    @classmethod
+    def evict_chat_sessions(cls, ended_before: datetime, limit: int) -> List[uuid.UUID]:
+        """Drop up to ``limit`` sessions that ended before ``ended_before`` from memory."""
+        return cls._backend.evict_chat_sessions(ended_before, limit)
+
+    @classmethod
+    def clear(cls):
+        cls._backend.clear()
+        cls.generation += 1
+
+
+Repository.configure(create_repository(settings))
+
+Metrics.gauge(
+    "chat_repository_items",
+    "Number of stored items per collection.",
+    ("collection",),
+    lambda: {
+        ("customers",): len(Repository.customers),
+        ("agents",): len(Repository.agents),
+        ("chat_sessions",): len(Repository.chat_sessions),
+        ("messages",): len(Repository.messages),
+        ("support_tickets",): len(Repository.support_tickets),
+    },
+)
 
 
 # Example usage
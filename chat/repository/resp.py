@@ -0,0 +1,115 @@
+"""
+A minimal client for the Redis serialization protocol (RESP2).
+
+It covers what ``RedisRepository`` needs: sending commands, alone or
+pipelined, and parsing the replies. Any server speaking the protocol works,
+a real Redis as well as the stand-in in ``chat.repository.resp_server``.
+"""
+from typing import List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+import socket
+
+Arg = Union[bytes, str, int, float]
+
+
+class RespError(Exception):
+    """An error reply from the server."""
+
+
+def parse_url(url: str) -> Tuple[str, int, int]:
+    """Return host, port and database number of a ``redis://host:port/db`` URL."""
+    parsed = urlparse(url)
+    if parsed.scheme != "redis":
+        raise ValueError(f"Unsupported URL scheme: {url}")
+    database = int(parsed.path.lstrip("/") or 0)
+    return parsed.hostname or "127.0.0.1", parsed.port or 6379, database
+
+
+def _encode_arg(arg: Arg) -> bytes:
+    if isinstance(arg, bytes):
+        return arg
+    if isinstance(arg, str):
+        return arg.encode()
+    if isinstance(arg, bool):
+        raise TypeError("Booleans are not valid command arguments.")
+    return str(arg).encode()
+
+
+def encode_command(args: Sequence[Arg], out: bytearray) -> None:
+    """Append one command to ``out`` as an array of bulk strings."""
+    out += b"*%d\r\n" % len(args)
+    for arg in args:
+        data = _encode_arg(arg)
+        out += b"$%d\r\n" % len(data)
+        out += data
+        out += b"\r\n"
+
+
+class RespConnection:
+    """
+    One connection to a RESP server; not thread-safe.
+
+    ``pipeline`` writes a batch of commands at once and then reads all their
+    replies, so a batch costs one round trip. Error replies are returned in
+    place by ``pipeline`` and raised by ``execute``.
+    """
+
+    def __init__(self, host: str, port: int, database: int = 0, timeout: Optional[float] = 10.0):
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._socket.makefile("rb")
+        if database:
+            self.execute("SELECT", database)
+
+    def execute(self, *args: Arg):
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands: Sequence[Sequence[Arg]]) -> List:
+        self.send(commands)
+        return [self.read() for _ in commands]
+
+    def send(self, commands: Sequence[Sequence[Arg]]) -> None:
+        """Write commands without waiting for their replies."""
+        out = bytearray()
+        for command in commands:
+            encode_command(command, out)
+        self._socket.sendall(out)
+
+    def shutdown(self) -> None:
+        """Wake up a thread blocked in ``read``, which then raises ``ConnectionError``."""
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def read(self):
+        """Read the next reply, or the next pushed message of a subscription."""
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the server.")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b":":
+            return int(rest)
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self.read() for _ in range(length)]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RespError(rest.decode())
+        raise ConnectionError(f"Unexpected reply from the server: {line!r}")
+
+    def close(self) -> None:
+        self._reader.close()
+        self._socket.close()
@@ -0,0 +1,590 @@
+"""
+An in-process stand-in for a Redis server.
+
+It speaks RESP2 and implements the commands ``RedisRepository`` and
+``RespBroker`` use, with the same semantics, on plain Python containers:
+strings, hashes, lists and sorted sets, ``SCAN``, ``WATCH``/``MULTI``/``EXEC``
+transactions and ``PUBLISH``/``SUBSCRIBE``. It makes the Redis backends
+testable without a Redis installation and lets several local worker
+processes share state during development. Data is kept in memory only.
+
+Start it in a background thread with ``RespServer().start()``, or as a
+process with ``python -m chat.repository.resp_server --port 6379``.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import argparse
+import asyncio
+import math
+import threading
+
+from chat.repository.resp import RespError
+from chat.utils.logging import logging
+
+
+class _Simple(str):
+    """A simple string reply, such as ``OK``."""
+
+
+_OK = _Simple("OK")
+_QUEUED = _Simple("QUEUED")
+_NIL_ARRAY = object()
+
+
+class _Replies(list):
+    """Several replies to one command, as ``SUBSCRIBE`` sends one per channel."""
+
+_WRONGTYPE = RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+_SYNTAX = RespError("ERR syntax error")
+
+
+class _SortedSet:
+    """Members with scores, kept ordered by (score, member) like a Redis zset."""
+
+    __slots__ = ("scores", "order")
+
+    def __init__(self):
+        self.scores: Dict[bytes, float] = {}
+        self.order: List[Tuple[float, bytes]] = []
+
+    def add(self, member: bytes, score: float) -> None:
+        previous = self.scores.get(member)
+        if previous is not None:
+            del self.order[bisect_left(self.order, (previous, member))]
+        self.scores[member] = score
+        insort(self.order, (score, member))
+
+    def remove(self, member: bytes) -> bool:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        del self.order[bisect_left(self.order, (score, member))]
+        return True
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def range_by_score(self, low: bytes, high: bytes) -> Tuple[int, int]:
+        """Return the positions ``[start, stop)`` of the members within the bounds."""
+        minimum, min_exclusive = _score_bound(low)
+        maximum, max_exclusive = _score_bound(high)
+        if min_exclusive:
+            start = bisect_right(self.order, minimum, key=_score)
+        else:
+            start = bisect_left(self.order, minimum, key=_score)
+        if max_exclusive:
+            stop = bisect_left(self.order, maximum, key=_score)
+        else:
+            stop = bisect_right(self.order, maximum, key=_score)
+        return start, max(start, stop)
+
+
+def _score(entry: Tuple[float, bytes]) -> float:
+    return entry[0]
+
+
+def _score_bound(value: bytes) -> Tuple[float, bool]:
+    exclusive = value.startswith(b"(")
+    if exclusive:
+        value = value[1:]
+    return float(value), exclusive
+
+
+def _format_score(score: float) -> bytes:
+    if score == int(score) and not math.isinf(score):
+        return b"%d" % score
+    return repr(score).encode()
+
+
+def _rank_range(start: int, stop: int, length: int) -> Tuple[int, int]:
+    """Translate inclusive, possibly negative, Redis positions to a slice."""
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop = length + stop
+    return start, min(stop, length - 1) + 1
+
+
+def encode_reply(value, out: bytearray) -> None:
+    if value is None:
+        out += b"$-1\r\n"
+    elif isinstance(value, bytes):
+        out += b"$%d\r\n" % len(value)
+        out += value
+        out += b"\r\n"
+    elif isinstance(value, _Simple):
+        out += b"+%s\r\n" % value.encode()
+    elif isinstance(value, int):
+        out += b":%d\r\n" % value
+    elif isinstance(value, list):
+        out += b"*%d\r\n" % len(value)
+        for item in value:
+            encode_reply(item, out)
+    elif isinstance(value, RespError):
+        out += b"-%s\r\n" % str(value).encode()
+    elif value is _NIL_ARRAY:
+        out += b"*-1\r\n"
+    else:
+        raise TypeError(f"Cannot encode reply {value!r}")
+
+
+def parse_command(buffer: bytearray, position: int) -> Optional[Tuple[List[bytes], int]]:
+    """Parse one command at ``position``; ``None`` if it is not complete yet."""
+    end = buffer.find(b"\r\n", position)
+    if end < 0:
+        return None
+    if buffer[position : position + 1] != b"*":
+        # An inline command, as typed into telnet.
+        return bytes(buffer[position:end]).split(), end + 2
+    count = int(buffer[position + 1 : end])
+    position = end + 2
+    args = []
+    for _ in range(count):
+        end = buffer.find(b"\r\n", position)
+        if end < 0:
+            return None
+        length = int(buffer[position + 1 : end])
+        start = end + 2
+        if len(buffer) < start + length + 2:
+            return None
+        args.append(bytes(buffer[start : start + length]))
+        position = start + length + 2
+    return args, position
+
+
+class _Connection(asyncio.Protocol):
+    def __init__(self, server: "RespServer"):
+        self.server = server
+        self.database = 0
+        self.buffer = bytearray()
+        self.watched: Dict[Tuple[int, bytes], int] = {}
+        self.queued: Optional[List[List[bytes]]] = None
+        self.channels: Set[bytes] = set()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.server.unwatch(self)
+        self.server.unsubscribe(self, list(self.channels))
+
+    def data_received(self, data: bytes):
+        self.buffer += data
+        position = 0
+        out = bytearray()
+        while position < len(self.buffer):
+            try:
+                parsed = parse_command(self.buffer, position)
+            except ValueError:
+                encode_reply(RespError("ERR Protocol error"), out)
+                self.transport.write(bytes(out))
+                self.transport.close()
+                return
+            if parsed is None:
+                break
+            args, position = parsed
+            if args:
+                reply = self.server.handle(self, args)
+                if isinstance(reply, _Replies):
+                    for item in reply:
+                        encode_reply(item, out)
+                else:
+                    encode_reply(reply, out)
+        del self.buffer[:position]
+        if out:
+            # Replies to a whole pipeline go out in one write.
+            self.transport.write(bytes(out))
+
+
+class RespServer:
+    """
+    A single-threaded RESP server; every command runs atomically on its event loop.
+
+    Only the commands used by the chat app are implemented, with their
+    Redis semantics. Keys that become empty are deleted, as in Redis.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._databases: Dict[int, Dict[bytes, object]] = defaultdict(dict)
+        # Write counts of the keys some connection watches, and how many do.
+        self._versions: Dict[Tuple[int, bytes], int] = {}
+        self._watchers: Dict[Tuple[int, bytes], int] = defaultdict(int)
+        self._flushes = 0
+        self._channels: Dict[bytes, Set[_Connection]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self._commands: Dict[bytes, Tuple[Callable, bool]] = {}
+        for name in dir(self):
+            if name.startswith("_read_") or name.startswith("_write_"):
+                write, command = name.startswith("_write_"), name.split("_", 2)[2]
+                self._commands[command.upper().encode()] = (getattr(self, name), write)
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def serve(self) -> None:
+        """Serve until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await self._loop.create_server(
+            lambda: _Connection(self), self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "RespServer":
+        """Serve from a daemon thread; return once the server listens."""
+        ready = threading.Event()
+
+        def run():
+            async def main():
+                task = asyncio.ensure_future(self.serve())
+                while self._server is None and not task.done():
+                    await asyncio.sleep(0.001)
+                ready.set()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+            asyncio.run(main())
+
+        self._thread = threading.Thread(target=run, name="resp-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def handle(self, connection: _Connection, args: List[bytes]):
+        name = args[0].upper()
+        if name in (b"MULTI", b"EXEC", b"DISCARD", b"WATCH", b"UNWATCH"):
+            return self._transaction(connection, name, args)
+        if name == b"SUBSCRIBE":
+            return self.subscribe(connection, args[1:])
+        if name == b"UNSUBSCRIBE":
+            return self.unsubscribe(connection, args[1:] or list(connection.channels))
+        if connection.channels and name != b"PING":
+            return RespError("ERR only (UN)SUBSCRIBE and PING are allowed in this context")
+        if connection.queued is not None:
+            if name not in self._commands:
+                return RespError(f"ERR unknown command '{args[0].decode()}'")
+            connection.queued.append(args)
+            return _QUEUED
+        return self._run(connection, args)
+
+    def _run(self, connection: _Connection, args: List[bytes]):
+        entry = self._commands.get(args[0].upper())
+        if entry is None:
+            return RespError(f"ERR unknown command '{args[0].decode()}'")
+        command, write = entry
+        database = self._databases[connection.database]
+        try:
+            reply = command(connection, database, *args[1:])
+        except RespError as error:
+            return error
+        except (TypeError, ValueError, IndexError):
+            return RespError(f"ERR wrong arguments for '{args[0].decode()}' command")
+        if write and len(args) > 1:
+            keys = args[1:] if args[0].upper() == b"DEL" else args[1:2]
+            for key in keys:
+                if (connection.database, key) in self._watchers:
+                    self._versions[connection.database, key] += 1
+                value = database.get(key)
+                if isinstance(value, (dict, list, _SortedSet)) and not value:
+                    del database[key]
+        return reply
+
+    def _transaction(self, connection: _Connection, name: bytes, args: List[bytes]):
+        if name == b"MULTI":
+            if connection.queued is not None:
+                return RespError("ERR MULTI calls can not be nested")
+            connection.queued = []
+            return _OK
+        if name == b"WATCH":
+            if connection.queued is not None:
+                return RespError("ERR WATCH inside MULTI is not allowed")
+            for key in args[1:]:
+                key = (connection.database, key)
+                if key not in connection.watched:
+                    self._watchers[key] += 1
+                    self._versions.setdefault(key, 0)
+                    connection.watched[key] = self._versions[key] + self._flushes
+            return _OK
+        if name == b"UNWATCH":
+            self.unwatch(connection)
+            return _OK
+        if connection.queued is None:
+            return RespError(f"ERR {name.decode()} without MULTI")
+        queued, connection.queued = connection.queued, None
+        changed = any(
+            self._versions[key] + self._flushes != version
+            for key, version in connection.watched.items()
+        )
+        self.unwatch(connection)
+        if name == b"DISCARD":
+            return _OK
+        if changed:
+            return _NIL_ARRAY
+        return [self._run(connection, command) for command in queued]
+
+    def subscribe(self, connection: _Connection, channels: List[bytes]) -> _Replies:
+        replies = _Replies()
+        for channel in channels:
+            self._channels[channel].add(connection)
+            connection.channels.add(channel)
+            replies.append([b"subscribe", channel, len(connection.channels)])
+        return replies
+
+    def unsubscribe(self, connection: _Connection, channels: List[bytes]) -> _Replies:
+        replies = _Replies()
+        for channel in channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self._channels[channel]
+            connection.channels.discard(channel)
+            replies.append([b"unsubscribe", channel, len(connection.channels)])
+        return replies
+
+    def _read_publish(self, connection, database, channel, message):
+        subscribers = self._channels.get(channel, ())
+        if subscribers:
+            out = bytearray()
+            encode_reply([b"message", channel, message], out)
+            pushed = bytes(out)
+            for subscriber in subscribers:
+                subscriber.transport.write(pushed)
+        return len(subscribers)
+
+    def unwatch(self, connection: _Connection) -> None:
+        for key in connection.watched:
+            self._watchers[key] -= 1
+            if not self._watchers[key]:
+                del self._watchers[key]
+                del self._versions[key]
+        connection.watched.clear()
+
+    def _typed(self, database, key: bytes, kind: type, create: bool = False):
+        value = database.get(key)
+        if value is None:
+            if not create:
+                return None
+            value = database[key] = kind()
+        elif not isinstance(value, kind):
+            raise _WRONGTYPE
+        return value
+
+    # Commands are methods named _read_<command> or _write_<command>.
+
+    def _read_ping(self, connection, database, message=None):
+        return _Simple("PONG") if message is None else message
+
+    def _read_select(self, connection, database, index):
+        connection.database = int(index)
+        return _OK
+
+    def _write_flushdb(self, connection, database):
+        database.clear()
+        self._flushes += 1
+        return _OK
+
+    def _write_del(self, connection, database, *keys):
+        return sum(database.pop(key, None) is not None for key in keys)
+
+    def _read_exists(self, connection, database, *keys):
+        return sum(key in database for key in keys)
+
+    def _read_scan(self, connection, database, cursor, *options):
+        pattern = None
+        for i in range(0, len(options), 2):
+            if options[i].upper() == b"MATCH":
+                pattern = options[i + 1].decode("latin-1")
+        # One pass returns everything, with cursor 0 to say it is complete.
+        keys = [
+            key
+            for key in database
+            if pattern is None or fnmatchcase(key.decode("latin-1"), pattern)
+        ]
+        return [b"0", keys]
+
+    def _read_get(self, connection, database, key):
+        return self._typed(database, key, bytes)
+
+    def _write_set(self, connection, database, key, value):
+        database[key] = value
+        return _OK
+
+    def _write_incr(self, connection, database, key):
+        value = int(self._typed(database, key, bytes) or 0) + 1
+        database[key] = b"%d" % value
+        return value
+
+    def _write_hset(self, connection, database, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError
+        hash_ = self._typed(database, key, dict, create=True)
+        added = 0
+        for i in range(0, len(pairs), 2):
+            added += pairs[i] not in hash_
+            hash_[pairs[i]] = pairs[i + 1]
+        return added
+
+    def _write_hdel(self, connection, database, key, *fields):
+        hash_ = self._typed(database, key, dict) or {}
+        return sum(hash_.pop(field, None) is not None for field in fields)
+
+    def _read_hget(self, connection, database, key, field):
+        return (self._typed(database, key, dict) or {}).get(field)
+
+    def _read_hmget(self, connection, database, key, *fields):
+        hash_ = self._typed(database, key, dict) or {}
+        return [hash_.get(field) for field in fields]
+
+    def _read_hgetall(self, connection, database, key):
+        hash_ = self._typed(database, key, dict) or {}
+        return [item for pair in hash_.items() for item in pair]
+
+    def _read_hkeys(self, connection, database, key):
+        return list(self._typed(database, key, dict) or {})
+
+    def _read_hlen(self, connection, database, key):
+        return len(self._typed(database, key, dict) or {})
+
+    def _read_hexists(self, connection, database, key, field):
+        return int(field in (self._typed(database, key, dict) or {}))
+
+    def _write_rpush(self, connection, database, key, *values):
+        if not values:
+            raise ValueError
+        list_ = self._typed(database, key, list, create=True)
+        list_.extend(values)
+        return len(list_)
+
+    def _read_llen(self, connection, database, key):
+        return len(self._typed(database, key, list) or [])
+
+    def _read_lrange(self, connection, database, key, start, stop):
+        list_ = self._typed(database, key, list) or []
+        start, stop = _rank_range(int(start), int(stop), len(list_))
+        return list_[start:stop]
+
+    def _write_zadd(self, connection, database, key, *args):
+        flags = set()
+        while args and args[0].upper() in (b"NX", b"XX", b"GT", b"LT", b"CH"):
+            flags.add(args[0].upper())
+            args = args[1:]
+        if not args or len(args) % 2 or (b"NX" in flags and flags & {b"XX", b"GT", b"LT"}):
+            raise _SYNTAX
+        zset = self._typed(database, key, _SortedSet, create=b"XX" not in flags)
+        if zset is None:
+            return 0
+        changed = added = 0
+        for i in range(0, len(args), 2):
+            score, member = float(args[i]), args[i + 1]
+            previous = zset.scores.get(member)
+            if previous is None:
+                if b"XX" in flags:
+                    continue
+                added += 1
+            elif (
+                b"NX" in flags
+                or (b"GT" in flags and score <= previous)
+                or (b"LT" in flags and score >= previous)
+                or score == previous
+            ):
+                continue
+            changed += 1
+            zset.add(member, score)
+        return changed if b"CH" in flags else added
+
+    def _write_zrem(self, connection, database, key, *members):
+        zset = self._typed(database, key, _SortedSet)
+        if zset is None:
+            return 0
+        return sum(zset.remove(member) for member in members)
+
+    def _read_zscore(self, connection, database, key, member):
+        zset = self._typed(database, key, _SortedSet)
+        score = None if zset is None else zset.scores.get(member)
+        return None if score is None else _format_score(score)
+
+    def _read_zmscore(self, connection, database, key, *members):
+        return [self._read_zscore(connection, database, key, member) for member in members]
+
+    def _read_zcard(self, connection, database, key):
+        zset = self._typed(database, key, _SortedSet)
+        return 0 if zset is None else len(zset.scores)
+
+    def _read_zcount(self, connection, database, key, low, high):
+        zset = self._typed(database, key, _SortedSet)
+        if zset is None:
+            return 0
+        start, stop = zset.range_by_score(low, high)
+        return stop - start
+
+    def _read_zrange(self, connection, database, key, start, stop, *options):
+        zset = self._typed(database, key, _SortedSet)
+        if zset is None:
+            return []
+        start, stop = _rank_range(int(start), int(stop), len(zset.order))
+        return self._members(zset.order[start:stop], options)
+
+    def _read_zrangebyscore(self, connection, database, key, low, high, *options):
+        zset = self._typed(database, key, _SortedSet)
+        if zset is None:
+            return []
+        start, stop = zset.range_by_score(low, high)
+        upper = [option.upper() for option in options]
+        if b"LIMIT" in upper:
+            at = upper.index(b"LIMIT")
+            offset, count = int(options[at + 1]), int(options[at + 2])
+            start += offset
+            if count >= 0:
+                stop = min(stop, start + count)
+        return self._members(zset.order[start:stop], options)
+
+    @staticmethod
+    def _members(entries, options) -> list:
+        if any(option.upper() == b"WITHSCORES" for option in options):
+            return [item for score, member in entries for item in (member, _format_score(score))]
+        return [member for _, member in entries]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a RESP stand-in for Redis.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    server = RespServer(args.host, args.port)
+
+    async def serve():
+        task = asyncio.ensure_future(server.serve())
+        while server._server is None and not task.done():
+            await asyncio.sleep(0.001)
+        # The port line tells a parent process where to connect when --port is 0.
+        print(server.port, flush=True)
+        logging.info("Serving RESP on %s:%d.", server.host, server.port)
+        await task
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,617 @@
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import sqlite3
+import threading
+import uuid
+
+from chat.models.customer_data import CustomerData
+from chat.models.enums import MessageType, ParticipantType, SessionStatus, TicketStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.base_repository import BaseRepository
+from chat.strategies.strategy_registry import StrategyRegistry
+from chat.utils.metrics import Metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agents (
+    agent_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id BLOB PRIMARY KEY,
+    customer_id INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    support_agent_id INTEGER,
+    strategies BLOB,
+    ended_at INTEGER,
+    status TEXT NOT NULL DEFAULT 'Open',
+    last_activity INTEGER
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_customer ON chat_sessions (customer_id);
+CREATE INDEX IF NOT EXISTS chat_sessions_agent ON chat_sessions (support_agent_id);
+CREATE TABLE IF NOT EXISTS messages (
+    message_id BLOB PRIMARY KEY,
+    session_id BLOB NOT NULL,
+    seq INTEGER NOT NULL,
+    participant_id,
+    participant_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    message_type TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_session_seq ON messages (session_id, seq);
+CREATE INDEX IF NOT EXISTS messages_session_timestamp ON messages (session_id, timestamp);
+CREATE TABLE IF NOT EXISTS support_tickets (
+    ticket_id BLOB PRIMARY KEY,
+    agent_id INTEGER NOT NULL,
+    session_id BLOB NOT NULL,
+    issue TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS support_tickets_session ON support_tickets (session_id);
+CREATE INDEX IF NOT EXISTS support_tickets_status ON support_tickets (status);
+CREATE INDEX IF NOT EXISTS support_tickets_agent_status ON support_tickets (agent_id, status);
+"""
+
+# The statements are module constants so that sqlite3's per-connection
+# statement cache always hands back the already prepared statement.
+_INSERT_CUSTOMER = "INSERT OR REPLACE INTO customers VALUES (?, ?, ?)"
+_INSERT_AGENT = "INSERT OR REPLACE INTO agents VALUES (?, ?, ?)"
+_SESSION_COLUMNS = (
+    "session_id, customer_id, topic, support_agent_id, strategies, ended_at, status, "
+    "last_activity"
+)
+_INSERT_SESSION = (
+    f"INSERT OR REPLACE INTO chat_sessions ({_SESSION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# A message stored again keeps its session and its position in it.
+_INSERT_MESSAGE = """
+INSERT INTO messages VALUES (
+    ?1, ?2,
+    (SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?2),
+    ?3, ?4, ?5, ?6, ?7
+)
+ON CONFLICT (message_id) DO UPDATE SET
+    participant_id = excluded.participant_id,
+    participant_type = excluded.participant_type,
+    content = excluded.content,
+    timestamp = excluded.timestamp,
+    message_type = excluded.message_type"""
+_INSERT_TICKET = "INSERT OR REPLACE INTO support_tickets VALUES (?, ?, ?, ?, ?)"
+_ASSIGN_AGENT = """
+UPDATE chat_sessions SET support_agent_id = ?,
+    status = CASE WHEN ended_at IS NULL THEN 'Active' ELSE status END
+WHERE session_id = ?"""
+_END_SESSION = "UPDATE chat_sessions SET ended_at = ?, status = 'Closed' WHERE session_id = ?"
+_SET_SESSION_STATUS = "UPDATE chat_sessions SET status = ? WHERE session_id = ?"
+_TOUCH_SESSION = """
+UPDATE chat_sessions SET last_activity = MAX(COALESCE(last_activity, 0), ?)
+WHERE session_id = ?"""
+_IDLE_SESSIONS = """
+SELECT session_id FROM chat_sessions
+WHERE ended_at IS NULL AND last_activity < ? LIMIT ?"""
+_SESSIONS_AFTER = f"""
+SELECT rowid, {_SESSION_COLUMNS} FROM chat_sessions WHERE rowid > ? ORDER BY rowid LIMIT ?"""
+_SESSION_FILTERS = ("customer_id = ?", "support_agent_id = ?")
+_UPDATE_TICKET_STATUS = "UPDATE support_tickets SET status = ? WHERE ticket_id = ?"
+_SELECT_SESSION_MESSAGES = """
+SELECT message_id, session_id, participant_id, participant_type, content,
+       timestamp, message_type
+FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq"""
+_COUNT_SESSION_MESSAGES = "SELECT COUNT(*) FROM messages WHERE session_id = ?"
+_SESSION_POSITION_AFTER = """
+SELECT COUNT(*) FROM messages WHERE session_id = ? AND timestamp <= ?"""
+_TICKET_COLUMNS = "ticket_id, agent_id, session_id, issue, status"
+# The ticket filters are combined from fixed fragments, so every combination
+# is one of a few statements that stay prepared.
+_TICKET_FILTERS = ("status = ?", "agent_id = ?", "session_id = ?")
+
+_MESSAGE_COLUMNS = (
+    "message_id, session_id, participant_id, participant_type, content, "
+    "timestamp, message_type"
+)
+_MAX_SEQ = 2**63 - 1
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_micros(timestamp: datetime) -> int:
+    # Naive wall-clock timestamps are stored as exact integer microseconds.
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+@lru_cache(maxsize=1024)
+def _load_strategies(blob: Optional[bytes]) -> list:
+    return StrategyRegistry.decode(blob) if blob else []
+
+
+def _customer(row) -> CustomerData:
+    return CustomerData(*row)
+
+
+def _agent(row) -> SupportAgentData:
+    return SupportAgentData(*row)
+
+
+def _session(row) -> ChatSessionData:
+    (
+        session_id,
+        customer_id,
+        topic,
+        support_agent_id,
+        strategies,
+        ended_at,
+        status,
+        last_activity,
+    ) = row
+    return ChatSessionData(
+        session_id=uuid.UUID(bytes=session_id),
+        customer_id=customer_id,
+        topic=topic,
+        support_agent_id=support_agent_id,
+        strategies=list(_load_strategies(strategies)),
+        ended_at=None if ended_at is None else _from_micros(ended_at),
+        status=SessionStatus(status),
+        last_activity=_from_micros(last_activity or 0),
+    )
+
+
+def _message(row) -> MessageData:
+    message_id, session_id, participant_id, participant_type, content, ts, kind = row
+    return MessageData(
+        message_id=uuid.UUID(bytes=message_id),
+        session_id=uuid.UUID(bytes=session_id),
+        participant_id=participant_id,
+        participant_type=ParticipantType(participant_type),
+        content=content,
+        timestamp=_from_micros(ts),
+        message_type=MessageType(kind),
+    )
+
+
+def _ticket(row) -> SupportTicketData:
+    ticket_id, agent_id, session_id, issue, status = row
+    return SupportTicketData(
+        agent_id=agent_id,
+        session_id=uuid.UUID(bytes=session_id),
+        issue=issue,
+        ticket_id=uuid.UUID(bytes=ticket_id),
+        status=TicketStatus(status),
+    )
+
+
+def _ticket_filter(
+    status: Optional[TicketStatus],
+    agent_id: Optional[int],
+    session_id: Optional[uuid.UUID],
+) -> Tuple[str, tuple]:
+    values = (
+        None if status is None else status.value,
+        agent_id,
+        None if session_id is None else session_id.bytes,
+    )
+    clauses = [clause for clause, value in zip(_TICKET_FILTERS, values) if value is not None]
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, tuple(value for value in values if value is not None)
+
+
+def _message_params(message: MessageData) -> tuple:
+    return (
+        message.message_id.bytes,
+        message.session_id.bytes,
+        message.participant_id,
+        message.participant_type.value,
+        message.content,
+        _to_micros(message.timestamp),
+        message.message_type.value,
+    )
+
+
+class _Table(Mapping):
+    """A read-only mapping view over one table, keyed by its primary key."""
+
+    def __init__(
+        self,
+        repository: "SQLiteRepository",
+        table: str,
+        key: str,
+        columns: str,
+        to_model: Callable,
+        encode_key: Callable = lambda key: key,
+        decode_key: Callable = lambda key: key,
+    ):
+        self._repository = repository
+        self._table = table
+        self._to_model = to_model
+        self._encode_key = encode_key
+        self._decode_key = decode_key
+        self._select_one = f"SELECT {columns} FROM {table} WHERE {key} = ?"
+        self._select_all = f"SELECT {columns} FROM {table} ORDER BY rowid"
+        self._select_keys = f"SELECT {key} FROM {table} ORDER BY rowid"
+        self._count = f"SELECT COUNT(*) FROM {table}"
+
+    def get(self, key, default=None):
+        try:
+            row = self._repository._fetchone(self._select_one, (self._encode_key(key),))
+        except (AttributeError, TypeError):
+            return default
+        return default if row is None else self._to_model(row)
+
+    def __getitem__(self, key):
+        model = self.get(key)
+        if model is None:
+            raise KeyError(key)
+        return model
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator:
+        rows = self._repository._fetchall(self._select_keys, ())
+        return (self._decode_key(row[0]) for row in rows)
+
+    def __len__(self) -> int:
+        return self._repository._fetchone(self._count, ())[0]
+
+    def values(self) -> List:  # type: ignore[override]
+        return [self._to_model(row) for row in self._repository._fetchall(self._select_all, ())]
+
+    def clear(self) -> None:
+        with self._repository.transaction() as connection:
+            connection.execute(f"DELETE FROM {self._table}")
+
+
+class SQLiteRepository(BaseRepository):
+    """
+    A repository backend persisting all data in a SQLite database.
+
+    The database runs in WAL mode, so readers never block the writer. Writes go
+    through one connection guarded by a lock, while every reading thread gets a
+    connection of its own. Messages carry a per-session sequence number used
+    for paging and are indexed by (session_id, seq) and (session_id, timestamp).
+    Session strategies are stored by name and configuration through
+    ``StrategyRegistry``.
+
+    Each write commits on its own unless it runs inside ``transaction()``;
+    ``add_messages`` commits a whole batch in one transaction.
+    """
+
+    def __init__(self, path: str = "chat.db"):
+        self.path = os.fspath(path)
+        self._lock = Metrics.lock("sqlite_writer", threading.RLock())
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._writer = self._connect()
+        self._depth = 0
+        self._owner: Optional[int] = None
+        with self._lock:
+            self._writer.executescript(_SCHEMA)
+            columns = [row[1] for row in self._writer.execute("PRAGMA table_info(chat_sessions)")]
+            if "ended_at" not in columns:
+                # Databases created before sessions could end.
+                self._writer.execute("ALTER TABLE chat_sessions ADD COLUMN ended_at INTEGER")
+            if "status" not in columns:
+                # Databases created before session states; ended sessions are
+                # closed and the others count as active since their last message.
+                self._writer.executescript(
+                    """
+                    ALTER TABLE chat_sessions ADD COLUMN status TEXT NOT NULL DEFAULT 'Open';
+                    ALTER TABLE chat_sessions ADD COLUMN last_activity INTEGER;
+                    UPDATE chat_sessions SET status = 'Closed' WHERE ended_at IS NOT NULL;
+                    UPDATE chat_sessions SET last_activity = (
+                        SELECT MAX(timestamp) FROM messages
+                        WHERE messages.session_id = chat_sessions.session_id
+                    );
+                    """
+                )
+                self._writer.execute(
+                    "UPDATE chat_sessions SET last_activity = ? WHERE last_activity IS NULL",
+                    (_to_micros(datetime.now()),),
+                )
+            self._writer.execute(
+                "CREATE INDEX IF NOT EXISTS chat_sessions_idle "
+                "ON chat_sessions (ended_at, last_activity)"
+            )
+
+        self.customers = _Table(
+            self, "customers", "customer_id", "customer_id, name, email", _customer
+        )
+        self.agents = _Table(self, "agents", "agent_id", "agent_id, name, email", _agent)
+        self.chat_sessions = _Table(
+            self,
+            "chat_sessions",
+            "session_id",
+            _SESSION_COLUMNS,
+            _session,
+            encode_key=lambda key: key.bytes,
+            decode_key=lambda key: uuid.UUID(bytes=key),
+        )
+        self.messages = _Table(
+            self,
+            "messages",
+            "message_id",
+            _MESSAGE_COLUMNS,
+            _message,
+            encode_key=lambda key: key.bytes,
+            decode_key=lambda key: uuid.UUID(bytes=key),
+        )
+        self.support_tickets = _Table(
+            self,
+            "support_tickets",
+            "ticket_id",
+            _TICKET_COLUMNS,
+            _ticket,
+            encode_key=lambda key: key.bytes,
+            decode_key=lambda key: uuid.UUID(bytes=key),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the enclosed writes, including nested ones, in a single transaction."""
+        with self._lock:
+            if self._depth == 0:
+                self._writer.execute("BEGIN IMMEDIATE")
+                self._owner = threading.get_ident()
+            self._depth += 1
+            try:
+                yield self._writer
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._owner = None
+                    self._writer.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._writer.execute("COMMIT")
+
+    def _reader(self) -> sqlite3.Connection:
+        if self.path == ":memory:" or self._owner == threading.get_ident():
+            # An in-memory database only exists on the writer connection, and
+            # inside a transaction reads must see its uncommitted writes.
+            return self._writer
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            with self._lock:
+                self._readers.append(connection)
+        return connection
+
+    def _fetchone(self, sql: str, params: tuple):
+        connection = self._reader()
+        if connection is self._writer:
+            with self._lock:
+                return connection.execute(sql, params).fetchone()
+        return connection.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple) -> list:
+        connection = self._reader()
+        if connection is self._writer:
+            with self._lock:
+                return connection.execute(sql, params).fetchall()
+        return connection.execute(sql, params).fetchall()
+
+    def add_customer(self, customer: CustomerData):
+        with self.transaction() as connection:
+            connection.execute(
+                _INSERT_CUSTOMER, (customer.customer_id, customer.name, customer.email)
+            )
+
+    def add_agent(self, agent: SupportAgentData):
+        with self.transaction() as connection:
+            connection.execute(_INSERT_AGENT, (agent.agent_id, agent.name, agent.email))
+
+    def add_chat_session(self, session: ChatSessionData):
+        strategies = StrategyRegistry.encode(session.strategies) if session.strategies else None
+        with self.transaction() as connection:
+            connection.execute(
+                _INSERT_SESSION,
+                (
+                    session.session_id.bytes,
+                    session.customer_id,
+                    session.topic,
+                    session.support_agent_id,
+                    strategies,
+                    None if session.ended_at is None else _to_micros(session.ended_at),
+                    session.status.value,
+                    _to_micros(session.last_activity),
+                ),
+            )
+
+    def add_message(self, message: MessageData):
+        params = _message_params(message)
+        with self.transaction() as connection:
+            connection.execute(_INSERT_MESSAGE, params)
+            connection.execute(_TOUCH_SESSION, (params[5], params[1]))
+
+    def add_messages(self, messages: Iterable[MessageData]):
+        params = [_message_params(message) for message in messages]
+        last_activity: Dict[bytes, int] = {}
+        for values in params:
+            last_activity[values[1]] = max(last_activity.get(values[1], 0), values[5])
+        with self.transaction() as connection:
+            connection.executemany(_INSERT_MESSAGE, params)
+            connection.executemany(
+                _TOUCH_SESSION, [(micros, session) for session, micros in last_activity.items()]
+            )
+
+    def add_support_ticket(self, ticket: SupportTicketData):
+        with self.transaction() as connection:
+            connection.execute(
+                _INSERT_TICKET,
+                (
+                    ticket.ticket_id.bytes,
+                    ticket.agent_id,
+                    ticket.session_id.bytes,
+                    ticket.issue,
+                    ticket.status.value,
+                ),
+            )
+
+    def assign_agent(self, session_id: uuid.UUID, agent_id: int):
+        with self.transaction() as connection:
+            cursor = connection.execute(_ASSIGN_AGENT, (agent_id, session_id.bytes))
+        if cursor.rowcount == 0:
+            raise KeyError(session_id)
+
+    def set_session_status(self, session_id: uuid.UUID, status: SessionStatus):
+        with self.transaction() as connection:
+            cursor = connection.execute(_SET_SESSION_STATUS, (status.value, session_id.bytes))
+        if cursor.rowcount == 0:
+            raise KeyError(session_id)
+
+    def end_chat_session(self, session_id: uuid.UUID, ended_at: datetime):
+        # Rows on disk are already compact; only the end time is recorded.
+        with self.transaction() as connection:
+            cursor = connection.execute(_END_SESSION, (_to_micros(ended_at), session_id.bytes))
+        if cursor.rowcount == 0:
+            raise KeyError(session_id)
+
+    def update_ticket_status(self, ticket_id: uuid.UUID, status: TicketStatus):
+        with self.transaction() as connection:
+            cursor = connection.execute(_UPDATE_TICKET_STATUS, (status.value, ticket_id.bytes))
+        if cursor.rowcount == 0:
+            raise KeyError(ticket_id)
+
+    def get_customer(self, customer_id: int) -> Optional[CustomerData]:
+        return self.customers.get(customer_id)
+
+    def get_agent(self, agent_id: int) -> Optional[SupportAgentData]:
+        return self.agents.get(agent_id)
+
+    def get_chat_session(self, session_id: uuid.UUID) -> Optional[ChatSessionData]:
+        return self.chat_sessions.get(session_id)
+
+    def get_message(
+        self, message_id: uuid.UUID, session_id: Optional[uuid.UUID] = None
+    ) -> Optional[MessageData]:
+        return self.messages.get(message_id)
+
+    def get_support_ticket(self, ticket_id: uuid.UUID) -> Optional[SupportTicketData]:
+        return self.support_tickets.get(ticket_id)
+
+    def list_customers(self) -> List[CustomerData]:
+        return self.customers.values()
+
+    def list_agents(self) -> List[SupportAgentData]:
+        return self.agents.values()
+
+    def list_chat_sessions(self) -> List[ChatSessionData]:
+        return self.chat_sessions.values()
+
+    def iter_chat_sessions(self, batch_size: int = 1000) -> Iterator[ChatSessionData]:
+        rowid = 0
+        while True:
+            rows = self._fetchall(_SESSIONS_AFTER, (rowid, batch_size))
+            for row in rows:
+                yield _session(row[1:])
+            if len(rows) < batch_size:
+                return
+            rowid = rows[-1][0]
+
+    def find_chat_session_ids(
+        self, customer_id: Optional[int] = None, agent_id: Optional[int] = None
+    ) -> List[uuid.UUID]:
+        values = (customer_id, agent_id)
+        clauses = [clause for clause, value in zip(_SESSION_FILTERS, values) if value is not None]
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        rows = self._fetchall(
+            f"SELECT session_id FROM chat_sessions{where} ORDER BY rowid",
+            tuple(value for value in values if value is not None),
+        )
+        return [uuid.UUID(bytes=row[0]) for row in rows]
+
+    def list_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> List[SupportTicketData]:
+        where, params = _ticket_filter(status, agent_id, session_id)
+        limit = -1 if stop is None else max(stop - start, 0)
+        rows = self._fetchall(
+            f"SELECT {_TICKET_COLUMNS} FROM support_tickets{where} "
+            "ORDER BY rowid LIMIT ? OFFSET ?",
+            (*params, limit, start),
+        )
+        return [_ticket(row) for row in rows]
+
+    def count_tickets(
+        self,
+        status: Optional[TicketStatus] = None,
+        agent_id: Optional[int] = None,
+        session_id: Optional[uuid.UUID] = None,
+    ) -> int:
+        where, params = _ticket_filter(status, agent_id, session_id)
+        return self._fetchone(f"SELECT COUNT(*) FROM support_tickets{where}", params)[0]
+
+    def get_session_messages(
+        self, session_id: uuid.UUID, start: int = 0, stop: Optional[int] = None
+    ) -> List[MessageData]:
+        if start < 0 or (stop is not None and stop < 0):
+            # Negative positions count from the end like a list slice.
+            total = self.count_session_messages(session_id)
+            start, stop, _ = slice(start, stop).indices(total)
+        if stop is None:
+            stop = _MAX_SEQ
+        rows = self._fetchall(_SELECT_SESSION_MESSAGES, (session_id.bytes, start, stop))
+        return [_message(row) for row in rows]
+
+    def count_session_messages(self, session_id: uuid.UUID) -> int:
+        return self._fetchone(_COUNT_SESSION_MESSAGES, (session_id.bytes,))[0]
+
+    def session_position_after(self, session_id: uuid.UUID, timestamp: datetime) -> int:
+        return self._fetchone(
+            _SESSION_POSITION_AFTER, (session_id.bytes, _to_micros(timestamp))
+        )[0]
+
+    def idle_sessions(self, before: datetime, limit: int) -> List[uuid.UUID]:
+        rows = self._fetchall(_IDLE_SESSIONS, (_to_micros(before), limit))
+        return [uuid.UUID(bytes=row[0]) for row in rows]
+
+    def evict_chat_sessions(self, ended_before: datetime, limit: int) -> List[uuid.UUID]:
+        # Ended sessions only live on disk, which is where they are meant to stay.
+        return []
+
+    def clear(self):
+        with self.transaction() as connection:
+            for table in ("customers", "agents", "chat_sessions", "messages", "support_tickets"):
+                connection.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        with self._lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers.clear()
+            self._writer.close()
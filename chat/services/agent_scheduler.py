@@ -0,0 +1,291 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+from chat.config import settings
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.enums import SessionStatus
+from chat.repository.repository import Repository
+from chat.utils.logging import logging
+
+# The heap of all agents; every skill has a heap of its own as well.
+_ANY = ""
+
+
+def _skill(topic: str) -> str:
+    return topic.strip().lower()
+
+
+@dataclass(slots=True)
+class _AgentLoad:
+    agent_id: int
+    skills: FrozenSet[str]
+    max_sessions: int
+    sessions: Set[uuid.UUID] = field(default_factory=set)
+    # Bumped on every load change; heap entries of older versions are stale.
+    version: int = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self.sessions) >= self.max_sessions
+
+
+@dataclass(slots=True)
+class _Waiting:
+    session_id: uuid.UUID
+    skill: str
+    since: float
+    done: bool = False
+
+
+class AgentScheduler:
+    """
+    Assigns chat sessions to the least loaded available agent.
+
+    Agents are kept in heaps ordered by their number of active sessions: one
+    heap of all agents and one per skill. Heap entries are never updated in
+    place; a load change pushes a fresh entry and the old one is skipped when
+    it reaches the top, so assigning or releasing a session costs O(log n) in
+    the number of agents.
+
+    A new session goes to the least loaded agent having the session's topic as
+    a skill, else to the least loaded agent overall, as long as that agent is
+    below its ``max_sessions``. Otherwise the session waits in a FIFO queue.
+    An agent that becomes free takes the oldest waiting session once it has
+    waited ``aging_seconds``, before that the oldest one matching its skills,
+    and otherwise the oldest one.
+    """
+
+    enabled = settings.auto_assign_agents
+    clock = time.monotonic
+    max_sessions = settings.agent_max_sessions
+    aging_seconds = settings.queue_aging_seconds
+
+    _lock = threading.RLock()
+    _agents: Dict[int, _AgentLoad] = {}
+    _heaps: Dict[str, List[Tuple[bool, int, int, int, int]]] = {}
+    _assignments: Dict[uuid.UUID, int] = {}
+    _queue: Deque[_Waiting] = deque()
+    _queues_by_skill: Dict[str, Deque[_Waiting]] = {}
+    _waiting: Dict[uuid.UUID, _Waiting] = {}
+    _sequence = itertools.count()
+
+    @classmethod
+    def register_agent(
+        cls,
+        agent_id: int,
+        skills: Iterable[str] = (),
+        max_sessions: Optional[int] = None,
+    ) -> None:
+        """Make an agent available for assignment, or update its skills and limit."""
+        with cls._lock:
+            previous = cls._agents.get(agent_id)
+            agent = _AgentLoad(
+                agent_id,
+                frozenset(_skill(skill) for skill in skills),
+                max_sessions or cls.max_sessions,
+            )
+            if previous is not None:
+                agent.sessions = previous.sessions
+                agent.version = previous.version + 1
+            cls._agents[agent_id] = agent
+            cls._push(agent)
+            cls._drain(agent)
+
+    @classmethod
+    def unregister_agent(cls, agent_id: int) -> None:
+        """Stop assigning new sessions to an agent; its current sessions stay."""
+        with cls._lock:
+            cls._agents.pop(agent_id, None)
+
+    @classmethod
+    def submit(cls, session: ChatSessionData) -> Optional[int]:
+        """Assign a new session to an agent, or queue it. Return the agent id or None."""
+        with cls._lock:
+            skill = _skill(session.topic)
+            agent = cls._pop_available(skill) or cls._pop_available(_ANY)
+            if agent is not None:
+                cls._assign(session.session_id, agent)
+                return agent.agent_id
+            waiting = _Waiting(session.session_id, skill, cls.clock())
+            cls._queue.append(waiting)
+            queue = cls._queues_by_skill.setdefault(skill, deque())
+            queue.append(waiting)
+            if len(queue) > 2 * len(cls._waiting) + 64:
+                # Drop entries already taken, which only leave from the head.
+                cls._queues_by_skill[skill] = deque(w for w in queue if not w.done)
+            cls._waiting[session.session_id] = waiting
+            # Sessions queued again by ``rebuild`` are already stored as waiting.
+            if session.status is not SessionStatus.WAITING:
+                Repository.set_session_status(session.session_id, SessionStatus.WAITING)
+            logging.info("No agent available; session %s is queued.", session.session_id)
+            return None
+
+    @classmethod
+    def assigned(cls, session_id: uuid.UUID, agent_id: int) -> None:
+        """Record a manual assignment, moving the session off the queue or another agent."""
+        with cls._lock:
+            waiting = cls._waiting.pop(session_id, None)
+            if waiting is not None:
+                waiting.done = True
+            cls._release(session_id)
+            agent = cls._agents.get(agent_id)
+            if agent is not None:
+                agent.sessions.add(session_id)
+                cls._assignments[session_id] = agent_id
+                cls._push(agent)
+
+    @classmethod
+    def release(cls, session_id: uuid.UUID) -> None:
+        """Free the agent of a session that ended and hand it a waiting session."""
+        with cls._lock:
+            waiting = cls._waiting.pop(session_id, None)
+            if waiting is not None:
+                waiting.done = True
+            agent = cls._release(session_id)
+            if agent is not None:
+                cls._drain(agent)
+
+    @classmethod
+    def load(cls, agent_id: int) -> int:
+        agent = cls._agents.get(agent_id)
+        return len(agent.sessions) if agent is not None else 0
+
+    @classmethod
+    def agent_count(cls) -> int:
+        return len(cls._agents)
+
+    @classmethod
+    def queue_length(cls) -> int:
+        return len(cls._waiting)
+
+    @classmethod
+    def rebuild(cls) -> None:
+        """
+        Register the agents in the repository and restore their loads and the queue.
+
+        Run once at startup: waiting sessions are queued again from now, so
+        their aging starts over.
+        """
+        with cls._lock:
+            cls.clear()
+            for agent in Repository.list_agents():
+                cls.register_agent(agent.agent_id)
+            for session in Repository.list_chat_sessions():
+                if session.ended_at is not None:
+                    continue
+                if session.support_agent_id is None:
+                    cls.submit(session)
+                else:
+                    cls.assigned(session.session_id, session.support_agent_id)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._agents = {}
+            cls._heaps = {}
+            cls._assignments = {}
+            cls._queue = deque()
+            cls._queues_by_skill = {}
+            cls._waiting = {}
+
+    @classmethod
+    def _push(cls, agent: _AgentLoad) -> None:
+        agent.version += 1
+        entry = (agent.full, len(agent.sessions), next(cls._sequence), agent.agent_id, agent.version)
+        for skill in (_ANY, *agent.skills):
+            heap = cls._heaps.setdefault(skill, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(cls._agents) + 64:
+                cls._compact(skill)
+
+    @classmethod
+    def _compact(cls, skill: str) -> None:
+        cls._heaps[skill] = [
+            entry for entry in cls._heaps[skill] if cls._current(entry) is not None
+        ]
+        heapq.heapify(cls._heaps[skill])
+
+    @classmethod
+    def _current(cls, entry) -> Optional[_AgentLoad]:
+        agent = cls._agents.get(entry[3])
+        if agent is None or agent.version != entry[4]:
+            return None
+        return agent
+
+    @classmethod
+    def _pop_available(cls, skill: str) -> Optional[_AgentLoad]:
+        heap = cls._heaps.get(skill)
+        while heap:
+            agent = cls._current(heap[0])
+            if agent is None:
+                heapq.heappop(heap)
+            elif agent.full:
+                return None
+            elif Repository.get_agent(agent.agent_id) is None:
+                # The agent was removed from the repository, e.g. by a clear.
+                heapq.heappop(heap)
+                del cls._agents[agent.agent_id]
+            else:
+                return agent
+        return None
+
+    @classmethod
+    def _assign(cls, session_id: uuid.UUID, agent: _AgentLoad) -> None:
+        agent.sessions.add(session_id)
+        cls._assignments[session_id] = agent.agent_id
+        cls._push(agent)
+        Repository.assign_agent(session_id, agent.agent_id)
+        logging.info(
+            "Session %s assigned to agent %s (%d/%d sessions).",
+            session_id,
+            agent.agent_id,
+            len(agent.sessions),
+            agent.max_sessions,
+        )
+
+    @classmethod
+    def _release(cls, session_id: uuid.UUID) -> Optional[_AgentLoad]:
+        agent_id = cls._assignments.pop(session_id, None)
+        agent = cls._agents.get(agent_id) if agent_id is not None else None
+        if agent is None:
+            return None
+        agent.sessions.discard(session_id)
+        cls._push(agent)
+        return agent
+
+    @classmethod
+    def _drain(cls, agent: _AgentLoad) -> None:
+        """Hand waiting sessions to an agent that has room for them."""
+        while not agent.full:
+            waiting = cls._next_waiting(agent)
+            if waiting is None:
+                return
+            waiting.done = True
+            del cls._waiting[waiting.session_id]
+            cls._assign(waiting.session_id, agent)
+
+    @classmethod
+    def _next_waiting(cls, agent: _AgentLoad) -> Optional[_Waiting]:
+        oldest = cls._head(cls._queue)
+        if oldest is None:
+            return None
+        if cls.clock() - oldest.since >= cls.aging_seconds:
+            return oldest
+        matching = [cls._head(cls._queues_by_skill.get(skill)) for skill in agent.skills]
+        matching = [waiting for waiting in matching if waiting is not None]
+        if matching:
+            return min(matching, key=lambda waiting: waiting.since)
+        return oldest
+
+    @staticmethod
+    def _head(queue: Optional[Deque[_Waiting]]) -> Optional[_Waiting]:
+        # Entries taken out of order are only marked done; drop them here.
+        while queue and queue[0].done:
+            queue.popleft()
+        return queue[0] if queue else None
@@ -1,19 +1,51 @@
+from collections import OrderedDict
+from datetime import datetime
 from typing import List, Optional, Union
+import asyncio
+import time
 import uuid
 
 from requests import session
 
+from chat.broker.broker import Broker
 from chat.models.support_ticket_data import SupportTicketData
 from chat.models.enums import ParticipantType, TicketStatus
 from chat.models.enums import MessageType
 from chat.models.message_data import MessageData
 from chat.repository.repository import Repository
 from chat.models.chat_session_data import ChatSessionData
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.search_index import SearchIndex
 from chat.strategies.message_processing_strategy import MessageProcessingStrategy
-from chat.utils.logging import logging
+from chat.strategies.strategy_pipeline import StrategyPipeline
+from chat.utils.logging import log_message, logging
+from chat.utils.metrics import Metrics
+
+SEND_MESSAGE_SECONDS = Metrics.histogram(
+    "chat_send_message_seconds",
+    "Time to process, store and publish one message in ChatService.send_message.",
+)
 
 
 class ChatService:
+    # Compiled strategy pipelines of recently active sessions.
+    max_cached_pipelines = 10_000
+    _pipelines: "OrderedDict[uuid.UUID, StrategyPipeline]" = OrderedDict()
+
+    @classmethod
+    def _pipeline(cls, session: ChatSessionData) -> StrategyPipeline:
+        pipeline = cls._pipelines.get(session.session_id)
+        # Backends that rebuild the session object on every read still hand
+        # out the same strategy objects, so the comparison is by identity.
+        if pipeline is None or pipeline.strategies != session.strategies:
+            pipeline = StrategyPipeline(session.strategies)
+            cls._pipelines[session.session_id] = pipeline
+            if len(cls._pipelines) > cls.max_cached_pipelines:
+                cls._pipelines.popitem(last=False)
+        else:
+            cls._pipelines.move_to_end(session.session_id)
+        return pipeline
+
     @staticmethod
     async def initiate_chat_session(
         customer_id: int,
@@ -27,6 +59,8 @@ class ChatService:
         else:
             session_data.strategies = []
         Repository.add_chat_session(session_data)
+        if AgentScheduler.enabled:
+            AgentScheduler.submit(session_data)
         return session_id
 
     @staticmethod
@@ -37,9 +71,13 @@ class ChatService:
         content: str,
         message_type: MessageType = MessageType.TEXT,
     ) -> None:
-        if session_id not in Repository.chat_sessions:
-            logging.error(f"Chat session {session_id} does not exist.")
+        start = time.perf_counter()
+        session = Repository.get_chat_session(session_id)
+        if session is None:
+            logging.error("Chat session %s does not exist.", session_id)
             raise ValueError("Invalid chat session ID.")
+        if session.ended_at is not None:
+            raise ValueError("Chat session has ended.")
 
         message_data = MessageData(
             session_id=session_id,
@@ -49,24 +87,113 @@ class ChatService:
             message_type=message_type,
         )
 
-        # Process the message through the strategies
-        session = Repository.chat_sessions[session_id]
-        for strategy in session.strategies:
-            message_data = strategy.process(message_data)
-        
-        logging.info(f"[{message_data.participant_type.value} {participant_id}]: {message_data.content}")
+        # Process the message through the session's compiled strategies
+        pipeline = ChatService._pipeline(session)
+        if pipeline.inline:
+            message_data = pipeline.run(message_data)
+        else:
+            message_data = await pipeline.run_async(message_data)
+        # Stamped after the last await, so a message sent meanwhile and stored
+        # first keeps the session in timestamp order for ``since`` queries.
+        message_data.timestamp = datetime.now()
+
+        log_message(message_data)
 
         Repository.add_message(message_data)
+        SearchIndex.add(message_data)
+        Broker.publish(message_data)
+        if Metrics.enabled:
+            SEND_MESSAGE_SECONDS.observe(time.perf_counter() - start)
+
+    @staticmethod
+    async def send_messages(messages: List[MessageData]) -> List[MessageData]:
+        """
+        Process and store a batch of messages as a whole.
+
+        Every session is looked up and every pipeline compiled once per batch,
+        and the processed messages are committed with one repository call. If
+        any session does not exist, nothing is stored.
+
+        Messages may carry the ``timestamp`` of an import, but no earlier than
+        the last stored message of their session and not in the future, so
+        sessions stay in timestamp order for ``since`` queries.
+        """
+        pipelines = {}
+        for message in messages:
+            if message.session_id not in pipelines:
+                session = Repository.get_chat_session(message.session_id)
+                if session is None:
+                    logging.error("Chat session %s does not exist.", message.session_id)
+                    raise ValueError(f"Invalid chat session ID: {message.session_id}")
+                if session.ended_at is not None:
+                    raise ValueError(f"Chat session has ended: {message.session_id}")
+                pipelines[message.session_id] = ChatService._pipeline(session)
+
+        if all(pipeline.inline for pipeline in pipelines.values()):
+            processed = [pipelines[message.session_id].run(message) for message in messages]
+        else:
+            processed = list(
+                await asyncio.gather(
+                    *(pipelines[message.session_id].run_async(message) for message in messages)
+                )
+            )
+        # Checked after the last await, so no other message of the event loop
+        # is stored in between.
+        ChatService._check_timestamps(processed)
+        Repository.add_messages(processed)
+        SearchIndex.add_many(processed)
+        logging.info(
+            "Stored a batch of %d messages in %d sessions.", len(processed), len(pipelines)
+        )
+
+        Broker.publish_many(processed)
+        return processed
+
+    @staticmethod
+    def _check_timestamps(messages: List[MessageData]) -> None:
+        now = datetime.now()
+        latest = {}
+        for message in messages:
+            session_id = message.session_id
+            if message.timestamp > now:
+                raise ValueError(f"Message timestamp is in the future: {message.timestamp}")
+            if session_id not in latest:
+                count = Repository.count_session_messages(session_id)
+                last = Repository.get_session_messages(session_id, count - 1) if count else []
+                latest[session_id] = last[0].timestamp if last else datetime.min
+            if message.timestamp < latest[session_id]:
+                raise ValueError(
+                    f"Message timestamp {message.timestamp} is older than the last message "
+                    f"of chat session {session_id}."
+                )
+            latest[session_id] = message.timestamp
+
+    @staticmethod
+    async def end_chat_session(
+        session_id: uuid.UUID, ended_at: Optional[datetime] = None
+    ) -> None:
+        """End a chat session; its history stays readable but it takes no new messages."""
+        session = Repository.get_chat_session(session_id)
+        if session is None:
+            logging.error("Chat session %s does not exist.", session_id)
+            raise ValueError("Invalid chat session ID.")
+        if session.ended_at is not None:
+            raise ValueError("Chat session has already ended.")
+        Repository.end_chat_session(session_id, ended_at or datetime.now())
+        AgentScheduler.release(session_id)
+        ChatService._pipelines.pop(session_id, None)
+        logging.info("Chat session %s ended.", session_id)
 
     @staticmethod
     async def assign_agent_to_session(session_id: uuid.UUID, agent_id: int) -> None:
-        if session_id not in Repository.chat_sessions:
-            logging.error(f"Chat session {session_id} does not exist.")
+        if Repository.get_chat_session(session_id) is None:
+            logging.error("Chat session %s does not exist.", session_id)
             raise ValueError("Invalid chat session ID.")
-        if agent_id not in Repository.agents:
-            logging.error(f"Agent {agent_id} does not exist.")
+        if Repository.get_agent(agent_id) is None:
+            logging.error("Agent %s does not exist.", agent_id)
             raise ValueError("Invalid agent ID.")
-        Repository.chat_sessions[session_id].support_agent_id = agent_id
+        Repository.assign_agent(session_id, agent_id)
+        AgentScheduler.assigned(session_id, agent_id)
 
     @staticmethod
     async def create_support_ticket(
@@ -85,7 +212,7 @@ class ChatService:
 
     @staticmethod
     async def resolve_ticket(ticket_id: uuid.UUID) -> None:
-        if ticket_id not in Repository.support_tickets:
-            logging.error(f"Ticket {ticket_id} does not exist.")
+        if Repository.get_support_ticket(ticket_id) is None:
+            logging.error("Ticket %s does not exist.", ticket_id)
             raise ValueError("Invalid ticket ID.")
-        Repository.support_tickets[ticket_id].status = TicketStatus.RESOLVED
+        Repository.update_ticket_status(ticket_id, TicketStatus.RESOLVED)
@@ -0,0 +1,127 @@
+from typing import Dict, Optional, Set
+import asyncio
+import threading
+import uuid
+
+from chat.models.message_data import MessageData
+from chat.utils.logging import logging
+
+
+class Subscription:
+    """
+    A bounded queue of messages published to one chat session.
+
+    A subscriber that falls ``max_queue_size`` messages behind is dropped by the
+    hub instead of slowing down publishers; ``get`` then returns ``None`` and
+    the client is expected to reconnect and catch up through the history.
+    """
+
+    def __init__(self, session_id: uuid.UUID, max_queue_size: int):
+        self.session_id = session_id
+        self.dropped = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._loop = asyncio.get_running_loop()
+
+    async def get(self) -> Optional[MessageData]:
+        return await self._queue.get()
+
+    def _deliver(self, message: MessageData) -> bool:
+        if self.dropped:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            MessageHub.drop(self)
+            return False
+
+    def _close(self) -> None:
+        # Discard the backlog so the end-of-stream marker always fits.
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+
+class MessageHub:
+    """
+    In-process publish/subscribe hub fanning out messages per chat session.
+
+    ``ChatService`` publishes every stored message through ``Broker``, which
+    hands it to the hub of every process, and each subscriber of that session
+    (e.g. a WebSocket connection) receives it through its own bounded
+    ``Subscription``.
+    """
+
+    max_queue_size = 256
+    dropped_subscribers = 0
+
+    _lock = threading.Lock()
+    _subscribers: Dict[uuid.UUID, Set[Subscription]] = {}
+
+    @classmethod
+    def subscribe(
+        cls, session_id: uuid.UUID, max_queue_size: Optional[int] = None
+    ) -> Subscription:
+        """Subscribe to a session. Must be called from the consuming event loop."""
+        subscription = Subscription(session_id, max_queue_size or cls.max_queue_size)
+        with cls._lock:
+            cls._subscribers.setdefault(session_id, set()).add(subscription)
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, subscription: Subscription) -> None:
+        with cls._lock:
+            subscribers = cls._subscribers.get(subscription.session_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del cls._subscribers[subscription.session_id]
+
+    @classmethod
+    def drop(cls, subscription: Subscription) -> None:
+        """Disconnect a subscriber that cannot keep up."""
+        cls.unsubscribe(subscription)
+        if not subscription.dropped:
+            subscription.dropped = True
+            cls.dropped_subscribers += 1
+            subscription._close()
+            logging.warning("Dropped slow subscriber of session %s.", subscription.session_id)
+
+    @classmethod
+    def subscriber_count(cls, session_id: uuid.UUID) -> int:
+        return len(cls._subscribers.get(session_id, ()))
+
+    @classmethod
+    def publish(cls, message: MessageData) -> int:
+        """Deliver a message to every subscriber of its session without blocking."""
+        subscribers = cls._subscribers.get(message.session_id)
+        if not subscribers:
+            return 0
+        with cls._lock:
+            subscribers = list(subscribers)
+
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+
+        delivered = 0
+        for subscription in subscribers:
+            if subscription._loop is current_loop:
+                delivered += subscription._deliver(message)
+            else:
+                try:
+                    subscription._loop.call_soon_threadsafe(
+                        subscription._deliver, message
+                    )
+                    delivered += 1
+                except RuntimeError:
+                    # The subscriber's event loop is gone.
+                    cls.unsubscribe(subscription)
+        return delivered
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._subscribers.clear()
+        cls.dropped_subscribers = 0
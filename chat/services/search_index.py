@@ -0,0 +1,355 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import heapq
+import math
+import re
+import threading
+import uuid
+
+from chat.models.message_data import MessageData
+from chat.repository.repository import Repository
+
+_TOKEN = re.compile(r"\w+")
+_CLAUSE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """
+    Split a query into clauses, each a list of terms that must appear in order.
+
+    Quoted text is a phrase; so is a bare word that tokenizes into several
+    terms, such as the order number ``A-1234``.
+    """
+    clauses = []
+    for phrase, word in _CLAUSE.findall(query):
+        terms = tokenize(phrase or word)
+        if terms:
+            clauses.append(terms)
+    return clauses
+
+
+class _Postings:
+    """The occurrences of one term, as parallel arrays sorted by document."""
+
+    __slots__ = ("docs", "positions", "doc_count")
+
+    def __init__(self):
+        self.docs = array("I")
+        self.positions = array("I")
+        self.doc_count = 0
+
+
+class _State:
+    """
+    The documents and postings of the index.
+
+    Removing sessions only marks their documents; compaction builds a new
+    ``_State`` without them and swaps it in, so searches read one state from
+    start to end without a lock.
+    """
+
+    __slots__ = (
+        "postings",
+        "message_ids",
+        "doc_sessions",
+        "doc_lengths",
+        "session_codes",
+        "code_sessions",
+        "session_docs",
+        "total_length",
+        "removed_codes",
+        "removed_docs",
+    )
+
+    def __init__(self):
+        self.postings: Dict[str, _Postings] = {}
+        self.message_ids: List[uuid.UUID] = []
+        self.doc_sessions = array("I")
+        self.doc_lengths = array("I")
+        self.session_codes: Dict[uuid.UUID, int] = {}
+        # Session ids by code, kept for removed sessions until compaction.
+        self.code_sessions: List[uuid.UUID] = []
+        self.session_docs: Dict[int, array] = {}
+        self.total_length = 0
+        # Sessions removed since the last compaction, and their document count.
+        self.removed_codes: Set[int] = set()
+        self.removed_docs = 0
+
+    def add(self, message: MessageData, terms: List[str]) -> None:
+        doc = len(self.message_ids)
+        for position, term in enumerate(terms):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            if not postings.docs or postings.docs[-1] != doc:
+                postings.doc_count += 1
+            postings.docs.append(doc)
+            postings.positions.append(position)
+        code = self.session_codes.get(message.session_id)
+        if code is None:
+            # Codes of removed sessions are not reused until compaction.
+            code = len(self.session_codes) + len(self.removed_codes)
+            self.session_codes[message.session_id] = code
+            self.code_sessions.append(message.session_id)
+            self.session_docs[code] = array("I")
+        self.session_docs[code].append(doc)
+        self.doc_sessions.append(code)
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+        self.message_ids.append(message.message_id)
+
+    def remove(self, session_id: uuid.UUID) -> None:
+        code = self.session_codes.pop(session_id, None)
+        if code is not None:
+            self.removed_codes.add(code)
+            self.removed_docs += len(self.session_docs.pop(code))
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the content of stored messages.
+
+    ``ChatService`` adds every message after its strategies ran, so the index
+    holds the filtered content. Messages are numbered in the order they are
+    indexed and every term maps to the numbers and token positions of its
+    occurrences, which makes phrase matching a position check. Results are
+    ranked with BM25.
+
+    Writers are serialized by a lock. Searches take no lock: a document only
+    becomes visible once its message id is appended, after all its postings.
+
+    ``remove_sessions`` hides the messages of evicted sessions at once; their
+    space is reclaimed by ``compact`` once they outnumber the live messages.
+    """
+
+    k1 = 1.2
+    b = 0.75
+    # Compaction is not worth it below this many removed messages.
+    compact_min_docs = 10_000
+
+    _lock = threading.Lock()
+    _state = _State()
+    # While a compaction runs, the changes it has to carry over.
+    _compacting = False
+    _added_meanwhile: List[Tuple[MessageData, List[str]]] = []
+    _removed_meanwhile: List[uuid.UUID] = []
+
+    @classmethod
+    def add(cls, message: MessageData) -> None:
+        cls.add_many((message,))
+
+    @classmethod
+    def add_many(cls, messages: Iterable[MessageData]) -> None:
+        tokenized = [(message, tokenize(message.content)) for message in messages]
+        with cls._lock:
+            state = cls._state
+            for message, terms in tokenized:
+                state.add(message, terms)
+            if cls._compacting:
+                cls._added_meanwhile.extend(tokenized)
+
+    @classmethod
+    def remove_sessions(cls, session_ids: Iterable[uuid.UUID]) -> bool:
+        """Remove the messages of sessions; return whether ``compact`` is due."""
+        with cls._lock:
+            state = cls._state
+            for session_id in session_ids:
+                state.remove(session_id)
+                if cls._compacting:
+                    cls._removed_meanwhile.append(session_id)
+            live = len(state.message_ids) - state.removed_docs
+            return not cls._compacting and state.removed_docs >= max(
+                cls.compact_min_docs, live
+            )
+
+    @classmethod
+    def compact(cls) -> None:
+        """
+        Rebuild the index without the messages of removed sessions.
+
+        The live messages are read back from the repository and indexed into a
+        new state without holding the lock; only carrying over the changes made
+        in the meantime and swapping the states in happen under it.
+        """
+        with cls._lock:
+            if cls._compacting:
+                return
+            cls._compacting = True
+            old = cls._state
+            removed = old.removed_codes
+            live = {
+                message_id: doc
+                for doc, message_id in enumerate(old.message_ids)
+                if old.doc_sessions[doc] not in removed
+            }
+            session_ids = list(old.session_codes)
+        try:
+            found = []
+            for session_id in session_ids:
+                for message in Repository.get_session_messages(session_id):
+                    doc = live.get(message.message_id)
+                    if doc is not None:
+                        found.append((doc, message))
+            # Keep the original order, in which newer messages win ties.
+            found.sort(key=itemgetter(0))
+            fresh = _State()
+            for _, message in found:
+                fresh.add(message, tokenize(message.content))
+            with cls._lock:
+                if cls._state is old:
+                    for message, terms in cls._added_meanwhile:
+                        fresh.add(message, terms)
+                    for session_id in cls._removed_meanwhile:
+                        fresh.remove(session_id)
+                    cls._state = fresh
+        finally:
+            with cls._lock:
+                cls._compacting = False
+                cls._added_meanwhile = []
+                cls._removed_meanwhile = []
+
+    @classmethod
+    def search(
+        cls,
+        query: str,
+        session_ids: Optional[Iterable[uuid.UUID]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[Tuple[uuid.UUID, uuid.UUID, float]], int]:
+        """
+        Return the ``(message_id, session_id, score)`` of one page of matches,
+        best first, and the total number of matches.
+
+        Every clause of the query must match. ``session_ids`` restricts the
+        search to messages of those sessions.
+        """
+        state = cls._state
+        doc_count = len(state.message_ids)
+        clauses = parse_query(query)
+        if not clauses or not doc_count:
+            return [], 0
+        terms = {term for clause in clauses for term in clause}
+        postings: Dict[str, _Postings] = {}
+        for term in terms:
+            if term not in state.postings:
+                return [], 0
+            postings[term] = state.postings[term]
+        # Ignore occurrences in documents still being indexed.
+        ends = {term: bisect_left(p.docs, doc_count) for term, p in postings.items()}
+        average_length = state.total_length / doc_count or 1.0
+        idf = {
+            term: math.log(1 + (doc_count - p.doc_count + 0.5) / (p.doc_count + 0.5))
+            for term, p in postings.items()
+        }
+        phrases = [clause for clause in clauses if len(clause) > 1]
+        rarest = min(terms, key=ends.__getitem__)
+        candidates: Optional[Iterator[int]] = None
+        allowed: Optional[Set[int]] = None
+        if session_ids is not None:
+            codes = (state.session_codes.get(session_id) for session_id in session_ids)
+            allowed = {code for code in codes if code is not None}
+            scoped = [state.session_docs.get(code, ()) for code in allowed]
+            if sum(map(len, scoped)) < ends[rarest]:
+                # The scope is narrower than the rarest term: walk its messages.
+                candidates = heapq.merge(*scoped)
+                allowed = None
+
+        k1, b = cls.k1, cls.b
+        doc_sessions, doc_lengths = state.doc_sessions, state.doc_lengths
+        # Sessions in the scope are live; without a scope, skip the removed ones.
+        excluded = state.removed_codes if allowed is None else None
+        if candidates is None and len(terms) == 1 and not phrases:
+            # A single term needs no intersection: count its occurrences per
+            # document in one pass and score them all at once.
+            frequencies = Counter(postings[rarest].docs[: ends[rarest]])
+            base, per_token = k1 * (1 - b), k1 * b / average_length
+            weight = idf[rarest] * (k1 + 1)
+            scored = [
+                (weight * tf / (tf + base + per_token * doc_lengths[doc]), doc)
+                for doc, tf in frequencies.items()
+                if (allowed is None or doc_sessions[doc] in allowed)
+                and not (excluded and doc_sessions[doc] in excluded)
+            ]
+        else:
+            if candidates is None:
+                candidates = cls._candidates(postings[rarest].docs, ends[rarest])
+            scored = []
+            columns = [(term, postings[term].docs, ends[term], idf[term]) for term in terms]
+            for doc in candidates:
+                if doc >= doc_count:
+                    break
+                if allowed is not None and doc_sessions[doc] not in allowed:
+                    continue
+                if excluded and doc_sessions[doc] in excluded:
+                    continue
+                spans = {}
+                score = 0.0
+                norm = k1 * (1 - b + b * doc_lengths[doc] / average_length)
+                for term, docs, end, term_idf in columns:
+                    lo = bisect_left(docs, doc, 0, end)
+                    hi = bisect_right(docs, doc, lo, end)
+                    if lo == hi:
+                        break
+                    spans[term] = (lo, hi)
+                    tf = hi - lo
+                    score += term_idf * tf * (k1 + 1) / (tf + norm)
+                else:
+                    if all(cls._has_phrase(phrase, postings, spans) for phrase in phrases):
+                        scored.append((score, doc))
+
+        # Newer messages win ties.
+        page = heapq.nlargest(offset + limit, scored)[offset:]
+        return [
+            (state.message_ids[doc], state.code_sessions[doc_sessions[doc]], score)
+            for score, doc in page
+        ], len(scored)
+
+    @staticmethod
+    def _candidates(docs: array, end: int) -> Iterator[int]:
+        """Yield each document of a postings list once."""
+        position = 0
+        while position < end:
+            doc = docs[position]
+            yield doc
+            position = bisect_right(docs, doc, position, end)
+
+    @staticmethod
+    def _has_phrase(
+        phrase: List[str],
+        postings: Dict[str, _Postings],
+        spans: Dict[str, Tuple[int, int]],
+    ) -> bool:
+        lo, hi = spans[phrase[0]]
+        starts = set(postings[phrase[0]].positions[lo:hi])
+        for offset, term in enumerate(phrase[1:], 1):
+            lo, hi = spans[term]
+            starts.intersection_update(
+                position - offset for position in postings[term].positions[lo:hi]
+            )
+            if not starts:
+                return False
+        return True
+
+    @classmethod
+    def rebuild(cls) -> None:
+        """Index the messages already in the repository, e.g. after a restart."""
+        cls.clear()
+        for session in Repository.iter_chat_sessions():
+            cls.add_many(Repository.get_session_messages(session.session_id))
+
+    @classmethod
+    def indexed_count(cls) -> int:
+        state = cls._state
+        return len(state.message_ids) - state.removed_docs
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._state = _State()
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
+
+from chat.config import settings
+from chat.repository.repository import Repository
+from chat.services.chat_service import ChatService
+from chat.services.search_index import SearchIndex
+from chat.utils.logging import logging
+from chat.utils.metrics import Metrics
+
+SWEPT_SESSIONS = Metrics.counter(
+    "chat_swept_sessions",
+    "Sessions closed for inactivity or evicted from memory by the sweeper.",
+    ("action",),
+)
+
+
+@dataclass(slots=True)
+class SweepResult:
+    closed: int = 0
+    evicted: int = 0
+
+
+class SessionSweeper:
+    """
+    Closes idle chat sessions and evicts long-ended ones from memory.
+
+    A sweep ends every session without activity for ``idle_seconds`` through
+    ``ChatService.end_chat_session``, which frees its agent and archives its
+    messages, and then evicts the sessions ended more than
+    ``retention_seconds`` ago together with their search index entries. Both
+    steps work in batches of ``batch_size`` and yield to the event loop in
+    between; the repository takes its locks for one session at a time.
+    ``run`` sweeps every ``interval`` seconds; the API runs it in the
+    background while the app is up.
+    """
+
+    idle_seconds = settings.session_idle_seconds
+    retention_seconds = settings.session_retention_seconds
+    interval = settings.session_sweep_interval
+    batch_size = settings.session_sweep_batch
+    clock = datetime.now
+
+    @classmethod
+    async def sweep(cls) -> SweepResult:
+        result = SweepResult()
+        now = cls.clock()
+        if cls.idle_seconds > 0:
+            before = now - timedelta(seconds=cls.idle_seconds)
+            while True:
+                idle = Repository.idle_sessions(before, cls.batch_size)
+                closed = 0
+                for session_id in idle:
+                    try:
+                        await ChatService.end_chat_session(session_id, now)
+                    except ValueError:
+                        # Ended by a request in the meantime.
+                        continue
+                    closed += 1
+                result.closed += closed
+                if len(idle) < cls.batch_size or not closed:
+                    break
+                await asyncio.sleep(0)
+
+        if cls.retention_seconds > 0:
+            ended_before = now - timedelta(seconds=cls.retention_seconds)
+            while True:
+                evicted = Repository.evict_chat_sessions(ended_before, cls.batch_size)
+                if SearchIndex.remove_sessions(evicted):
+                    # Rebuilding the index is CPU-bound; keep serving meanwhile.
+                    await asyncio.to_thread(SearchIndex.compact)
+                result.evicted += len(evicted)
+                if len(evicted) < cls.batch_size:
+                    break
+                await asyncio.sleep(0)
+
+        if Metrics.enabled:
+            SWEPT_SESSIONS.inc("closed", amount=result.closed)
+            SWEPT_SESSIONS.inc("evicted", amount=result.evicted)
+        return result
+
+    @classmethod
+    async def run(cls) -> None:
+        """Sweep every ``interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(cls.interval)
+            try:
+                result = await cls.sweep()
+            except Exception:
+                logging.exception("Session sweep failed.")
+                continue
+            if result.closed or result.evicted:
+                logging.info(
+                    "Closed %d idle sessions and evicted %d ended sessions.",
+                    result.closed,
+                    result.evicted,
+                )
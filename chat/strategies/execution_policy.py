@@ -0,0 +1,78 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import multiprocessing
+import threading
+
+from chat.config import settings
+from chat.models.enums import ExecutionMode
+
+if TYPE_CHECKING:
+    from chat.models.message_data import MessageData
+    from chat.strategies.message_processing_strategy import MessageProcessingStrategy
+
+
+@dataclass(frozen=True)
+class ExecutionPolicy:
+    """
+    Where and how long a strategy may run.
+
+    ``INLINE`` runs on the event loop, ``THREAD`` in a shared thread pool for
+    blocking I/O and ``PROCESS`` in a shared process pool for CPU-bound work;
+    the strategy and message must then be picklable. When the strategy does
+    not finish within ``timeout`` seconds or raises, the message continues
+    through ``fallback``, or unchanged if there is none; an async fallback is
+    awaited, on the event loop and without a timeout. A synchronous inline
+    strategy cannot be interrupted, so its timeout is not enforced.
+    """
+
+    mode: ExecutionMode = ExecutionMode.INLINE
+    timeout: Optional[float] = None
+    fallback: Optional["MessageProcessingStrategy"] = None
+
+
+INLINE = ExecutionPolicy()
+
+_lock = threading.Lock()
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(
+                max_workers=settings.strategy_thread_workers,
+                thread_name_prefix="strategy",
+            )
+        return _thread_pool
+
+
+def process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            # Forking a process that already runs threads is unsafe.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.strategy_process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def shutdown_pools() -> None:
+    global _thread_pool, _process_pool
+    with _lock:
+        for pool in (_thread_pool, _process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = _process_pool = None
+
+
+def run_coroutine_strategy(
+    strategy: "MessageProcessingStrategy", message: "MessageData"
+) -> "MessageData":
+    """Run an async strategy to completion in a pool worker."""
+    return asyncio.run(strategy.process(message))  # type: ignore[arg-type]
@@ -1,9 +1,66 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from chat.models.message_data import MessageData
+from chat.strategies.execution_policy import INLINE, ExecutionPolicy
+from chat.utils.aho_corasick import fold_case
+
+
+class TextView:
+    """
+    The message text shared by the strategies of a pipeline run.
+
+    Derived forms such as the case-folded text are computed at most once per
+    version of the content instead of once per strategy.
+    """
+
+    __slots__ = ("text", "_folded")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._folded: Optional[str] = None
+
+    @property
+    def folded(self) -> str:
+        if self._folded is None:
+            self._folded = fold_case(self.text)
+        return self._folded
 
 
 class MessageProcessingStrategy(ABC):
+    """
+    A step applied to every message of a session before it is stored.
+
+    ``process`` may also be defined as ``async def``, e.g. for a strategy
+    calling a remote service. ``execution_policy`` decides whether the strategy
+    runs on the event loop or in a thread or process pool, with a timeout.
+    """
+
+    execution_policy: ExecutionPolicy = INLINE
+    # Whether ``process`` may change the message. Strategies that only inspect
+    # it set this to False, and the pipeline then skips change detection.
+    transforms_content: bool = True
+    # Whether a change made by this strategy is final: once it has changed the
+    # message, the pipeline skips the remaining strategies.
+    final_on_change: bool = False
+
     @abstractmethod
     def process(self, message: MessageData) -> MessageData:
         pass
+
+    def apply(self, message: MessageData, view: TextView) -> MessageData:
+        """Process the message reusing the pipeline's shared view of its text."""
+        return self.process(message)
+
+    def to_config(self) -> dict:
+        """The JSON-serializable arguments ``from_config`` rebuilds this strategy from."""
+        return {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "MessageProcessingStrategy":
+        return cls(**config)
+
+    def with_policy(self, policy: ExecutionPolicy) -> "MessageProcessingStrategy":
+        """Set the execution policy of this strategy and return it."""
+        self.execution_policy = policy
+        return self
@@ -1,19 +1,51 @@
+from typing import Iterable, Optional
+
 from chat.models.message_data import MessageData
-from chat.strategies.message_processing_strategy import MessageProcessingStrategy
+from chat.strategies.message_processing_strategy import (
+    MessageProcessingStrategy,
+    TextView,
+)
+from chat.utils.aho_corasick import compile_patterns
 from chat.utils.logging import logging
 
+DEFAULT_PROFANITY_LIST = ["badword1", "badword2"]
+
+
 class ProfanityFilterStrategy(MessageProcessingStrategy):
+    def __init__(
+        self,
+        profanity_list: Optional[Iterable[str]] = None,
+        case_sensitive: bool = True,
+    ):
+        self.profanity_list = list(
+            DEFAULT_PROFANITY_LIST if profanity_list is None else profanity_list
+        )
+        self.case_sensitive = case_sensitive
+        # Built once and shared by every strategy using the same list.
+        self._matcher = compile_patterns(self.profanity_list, case_sensitive)
+
+    def __getstate__(self):
+        # The automaton is rebuilt from the word list, or taken from the cache.
+        state = self.__dict__.copy()
+        del state["_matcher"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._matcher = compile_patterns(self.profanity_list, self.case_sensitive)
+
+    def to_config(self) -> dict:
+        return {"profanity_list": self.profanity_list, "case_sensitive": self.case_sensitive}
+
     def process(self, message: MessageData) -> MessageData:
-        profanity_list = ["badword1", "badword2"]
-        contains_profanity = False
+        return self.apply(message, TextView(message.content))
 
-        for badword in profanity_list:
-            if badword in message.content:
-                contains_profanity = True
-                message.content = message.content.replace(badword, "*" * len(badword))
+    def apply(self, message: MessageData, view: TextView) -> MessageData:
+        folded = None if self.case_sensitive else view.folded
+        content, contains_profanity = self._matcher.mask(message.content, folded=folded)
 
         if contains_profanity:
-            logging.warning(
-                f"Message {message.message_id} includes badwords: {message.content}"
-            )
+            message.content = content
+            # The content stays out of the logs; it is what was flagged.
+            logging.warning("Message %s includes bad words.", message.message_id)
         return message
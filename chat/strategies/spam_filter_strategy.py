@@ -1,11 +1,46 @@
+from typing import Iterable, Optional
+
 from chat.models.message_data import MessageData
-from chat.strategies.message_processing_strategy import MessageProcessingStrategy
+from chat.strategies.message_processing_strategy import (
+    MessageProcessingStrategy,
+    TextView,
+)
+from chat.utils.aho_corasick import compile_patterns
 from chat.utils.logging import logging
 
+DEFAULT_SPAM_KEYWORDS = ["buy now", "free", "click here"]
+
+
 class SpamFilterStrategy(MessageProcessingStrategy):
+    REPLACEMENT = "[Message removed due to spam detection]"
+    # The whole message is replaced, so later strategies have nothing to do.
+    final_on_change = True
+
+    def __init__(self, spam_keywords: Optional[Iterable[str]] = None):
+        self.spam_keywords = list(
+            DEFAULT_SPAM_KEYWORDS if spam_keywords is None else spam_keywords
+        )
+        # Built once and shared by every strategy using the same list.
+        self._matcher = compile_patterns(self.spam_keywords, case_sensitive=False)
+
+    def __getstate__(self):
+        # The automaton is rebuilt from the keywords, or taken from the cache.
+        state = self.__dict__.copy()
+        del state["_matcher"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._matcher = compile_patterns(self.spam_keywords, case_sensitive=False)
+
+    def to_config(self) -> dict:
+        return {"spam_keywords": self.spam_keywords}
+
     def process(self, message: MessageData) -> MessageData:
-        spam_keywords = ["buy now", "free", "click here"]
-        if any(keyword in message.content.lower() for keyword in spam_keywords):
-            logging.warning(f"Message {message.message_id} detected as spam.")
-            message.content = "[Message removed due to spam detection]"
+        return self.apply(message, TextView(message.content))
+
+    def apply(self, message: MessageData, view: TextView) -> MessageData:
+        if self._matcher.search(message.content, folded=view.folded):
+            logging.warning("Message %s detected as spam.", message.message_id)
+            message.content = self.REPLACEMENT
         return message
@@ -0,0 +1,156 @@
+from typing import List, Sequence
+import asyncio
+import copy
+import inspect
+import time
+
+from chat.models.enums import ExecutionMode
+from chat.models.message_data import MessageData
+from chat.strategies import execution_policy
+from chat.strategies.message_processing_strategy import (
+    MessageProcessingStrategy,
+    TextView,
+)
+from chat.utils.logging import logging
+from chat.utils.metrics import Metrics
+
+STRATEGY_SECONDS = Metrics.histogram(
+    "chat_strategy_seconds",
+    "Time spent processing a message, per strategy class.",
+    ("strategy",),
+)
+
+
+def _timed(name: str, apply):
+    observe = STRATEGY_SECONDS.labels(name).observe
+
+    def timed_apply(message, view):
+        start = time.perf_counter()
+        try:
+            return apply(message, view)
+        finally:
+            observe(time.perf_counter() - start)
+
+    return timed_apply
+
+
+class StrategyPipeline:
+    """
+    A list of strategies compiled into one pass over a message.
+
+    The strategies' declarations are read once at compile time. While running,
+    all strategies share one ``TextView``, which is only rebuilt after a
+    strategy actually changed the content, and the run stops early after a
+    strategy marked ``final_on_change`` has changed the message.
+
+    A pipeline of synchronous inline strategies only is ``inline`` and can be
+    run with ``run``; any other pipeline must be awaited with ``run_async``,
+    which hands async and offloaded strategies a copy of the message and keeps
+    the event loop free while they work.
+
+    With metrics enabled when the pipeline is compiled, every strategy is timed
+    into ``chat_strategy_seconds``.
+    """
+
+    def __init__(self, strategies: Sequence[MessageProcessingStrategy]):
+        self.strategies: List[MessageProcessingStrategy] = list(strategies)
+        self._steps = []
+        self._timed = Metrics.enabled
+        for strategy in self.strategies:
+            policy = strategy.execution_policy
+            is_async = inspect.iscoroutinefunction(strategy.process)
+            offloaded = is_async or policy.mode is not ExecutionMode.INLINE
+            apply = strategy.apply
+            if self._timed:
+                apply = _timed(type(strategy).__name__, apply)
+            self._steps.append(
+                (
+                    strategy,
+                    apply,
+                    strategy.transforms_content,
+                    strategy.final_on_change,
+                    offloaded,
+                    is_async,
+                )
+            )
+        self.inline = not any(step[4] for step in self._steps)
+
+    def run(self, message: MessageData) -> MessageData:
+        if not self.inline:
+            raise RuntimeError("This pipeline has async or offloaded strategies; use run_async.")
+        if not self._steps:
+            return message
+        view = TextView(message.content)
+        for _, apply, transforms_content, final_on_change, _, _ in self._steps:
+            if not transforms_content:
+                apply(message, view)
+                continue
+            message = apply(message, view)
+            if message.content != view.text:
+                if final_on_change:
+                    break
+                view = TextView(message.content)
+        return message
+
+    async def run_async(self, message: MessageData) -> MessageData:
+        if self.inline:
+            return self.run(message)
+        view = TextView(message.content)
+        for strategy, apply, transforms_content, final_on_change, offloaded, is_async in self._steps:
+            if offloaded:
+                start = time.perf_counter()
+                result = await self._run_offloaded(strategy, is_async, message)
+                if self._timed:
+                    STRATEGY_SECONDS.observe(
+                        time.perf_counter() - start, type(strategy).__name__
+                    )
+            else:
+                result = apply(message, view)
+            if not transforms_content:
+                continue
+            message = result
+            if message.content != view.text:
+                if final_on_change:
+                    break
+                view = TextView(message.content)
+        return message
+
+    @staticmethod
+    async def _run_offloaded(
+        strategy: MessageProcessingStrategy, is_async: bool, message: MessageData
+    ) -> MessageData:
+        policy = strategy.execution_policy
+        # The strategy works on a copy, so a late or failed run cannot change
+        # the message that continues through the pipeline.
+        candidate = copy.copy(message)
+        loop = asyncio.get_running_loop()
+        if policy.mode is ExecutionMode.INLINE:
+            work = strategy.process(candidate)
+        else:
+            pool = (
+                execution_policy.thread_pool()
+                if policy.mode is ExecutionMode.THREAD
+                else execution_policy.process_pool()
+            )
+            if is_async:
+                work = loop.run_in_executor(
+                    pool, execution_policy.run_coroutine_strategy, strategy, candidate
+                )
+            else:
+                work = loop.run_in_executor(pool, strategy.process, candidate)
+        try:
+            return await asyncio.wait_for(work, policy.timeout)
+        except Exception as e:
+            reason = "timed out" if isinstance(e, asyncio.TimeoutError) else f"failed: {e!r}"
+            logging.warning(
+                "%s %s on message %s; using the fallback.",
+                type(strategy).__name__,
+                reason,
+                message.message_id,
+            )
+            fallback = policy.fallback
+            if fallback is None:
+                return message
+            if inspect.iscoroutinefunction(fallback.process):
+                return await fallback.process(message)
+            return fallback.process(message)
@@ -0,0 +1,76 @@
+"""
+Storage encoding of session strategies.
+
+Backends that keep sessions outside the process store their strategies as
+JSON: the registered class name, the strategy's ``to_config`` and its
+execution policy. Reading them back only instantiates registered classes,
+so stored data cannot run arbitrary code the way unpickling it could.
+"""
+from typing import Dict, List, Optional, Sequence, Type
+import json
+
+from chat.models.enums import ExecutionMode
+from chat.strategies.execution_policy import INLINE, ExecutionPolicy
+from chat.strategies.message_processing_strategy import MessageProcessingStrategy
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+from chat.strategies.translation_strategy import TranslationStrategy
+
+
+class StrategyRegistry:
+    _classes: Dict[str, Type[MessageProcessingStrategy]] = {}
+
+    @classmethod
+    def register(
+        cls, strategy_class: Type[MessageProcessingStrategy]
+    ) -> Type[MessageProcessingStrategy]:
+        """Allow sessions of a persistent backend to use ``strategy_class``."""
+        cls._classes[strategy_class.__name__] = strategy_class
+        return strategy_class
+
+    @classmethod
+    def encode(cls, strategies: Sequence[MessageProcessingStrategy]) -> bytes:
+        return json.dumps([cls._to_dict(strategy) for strategy in strategies]).encode()
+
+    @classmethod
+    def decode(cls, blob: bytes) -> List[MessageProcessingStrategy]:
+        try:
+            entries = json.loads(blob)
+        except ValueError:
+            raise ValueError("Stored strategies are not in the JSON strategy format.") from None
+        return [cls._from_dict(entry) for entry in entries]
+
+    @classmethod
+    def _to_dict(cls, strategy: MessageProcessingStrategy) -> dict:
+        name = type(strategy).__name__
+        if cls._classes.get(name) is not type(strategy):
+            raise ValueError(f"Strategy {name} is not registered.")
+        entry = {"name": name, "config": strategy.to_config()}
+        policy = strategy.execution_policy
+        if policy != INLINE:
+            entry["policy"] = {
+                "mode": policy.mode.value,
+                "timeout": policy.timeout,
+                "fallback": None if policy.fallback is None else cls._to_dict(policy.fallback),
+            }
+        return entry
+
+    @classmethod
+    def _from_dict(cls, entry: dict) -> MessageProcessingStrategy:
+        strategy_class = cls._classes.get(entry["name"])
+        if strategy_class is None:
+            raise ValueError(f"Strategy {entry['name']} is not registered.")
+        strategy = strategy_class.from_config(entry["config"])
+        policy = entry.get("policy")
+        if policy is not None:
+            fallback: Optional[MessageProcessingStrategy] = (
+                None if policy["fallback"] is None else cls._from_dict(policy["fallback"])
+            )
+            strategy.with_policy(
+                ExecutionPolicy(ExecutionMode(policy["mode"]), policy["timeout"], fallback)
+            )
+        return strategy
+
+
+for _strategy_class in (SpamFilterStrategy, ProfanityFilterStrategy, TranslationStrategy):
+    StrategyRegistry.register(_strategy_class)
@@ -1,11 +1,82 @@
+from typing import Optional
+import threading
+import time
+
+from chat.config import settings
 from chat.models.message_data import MessageData
 from chat.strategies.message_processing_strategy import MessageProcessingStrategy
+from chat.utils.translation_cache import TranslationCache
+
+
+class StubTranslator:
+    """A local stand-in for a translation backend, with artificial latency."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def translate(self, content: str, target_language: str) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return f"[Translated to {target_language}]: Quid agis?"
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+# Translations shared by all translation strategies of this process.
+translation_cache = TranslationCache(
+    max_entries=settings.translation_cache_size, ttl=settings.translation_cache_ttl
+)
 
 
 class TranslationStrategy(MessageProcessingStrategy):
-    def __init__(self, target_language):
+    def __init__(
+        self,
+        target_language,
+        translator: Optional[StubTranslator] = None,
+        cache: Optional[TranslationCache] = translation_cache,
+    ):
         self.target_language = target_language
+        self.translator = translator or StubTranslator()
+        self.cache = cache
+
+    def to_config(self) -> dict:
+        # The translator is a local stand-in and is not stored.
+        return {"target_language": self.target_language, "cached": self.cache is not None}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "TranslationStrategy":
+        cache = translation_cache if config.get("cached", True) else None
+        return cls(config["target_language"], cache=cache)
 
     def process(self, message: MessageData) -> MessageData:
-        message.content = f"[Translated to {self.target_language}]: Quid agis?"
+        if self.cache is None:
+            message.content = self.translator.translate(message.content, self.target_language)
+        else:
+            message.content = self.cache.get_or_translate(
+                message.content, self.target_language, self.translator.translate
+            )
         return message
+
+    def __getstate__(self):
+        # A cache cannot be shared with another process; there the strategy
+        # uses that process's shared cache instead.
+        state = self.__dict__.copy()
+        if state.get("cache") is not None:
+            state["cache"] = True
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.__dict__.get("cache") is True:
+            self.cache = translation_cache
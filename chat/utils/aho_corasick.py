@@ -0,0 +1,118 @@
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def fold_case(text: str) -> str:
+    """Lowercase ``text`` while keeping every character at its position."""
+    folded = text.lower()
+    if len(folded) != len(text):
+        # Keep positions aligned for the few characters whose lowercase
+        # form is longer than one character.
+        folded = "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+    return folded
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton finding every occurrence of many patterns in one pass.
+
+    Building costs time linear in the total pattern length and happens once;
+    scanning a text then costs time linear in the text length, independent of
+    the number of patterns. Matching is on plain substrings; with
+    ``case_sensitive=False`` patterns and text are compared lowercased.
+    """
+
+    def __init__(self, patterns: Iterable[str], case_sensitive: bool = True):
+        self.case_sensitive = case_sensitive
+        # State 0 is the root. ``_longest[state]`` is the length of the longest
+        # pattern ending in that state, following dictionary suffix links, or 0.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._longest: List[int] = [0]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern if case_sensitive else fold_case(pattern))
+        self._link()
+
+    def _add(self, pattern: str):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._longest.append(0)
+            state = next_state
+        self._longest[state] = max(self._longest[state], len(pattern))
+
+    def _link(self):
+        goto, fail, longest = self._goto, self._fail, self._longest
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                longest[next_state] = max(longest[next_state], longest[fail[next_state]])
+
+    def finditer(self, text: str, folded: Optional[str] = None) -> Iterator[Tuple[int, int]]:
+        """
+        Yield ``(start, end)`` of the longest match ending at each position.
+
+        Shorter matches ending at the same position lie inside that span. A
+        case-insensitive automaton can be given ``fold_case(text)`` as ``folded``
+        when the caller already has it.
+        """
+        if not self.case_sensitive:
+            text = fold_case(text) if folded is None else folded
+        goto, fail, longest = self._goto, self._fail, self._longest
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if longest[state]:
+                yield index + 1 - longest[state], index + 1
+
+    def search(self, text: str, folded: Optional[str] = None) -> bool:
+        """Return whether any pattern occurs in ``text``, stopping at the first match."""
+        for _ in self.finditer(text, folded):
+            return True
+        return False
+
+    def mask(
+        self, text: str, char: str = "*", folded: Optional[str] = None
+    ) -> Tuple[str, bool]:
+        """Replace every character covered by a match with ``char``."""
+        spans: List[List[int]] = []
+        for start, end in self.finditer(text, folded):
+            # A longer match may reach back over several earlier spans.
+            while spans and start <= spans[-1][1]:
+                start = min(start, spans.pop()[0])
+            spans.append([start, end])
+        if not spans:
+            return text, False
+        parts = []
+        position = 0
+        for start, end in spans:
+            parts.append(text[position:start])
+            parts.append(char * (end - start))
+            position = end
+        parts.append(text[position:])
+        return "".join(parts), True
+
+
+@lru_cache(maxsize=32)
+def _compile(patterns: Tuple[str, ...], case_sensitive: bool) -> AhoCorasick:
+    return AhoCorasick(patterns, case_sensitive)
+
+
+def compile_patterns(patterns: Iterable[str], case_sensitive: bool = True) -> AhoCorasick:
+    """Return an automaton for the patterns, shared with earlier calls for the same list."""
+    return _compile(tuple(patterns), case_sensitive)
@@ -1,8 +1,153 @@
+"""
+Logging setup for the chat app.
+
+Records are handed to a background thread through a queue, so logging never
+blocks the caller on I/O. The queue keeps the records as they were created:
+messages are only %-formatted and serialized in the writer thread, so call
+sites pass arguments instead of building f-strings. Output is one JSON
+object per line by default, with the ``extra`` fields of a record as keys.
+
+Other modules use ``from chat.utils.logging import logging`` as before.
+"""
+from typing import Optional
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+from chat.config import settings
+
+# Attributes every LogRecord has; anything else was passed as ``extra``.
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime", "taskName"}
+
+# What the logging module collects for every record unless told otherwise.
+_RECORD_DEFAULTS = {
+    "_srcfile": logging._srcfile,
+    "logThreads": logging.logThreads,
+    "logProcesses": logging.logProcesses,
+    "logMultiprocessing": logging.logMultiprocessing,
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+message_logger = logging.getLogger("chat.messages")
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one line of JSON, including its ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + ".%03d" % record.msecs,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = vars(record)
+        for key in fields.keys() - _RECORD_ATTRIBUTES:
+            entry[key] = fields[key]
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    A ``QueueHandler`` that enqueues records unformatted.
+
+    The standard ``prepare`` formats the message in the calling thread; here
+    that is left to the listener. Arguments must therefore not be mutated
+    after logging, which holds for the ids and numbers the app logs.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = True,
+    stream=None,
+    lean_records: bool = False,
+) -> None:
+    """
+    Route the root logger through a queue to a writer thread.
+
+    With ``lean_records``, records skip the caller's file and line, thread
+    and process, which is the larger part of creating one. These are
+    switches of the ``logging`` module, so they apply to every logger in the
+    process; they are left at the standard defaults otherwise.
+
+    Calling it again replaces the previous configuration; the old writer
+    flushes its queue before it stops.
+    """
+    global _listener
+    stop_logging()
+    for name, default in _RECORD_DEFAULTS.items():
+        lean = None if name == "_srcfile" else False
+        setattr(logging, name, lean if lean_records else default)
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(
+        JsonFormatter()
+        if json_format
+        else logging.Formatter(
+            "{asctime} - {levelname} - {message}", style="{", datefmt="%Y-%m-%d %H:%M"
+        )
+    )
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for previous in [h for h in root.handlers if isinstance(h, _DeferredQueueHandler)]:
+        root.removeHandler(previous)
+    root.addHandler(_DeferredQueueHandler(records))
+    root.setLevel(level.upper())
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def message_log_sampled() -> bool:
+    """Whether to log this message; per-message logs are sampled at a configured rate."""
+    rate = settings.log_message_sample_rate
+    if not message_logger.isEnabledFor(logging.INFO) or rate <= 0:
+        return False
+    return rate >= 1 or random.random() < rate
+
+
+def log_message(message) -> None:
+    """Log a stored message as structured fields; its content only if enabled."""
+    if not message_log_sampled():
+        return
+    extra = {
+        "session_id": message.session_id,
+        "message_id": message.message_id,
+        "participant_type": message.participant_type.value,
+        "participant_id": message.participant_id,
+    }
+    if settings.log_message_content:
+        extra["content"] = message.content
+    message_logger.info(
+        "%s %s sent a message.",
+        message.participant_type.value,
+        message.participant_id,
+        extra=extra,
+    )
+
 
-logging.basicConfig(
- format="{asctime} - {levelname} - {message}",
- style="{",
- datefmt="%Y-%m-%d %H:%M",
- level=logging.DEBUG,
-)
\ No newline at end of file
+configure_logging(
+    settings.log_level, settings.log_format == "json", lean_records=settings.log_lean_records
+)
+atexit.register(stop_logging)
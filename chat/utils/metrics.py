@@ -0,0 +1,335 @@
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Deque, Dict, List, Sequence, Tuple
+import math
+import threading
+import time
+
+from chat.config import settings
+
+# Seconds; from 10 microseconds for strategies and locks to 10 seconds for
+# slow requests.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            (self.name + "_total", _format_labels(self.labelnames, labels), value)
+            for labels, value in items
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+class _HistogramSeries:
+    """
+    The buckets, sum and count of one combination of label values.
+
+    ``observe`` only appends to a deque, which is thread-safe without a lock;
+    the pending values are counted into the buckets in batches, once enough
+    have piled up or when the series is read.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_pending", "_lock")
+
+    BATCH = 256
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One count per bucket plus one for +Inf.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._pending: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        self._pending.append(value)
+        if len(self._pending) >= self.BATCH:
+            self._drain()
+
+    def _drain(self) -> None:
+        with self._lock:
+            pending, buckets, counts = self._pending, self.buckets, self.counts
+            total = 0.0
+            drained = 0
+            # popleft is atomic, so values appended meanwhile wait for the next drain.
+            for _ in range(len(pending)):
+                value = pending.popleft()
+                counts[bisect_left(buckets, value)] += 1
+                total += value
+                drained += 1
+            self.sum += total
+            self.count += drained
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        self._drain()
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self.counts = [0] * len(self.counts)
+            self.sum = 0.0
+            self.count = 0
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets, with their sum and count.
+
+    Each observation increments one bucket found by bisection; the cumulative
+    counts Prometheus expects are only built when rendering. Hot paths resolve
+    their series once with ``labels`` and observe into it directly.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def labels(self, *values: str) -> _HistogramSeries:
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _HistogramSeries(self.buckets))
+        return series
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.labels(*labels).observe(value)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series.snapshot()[2] if series is not None else 0
+
+    def total(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series.snapshot()[1] if series is not None else 0.0
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        names = self.labelnames + ("le",)
+        for labels, series in list(self._series.items()):
+            counts, total, count = series.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                samples.append(
+                    (self.name + "_bucket", _format_labels(names, labels + (le,)), cumulative)
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            samples.append((self.name + "_sum", label_text, total))
+            samples.append((self.name + "_count", label_text, count))
+        return samples
+
+    def reset(self) -> None:
+        # Series handed out by ``labels`` stay in use; zero them in place.
+        for series in list(self._series.values()):
+            series.reset()
+
+
+class Gauge:
+    """A value read from ``collect`` when the metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self.name, _format_labels(self.labelnames, labels), value)
+            for labels, value in self.collect().items()
+        ]
+
+    def reset(self) -> None:
+        pass
+
+
+class InstrumentedLock:
+    """
+    A lock that records how long acquiring it waited and how long it was held.
+
+    It replaces a ``threading.Lock`` or ``RLock`` in ``with`` statements; for
+    a reentrant lock only the outermost acquisition is timed. Every
+    ``InstrumentedLock`` of the same ``name`` reports into one series.
+    """
+
+    __slots__ = ("_lock", "_wait", "_hold", "_acquired", "_depth")
+
+    def __init__(self, name: str, lock):
+        self._lock = lock
+        self._wait = LOCK_WAIT_SECONDS.labels(name)
+        self._hold = LOCK_HOLD_SECONDS.labels(name)
+        self._acquired = 0.0
+        # Only changed by the thread holding the lock.
+        self._depth = 0
+
+    def __enter__(self):
+        if self._lock.acquire(False):
+            # Uncontended: no wait to time.
+            now = time.perf_counter()
+            waited = 0.0
+        else:
+            start = time.perf_counter()
+            self._lock.acquire()
+            now = time.perf_counter()
+            waited = now - start
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired = now
+            self._wait.observe(waited)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth:
+            self._lock.release()
+            return
+        held = time.perf_counter() - self._acquired
+        self._lock.release()
+        self._hold.observe(held)
+
+
+class Metrics:
+    """
+    The application's metrics, rendered in the Prometheus text format.
+
+    Instrumented code checks ``Metrics.enabled`` before recording anything, so
+    with ``CHAT_METRICS=0`` the hot paths only pay for that check. Repository
+    backends and strategy pipelines read the flag once, when they are created,
+    and otherwise use plain locks and untimed strategies.
+    """
+
+    enabled = settings.metrics_enabled
+    _metrics: Dict[str, object] = {}
+
+    @classmethod
+    def register(cls, metric):
+        cls._metrics[metric.name] = metric
+        return metric
+
+    @classmethod
+    def counter(cls, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return cls.register(Counter(name, help, labelnames))
+
+    @classmethod
+    def histogram(
+        cls,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return cls.register(Histogram(name, help, labelnames, buckets))
+
+    @classmethod
+    def gauge(
+        cls,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+    ) -> Gauge:
+        return cls.register(Gauge(name, help, labelnames, collect))
+
+    @classmethod
+    def lock(cls, name: str, lock=None):
+        """Return ``lock`` (a new ``threading.Lock`` by default), instrumented if enabled."""
+        if lock is None:
+            lock = threading.Lock()
+        return InstrumentedLock(name, lock) if cls.enabled else lock
+
+    @classmethod
+    def render(cls) -> str:
+        lines = []
+        for metric in list(cls._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def reset(cls) -> None:
+        for metric in list(cls._metrics.values()):
+            metric.reset()
+
+
+LOCK_WAIT_SECONDS = Metrics.histogram(
+    "chat_repository_lock_wait_seconds",
+    "Time spent waiting to acquire a repository lock.",
+    ("lock",),
+)
+LOCK_HOLD_SECONDS = Metrics.histogram(
+    "chat_repository_lock_hold_seconds",
+    "Time a repository lock was held.",
+    ("lock",),
+)
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import threading
+import time
+
+_Key = Tuple[bytes, str]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Lookups that waited for an identical translation already in flight
+    # instead of calling the backend themselves.
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+
+class TranslationCache:
+    """
+    A bounded, thread-safe cache of translations.
+
+    Entries are keyed by a hash of the content and the target language, evicted
+    least recently used first once ``max_entries`` is reached, and expire
+    ``ttl`` seconds after they were stored (``None`` keeps them until evicted).
+    Concurrent lookups of the same translation are coalesced: the first one
+    calls the backend and the others wait for its result.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: Optional[float] = 3600.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[_Key, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[_Key, Future] = {}
+
+    @staticmethod
+    def key(content: str, target_language: str) -> _Key:
+        digest = hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        return digest, target_language
+
+    def get_or_translate(
+        self, content: str, target_language: str, translate: Callable[[str, str], str]
+    ) -> str:
+        key = self.key(content, target_language)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, translation = entry
+                if expires_at >= self._clock():
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return translation
+                del self._entries[key]
+                self.stats.expirations += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+
+        if not leader:
+            return future.result()
+        try:
+            translation = translate(content, target_language)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, translation)
+        future.set_result(translation)
+        return translation
+
+    def _store(self, key: _Key, translation: str) -> None:
+        expires_at = self._clock() + self.ttl if self.ttl is not None else float("inf")
+        self._entries[key] = (expires_at, translation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats = CacheStats()
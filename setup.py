@@ -3,5 +3,5 @@ from setuptools import setup, find_packages
 setup(
     name="chat-app",
     version="1.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
 )
@@ -0,0 +1,116 @@
+from datetime import datetime
+import uuid
+
+import pytest
+
+from chat.api.chat_facade import ChatFacade
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.enums import SessionStatus
+from chat.models.support_agent_data import SupportAgentData
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+
+
+@pytest.fixture
+def scheduler():
+    """Clear the repository and the scheduler before each test."""
+    Repository.clear()
+    AgentScheduler.clear()
+    return AgentScheduler
+
+
+def _agent(agent_id, skills=(), max_sessions=None):
+    Repository.add_agent(SupportAgentData(agent_id, f"Agent {agent_id}"))
+    AgentScheduler.register_agent(agent_id, skills, max_sessions)
+
+
+def _session(topic="General"):
+    session = ChatSessionData(uuid.uuid4(), 1, topic)
+    Repository.add_chat_session(session)
+    return session
+
+
+def test_sessions_go_to_the_least_loaded_agent(scheduler):
+    _agent(1)
+    _agent(2)
+    assigned = [scheduler.submit(_session()) for _ in range(4)]
+    assert sorted(assigned) == [1, 1, 2, 2]
+    assert scheduler.load(1) == scheduler.load(2) == 2
+
+
+def test_full_agents_queue_sessions_fifo(scheduler):
+    _agent(1, max_sessions=1)
+    first, second, third = _session(), _session(), _session()
+    assert scheduler.submit(first) == 1
+    assert scheduler.submit(second) is None
+    assert scheduler.submit(third) is None
+    assert scheduler.queue_length() == 2
+
+    scheduler.release(first.session_id)
+    assert Repository.get_chat_session(second.session_id).support_agent_id == 1
+    assert Repository.get_chat_session(third.session_id).support_agent_id is None
+    assert scheduler.queue_length() == 1
+
+
+def test_skill_matching_and_aging(scheduler, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(AgentScheduler, "clock", lambda: now[0])
+    _agent(1, skills=["Billing"], max_sessions=1)
+    _agent(2, max_sessions=1)
+    billing = _session("billing")
+    assert scheduler.submit(billing) == 1
+    assert scheduler.submit(_session("Technical")) == 2
+
+    older, newer = _session("Technical"), _session("Billing")
+    scheduler.submit(older)
+    scheduler.submit(newer)
+    # The freed billing agent prefers the waiting billing session ...
+    scheduler.release(billing.session_id)
+    assert Repository.get_chat_session(newer.session_id).support_agent_id == 1
+    assert Repository.get_chat_session(older.session_id).support_agent_id is None
+
+    # ... unless an older session has waited past the aging limit.
+    now[0] = scheduler.aging_seconds + 1
+    late = _session("Billing")
+    scheduler.submit(late)
+    scheduler.release(newer.session_id)
+    assert Repository.get_chat_session(older.session_id).support_agent_id == 1
+    assert Repository.get_chat_session(late.session_id).support_agent_id is None
+
+
+@pytest.mark.asyncio
+async def test_facade_assigns_new_sessions_and_requeues_on_end(scheduler):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    facade.create_agent(101, "Jane Smith", "jane@example.com", max_sessions=1)
+
+    first = await facade.initiate_chat(1, "Billing")
+    second = await facade.initiate_chat(1, "Billing")
+    assert Repository.get_chat_session(first).support_agent_id == 101
+    assert Repository.get_chat_session(second).support_agent_id is None
+
+    await facade.end_chat(first)
+    assert Repository.get_chat_session(second).support_agent_id == 101
+
+
+def test_rebuild_restores_loads_and_queue(scheduler, monkeypatch):
+    Repository.add_agent(SupportAgentData(101, "Agent 101"))
+    assigned = _session()
+    Repository.assign_agent(assigned.session_id, 101)
+    waiting = _session()
+    Repository.set_session_status(waiting.session_id, SessionStatus.WAITING)
+    monkeypatch.setattr(AgentScheduler, "max_sessions", 1)
+    writes = []
+    monkeypatch.setattr(Repository, "set_session_status", lambda *args: writes.append(args))
+
+    # Constructing a facade no longer rebuilds; the app does it at startup.
+    ChatFacade()
+    assert scheduler.agent_count() == 0
+    scheduler.rebuild()
+
+    assert scheduler.agent_count() == 1
+    # The waiting session is queued again without being written again.
+    assert writes == []
+    Repository.end_chat_session(assigned.session_id, datetime.now())
+    scheduler.release(assigned.session_id)
+    assert Repository.get_chat_session(waiting.session_id).support_agent_id == 101
@@ -0,0 +1,37 @@
+import random
+
+from chat.utils.aho_corasick import AhoCorasick
+
+
+def _brute_force_mask(text, patterns):
+    covered = [False] * len(text)
+    for pattern in patterns:
+        start = text.find(pattern)
+        while start != -1:
+            for i in range(start, start + len(pattern)):
+                covered[i] = True
+            start = text.find(pattern, start + 1)
+    return "".join("*" if c else ch for ch, c in zip(text, covered))
+
+
+def test_overlapping_and_nested_matches():
+    matcher = AhoCorasick(["he", "she", "his", "hers"])
+    assert list(matcher.finditer("ushers")) == [(1, 4), (2, 6)]
+    assert matcher.mask("ushers") == ("u*****", True)
+    assert matcher.mask("nothing to see") == ("nothing to see", False)
+
+
+def test_case_insensitive_search():
+    matcher = AhoCorasick(["buy now"], case_sensitive=False)
+    assert matcher.search("Please BUY NOW!")
+    assert not matcher.search("Please buy later")
+
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(200):
+        patterns = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(5)]
+        text = "".join(rng.choice("abcd") for _ in range(30))
+        masked, found = AhoCorasick(patterns).mask(text)
+        assert masked == _brute_force_mask(text, patterns)
+        assert found == (masked != text)
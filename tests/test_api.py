@@ -0,0 +1,271 @@
+from datetime import datetime, timezone
+import asyncio
+import gzip
+import json
+import time
+import uuid
+
+import httpx
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from chat.api.api import app
+from chat.api.serialization import MessageJsonCache
+from chat.models.enums import ExecutionMode, TicketStatus
+from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.search_index import SearchIndex
+from chat.strategies.execution_policy import ExecutionPolicy
+from chat.strategies.message_processing_strategy import MessageProcessingStrategy
+
+
+@pytest.fixture
+def client():
+    """Clear the repository and provide a test client for the API."""
+    Repository.clear()
+    SearchIndex.clear()
+    AgentScheduler.clear()
+    return TestClient(app)
+
+
+@pytest.fixture
+def session_id(client):
+    client.post("/customers/", json={"customer_id": 1, "name": "John", "email": "john@example.com"})
+    response = client.post("/chats/new", json={"customer_id": 1, "topic": "Billing"})
+    return response.json()["session_id"]
+
+
+def test_chat_history_pagination(client, session_id):
+    for i in range(3):
+        client.post(
+            f"/chats/{session_id}/messages/customer/",
+            json={"customer_id": 1, "content": f"Message {i}"},
+        )
+
+    body = client.get(f"/chats/{session_id}/history/", params={"limit": 2}).json()
+    assert [m["content"] for m in body["messages"]] == ["Message 0", "Message 1"]
+
+    body = client.get(
+        f"/chats/{session_id}/history/", params={"after": body["next_cursor"]}
+    ).json()
+    assert [m["content"] for m in body["messages"]] == ["Message 2"]
+
+    poll = client.get(
+        f"/chats/{session_id}/history/", params={"after": body["next_cursor"]}
+    ).json()
+    assert poll["messages"] == []
+    assert poll["next_cursor"] == body["next_cursor"]
+
+    response = client.get(f"/chats/{session_id}/history/", params={"after": "bogus"})
+    assert response.status_code == 400
+
+
+def test_websocket_receives_new_messages(client, session_id):
+    with client.websocket_connect(f"/ws/chats/{session_id}") as websocket:
+        client.post(
+            f"/chats/{session_id}/messages/customer/",
+            json={"customer_id": 1, "content": "Hello over WebSocket"},
+        )
+        message = websocket.receive_json()
+        assert message["content"] == "Hello over WebSocket"
+        assert message["session_id"] == session_id
+
+
+def test_websocket_rejects_unknown_session(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/ws/chats/{uuid.uuid4()}") as websocket:
+            websocket.receive_json()
+
+
+def test_send_messages_batch(client, session_id):
+    response = client.post(
+        "/chats/messages:batch",
+        json={
+            "messages": [
+                {
+                    "session_id": session_id,
+                    "participant_id": "Bridge",
+                    "participant_type": "Bot",
+                    "content": "Imported",
+                    "timestamp": "2024-01-01T12:00:00",
+                },
+                {"session_id": session_id, "participant_id": 1, "content": "Live"},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert len(response.json()["message_ids"]) == 2
+
+    messages = client.get(f"/chats/{session_id}/history/").json()["messages"]
+    assert [m["content"] for m in messages] == ["Imported", "Live"]
+    assert messages[0]["timestamp"] == "2024-01-01T12:00:00"
+
+    # Older than the last message of the session.
+    response = client.post(
+        "/chats/messages:batch",
+        json={"messages": [{"session_id": session_id, "timestamp": "2024-01-01T13:00:00"}]},
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/chats/messages:batch",
+        json={"messages": [{"session_id": str(uuid.uuid4()), "content": "Lost"}]},
+    )
+    assert response.status_code == 400
+
+
+def test_send_messages_batch_accepts_aware_timestamps(client, session_id):
+    response = client.post(
+        "/chats/messages:batch",
+        json={
+            "messages": [
+                {
+                    "session_id": session_id,
+                    "participant_id": 1,
+                    "timestamp": "2024-01-01T10:00:00Z",
+                }
+            ]
+        },
+    )
+    assert response.status_code == 200
+    [message] = client.get(f"/chats/{session_id}/history/").json()["messages"]
+    local = datetime(2024, 1, 1, 10, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert message["timestamp"] == local.isoformat()
+
+
+def test_search(client, session_id):
+    for content in ("My order A-1234 is late", "Thanks for the update"):
+        client.post(
+            f"/chats/{session_id}/messages/customer/",
+            json={"customer_id": 1, "content": content},
+        )
+    body = client.get("/search", params={"q": "a-1234", "customer_id": 1}).json()
+    assert body["total"] == 1
+    assert body["hits"][0]["message"]["content"] == "My order A-1234 is late"
+    assert client.get("/search", params={"q": "a-1234", "customer_id": 2}).json()["total"] == 0
+    assert client.get("/search", params={"q": ""}).status_code == 422
+
+
+def test_list_and_count_tickets(client, session_id):
+    session = uuid.UUID(session_id)
+    for issue in ("Refund", "Login", "Invoice"):
+        Repository.add_support_ticket(SupportTicketData(456, session, issue))
+    ticket = SupportTicketData(457, session, "Password")
+    Repository.add_support_ticket(ticket)
+    Repository.update_ticket_status(ticket.ticket_id, TicketStatus.RESOLVED)
+
+    body = client.get("/tickets", params={"status": "Open", "agent_id": 456, "limit": 2}).json()
+    assert [t["issue"] for t in body["tickets"]] == ["Refund", "Login"]
+    assert body["total"] == 3
+    body = client.get(
+        "/tickets", params={"status": "Open", "agent_id": 456, "offset": body["next_offset"]}
+    ).json()
+    assert [t["issue"] for t in body["tickets"]] == ["Invoice"]
+    assert body["next_offset"] is None
+
+    assert client.get("/tickets/count", params={"status": "Resolved"}).json() == {"count": 1}
+    assert client.get("/tickets/count", params={"session_id": session_id}).json() == {"count": 4}
+    assert client.get("/tickets", params={"status": "Lost"}).status_code == 422
+
+
+def test_end_chat(client, session_id):
+    client.post(
+        f"/chats/{session_id}/messages/customer/",
+        json={"customer_id": 1, "content": "Thanks, bye"},
+    )
+    assert client.post(f"/chats/{session_id}/end").status_code == 200
+
+    response = client.post(
+        f"/chats/{session_id}/messages/customer/",
+        json={"customer_id": 1, "content": "One more thing"},
+    )
+    assert response.status_code == 400
+    messages = client.get(f"/chats/{session_id}/history/").json()["messages"]
+    assert [m["content"] for m in messages] == ["Thanks, bye"]
+    assert client.post(f"/chats/{session_id}/end").status_code == 400
+
+
+def test_history_json_is_cached_and_unchanged(client, session_id):
+    for i in range(3):
+        client.post(
+            f"/chats/{session_id}/messages/customer/",
+            json={"customer_id": 1, "content": f"Message {i}"},
+        )
+    messages = Repository.get_session_messages(uuid.UUID(session_id))
+
+    body = client.get(f"/chats/{session_id}/history/").json()
+    assert body == {
+        "messages": jsonable_encoder(messages),
+        "next_cursor": body["next_cursor"],
+        "prev_cursor": None,
+    }
+    assert MessageJsonCache.size() == 3
+    assert client.get(f"/chats/{session_id}/history/").json() == body
+
+    Repository.clear()
+    MessageJsonCache.encode_many(messages[:1])
+    assert MessageJsonCache.size() == 1
+
+
+def test_list_sessions_names_strategies(client, session_id):
+    Repository.get_chat_session(uuid.UUID(session_id)).strategies.append(_BlockingStrategy())
+    (session,) = client.get("/sessions/").json()["sessions"]
+    assert session["session_id"] == session_id
+    assert session["strategies"][-1] == "_BlockingStrategy"
+    assert session["status"] == "Waiting"
+
+
+def test_export_streams_ndjson(client, session_id):
+    for i in range(3):
+        client.post(
+            f"/chats/{session_id}/messages/customer/",
+            json={"customer_id": 1, "content": f"Message {i}"},
+        )
+
+    response = client.get("/export")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    (line,) = [json.loads(line) for line in response.text.splitlines()]
+    assert line["session"]["session_id"] == session_id
+    assert [m["content"] for m in line["messages"]] == ["Message 0", "Message 1", "Message 2"]
+
+    with client.stream("GET", "/export", params={"gzip": True}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(b"".join(response.iter_raw())).decode() == (
+            json.dumps(line, separators=(",", ":")) + "\n"
+        )
+
+    assert client.get("/export", params={"agent_id": 999}).text == ""
+    response = client.get("/export", params={"since": "2024-01-02T00:00:00", "until": "2024-01-01"})
+    assert response.status_code == 400
+
+
+class _BlockingStrategy(MessageProcessingStrategy):
+    execution_policy = ExecutionPolicy(ExecutionMode.THREAD)
+
+    def process(self, message):
+        time.sleep(0.5)
+        return message
+
+
+@pytest.mark.asyncio
+async def test_offloaded_strategy_does_not_block_other_requests(client, session_id):
+    Repository.get_chat_session(uuid.UUID(session_id)).strategies.append(_BlockingStrategy())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+        send = asyncio.create_task(
+            async_client.post(
+                f"/chats/{session_id}/messages/customer/",
+                json={"customer_id": 1, "content": "Hello"},
+            )
+        )
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        response = await async_client.get("/customers/")
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200
+        assert not send.done()
+        assert (await send).status_code == 200
+    assert elapsed < 0.25
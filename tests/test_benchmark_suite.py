@@ -0,0 +1,38 @@
+from benchmarks.suite import best_of, compare, metrics
+
+
+def _run(**benchmarks):
+    return {"meta": {"quick": True}, "benchmarks": benchmarks}
+
+
+def test_metrics_keep_timings_and_label_list_entries():
+    results = {
+        "bench_history": {
+            "session_size": 50,
+            "results": [
+                {"global_messages": 1000, "indexed_us": 2.0},
+                {"global_messages": 10000, "indexed_us": 3.0},
+            ],
+        },
+        "bench_service": {"messages": 100, "filters_msgs_per_s": 5000},
+    }
+    assert metrics(results) == {
+        "bench_history.results[global_messages=1000].indexed_us": 2.0,
+        "bench_history.results[global_messages=10000].indexed_us": 3.0,
+        "bench_service.filters_msgs_per_s": 5000.0,
+    }
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = _run(bench={"read_us": 10.0, "write_us": 10.0, "msgs_per_s": 1000.0})
+    current = _run(bench={"read_us": 12.0, "write_us": 20.0, "msgs_per_s": 500.0})
+    regressed = {c.metric: c.regressed for c in compare(baseline, current, tolerance=0.25)}
+    assert regressed == {"bench.read_us": False, "bench.write_us": True, "bench.msgs_per_s": True}
+
+
+def test_best_of_keeps_the_best_value_of_each_metric():
+    runs = [
+        {"count": 3, "read_us": 5.0, "msgs_per_s": 10.0},
+        {"count": 3, "read_us": 4.0, "msgs_per_s": 8.0},
+    ]
+    assert best_of(runs) == {"count": 3, "read_us": 4.0, "msgs_per_s": 10.0}
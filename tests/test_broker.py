@@ -0,0 +1,103 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+
+import pytest
+
+from chat.broker.resp_broker import (
+    DELIVERY_LAG_SECONDS,
+    RespBroker,
+    decode_frame,
+    encode_frame,
+)
+from chat.models.message_data import MessageData
+from chat.repository.resp import RespConnection, parse_url
+from chat.repository.resp_server import RespServer
+from chat.services.message_hub import MessageHub
+
+
+def _publish(url: str, channel: str, session_id: uuid.UUID, count: int) -> None:
+    broker = RespBroker(url, channel)
+    for i in range(count):
+        broker.publish([MessageData(session_id=session_id, content=str(i))])
+    broker.close()
+
+
+@pytest.fixture
+def resp_server():
+    server = RespServer().start()
+    MessageHub.clear()
+    yield server
+    MessageHub.clear()
+    server.stop()
+
+
+@pytest.mark.asyncio
+async def test_bursts_are_coalesced_into_frames(resp_server):
+    channel = f"test:{uuid.uuid4().hex}"
+    listener = RespConnection(*parse_url(resp_server.url))
+    listener.execute("SUBSCRIBE", channel)
+    broker = RespBroker(resp_server.url, channel, batch_size=32)
+    session_id = uuid.uuid4()
+    subscription = MessageHub.subscribe(session_id)
+    try:
+        broker.publish([MessageData(session_id=session_id, content=str(i)) for i in range(100)])
+        # Local subscribers get the messages right away.
+        assert [(await subscription.get()).content for _ in range(100)] == [
+            str(i) for i in range(100)
+        ]
+
+        sizes = []
+        while sum(sizes) < 100:
+            _, _, frame = await asyncio.to_thread(listener.read)
+            sizes.append(len(decode_frame(frame)[1]))
+        assert sizes == [32, 32, 32, 4]
+    finally:
+        broker.close()
+        listener.close()
+
+
+@pytest.mark.asyncio
+async def test_messages_reach_subscribers_in_other_processes(resp_server):
+    channel = f"test:{uuid.uuid4().hex}"
+    broker = RespBroker(resp_server.url, channel)
+    session_id = uuid.uuid4()
+    subscription = MessageHub.subscribe(session_id)
+    lag_count = DELIVERY_LAG_SECONDS.count()
+    try:
+        process = multiprocessing.get_context("spawn").Process(
+            target=_publish, args=(resp_server.url, channel, session_id, 20)
+        )
+        process.start()
+        received = [
+            (await asyncio.wait_for(subscription.get(), timeout=30)).content for _ in range(20)
+        ]
+        await asyncio.to_thread(process.join)
+    finally:
+        broker.close()
+
+    assert received == [str(i) for i in range(20)]
+    assert subscription._queue.empty()
+    assert DELIVERY_LAG_SECONDS.count() == lag_count + 20
+
+
+@pytest.mark.asyncio
+async def test_malformed_frames_do_not_stop_the_receiver(resp_server):
+    channel = f"test:{uuid.uuid4().hex}"
+    broker = RespBroker(resp_server.url, channel)
+    publisher = RespConnection(*parse_url(resp_server.url))
+    session_id = uuid.uuid4()
+    subscription = MessageHub.subscribe(session_id)
+    try:
+        frame = encode_frame(
+            uuid.uuid4().bytes, [(time.time(), MessageData(session_id=session_id, content="ok"))]
+        )
+        for payload in (b"garbage", frame[:30], frame):
+            publisher.execute("PUBLISH", channel, payload)
+        message = await asyncio.wait_for(subscription.get(), timeout=10)
+        assert message.content == "ok"
+        assert broker._receiver.is_alive()
+    finally:
+        publisher.close()
+        broker.close()
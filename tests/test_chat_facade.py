@@ -1,18 +1,26 @@
+from datetime import datetime
+import json
+import time
+import uuid
+
 import pytest
 
-from chat.models.enums import TicketStatus
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.customer_data import CustomerData
+from chat.models.enums import ParticipantType, TicketStatus
+from chat.models.message_data import MessageData
 from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
 from chat.api.chat_facade import ChatFacade
+from chat.participants.participant_cache import ParticipantCache
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
 
 
 @pytest.fixture
 def setup_repository():
-    """Clear the repository before each test."""
-    Repository.customers.clear()
-    Repository.agents.clear()
-    Repository.chat_sessions.clear()
-    Repository.messages.clear()
-    Repository.support_tickets.clear()
+    """Clear the repository and the agent scheduler before each test."""
+    Repository.clear()
+    AgentScheduler.clear()
 
 
 @pytest.mark.asyncio
@@ -71,3 +79,221 @@ async def test_create_and_resolve_ticket(setup_repository):
 
     await facade.resolve_support_ticket(101, ticket_id)
     assert Repository.support_tickets[ticket_id].status == TicketStatus.RESOLVED
+
+
+@pytest.mark.asyncio
+async def test_get_chat_history(setup_repository):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    facade.create_customer(2, "Jane Doe", "jane@example.com")
+    session_id = await facade.initiate_chat(1, "Support Request")
+    other_session_id = await facade.initiate_chat(2, "Billing")
+
+    await facade.customer_send_message(session_id, 1, "First")
+    await facade.customer_send_message(other_session_id, 2, "Other")
+    await facade.customer_send_message(session_id, 1, "Second")
+
+    history = facade.get_chat_history(session_id)
+    assert [message.content for message in history] == ["First", "Second"]
+
+
+@pytest.mark.asyncio
+async def test_get_chat_history_pagination(setup_repository):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    session_id = await facade.initiate_chat(1, "Support Request")
+    for i in range(5):
+        await facade.customer_send_message(session_id, 1, f"Message {i}")
+
+    page = facade.get_chat_history_page(session_id, limit=2)
+    assert [m.content for m in page.messages] == ["Message 0", "Message 1"]
+    assert page.prev_cursor is None
+
+    page = facade.get_chat_history_page(session_id, after=page.next_cursor, limit=2)
+    assert [m.content for m in page.messages] == ["Message 2", "Message 3"]
+
+    older = facade.get_chat_history_page(session_id, before=page.prev_cursor, limit=1)
+    assert [m.content for m in older.messages] == ["Message 1"]
+
+    page = facade.get_chat_history_page(session_id, after=page.next_cursor)
+    assert [m.content for m in page.messages] == ["Message 4"]
+
+    # Polling with the latest cursor returns nothing until a new message arrives.
+    empty = facade.get_chat_history_page(session_id, after=page.next_cursor)
+    assert empty.messages == []
+    assert empty.next_cursor == page.next_cursor
+
+    await facade.customer_send_message(session_id, 1, "Message 5")
+    page = facade.get_chat_history_page(session_id, after=empty.next_cursor)
+    assert [m.content for m in page.messages] == ["Message 5"]
+
+
+@pytest.mark.asyncio
+async def test_get_chat_history_since(setup_repository):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    session_id = await facade.initiate_chat(1, "Support Request")
+    await facade.customer_send_message(session_id, 1, "Old")
+    since = facade.get_chat_history(session_id)[-1].timestamp
+    await facade.customer_send_message(session_id, 1, "New")
+
+    history = facade.get_chat_history(session_id, since=since)
+    assert [m.content for m in history] == ["New"]
+
+    with pytest.raises(ValueError):
+        facade.get_chat_history(session_id, after="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_send_messages_batch(setup_repository):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    facade.create_agent(101, "Jane Smith", "jane@example.com")
+    session_id = await facade.initiate_chat(1, "Support Request", [SpamFilterStrategy()])
+    other_session_id = await facade.initiate_chat(1, "Billing")
+
+    message_ids = await facade.send_messages(
+        [
+            MessageData(session_id=session_id, participant_id=1, participant_type=ParticipantType.CUSTOMER, content="Hello"),
+            MessageData(session_id=other_session_id, participant_id=1, participant_type=ParticipantType.CUSTOMER, content="Buy now"),
+            MessageData(session_id=session_id, participant_id=101, participant_type=ParticipantType.AGENT, content="Click here"),
+        ]
+    )
+
+    assert len(message_ids) == 3
+    assert [m.content for m in facade.get_chat_history(session_id)] == [
+        "Hello",
+        "[Message removed due to spam detection]",
+    ]
+    assert [m.content for m in facade.get_chat_history(other_session_id)] == ["Buy now"]
+
+
+@pytest.mark.asyncio
+async def test_send_messages_batch_is_all_or_nothing(setup_repository):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    session_id = await facade.initiate_chat(1, "Support Request")
+
+    with pytest.raises(ValueError):
+        await facade.send_messages(
+            [
+                MessageData(session_id=session_id, participant_id=1, participant_type=ParticipantType.CUSTOMER),
+                MessageData(session_id=uuid.uuid4(), participant_id=1, participant_type=ParticipantType.CUSTOMER),
+            ]
+        )
+    with pytest.raises(ValueError):
+        await facade.send_messages(
+            [MessageData(session_id=session_id, participant_id=2, participant_type=ParticipantType.CUSTOMER)]
+        )
+    assert len(Repository.messages) == 0
+
+
+@pytest.mark.asyncio
+async def test_participant_handles_are_reused_and_invalidated(setup_repository):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    session_id = await facade.initiate_chat(1, "Support Request")
+    handle = ParticipantCache.get(ParticipantType.CUSTOMER, 1)
+    await facade.customer_send_message(session_id, 1, "Hello")
+    assert ParticipantCache.get(ParticipantType.CUSTOMER, 1) is handle
+
+    facade.create_customer(1, "John Smith", "john@example.com")
+    assert ParticipantCache.get(ParticipantType.CUSTOMER, 1).name == "John Smith"
+
+    Repository.clear()
+    with pytest.raises(ValueError, match="Customer does not exist."):
+        await facade.customer_send_message(session_id, 1, "Hello")
+
+
+@pytest.mark.asyncio
+async def test_participant_cache_is_bounded(setup_repository, monkeypatch):
+    monkeypatch.setattr(ParticipantCache, "max_entries", 2)
+    facade = ChatFacade()
+    for agent_id in (101, 102, 103):
+        facade.create_agent(agent_id, f"Agent {agent_id}", f"{agent_id}@example.com")
+    first = ParticipantCache.get(ParticipantType.AGENT, 101)
+    ParticipantCache.get(ParticipantType.AGENT, 102)
+    # Recently used handles are kept over older ones.
+    assert ParticipantCache.get(ParticipantType.AGENT, 101) is first
+    ParticipantCache.get(ParticipantType.AGENT, 103)
+    assert ParticipantCache.size() == 2
+    assert ParticipantCache.get(ParticipantType.AGENT, 101) is first
+
+
+def test_participant_handles_expire(setup_repository, monkeypatch):
+    monkeypatch.setattr(ParticipantCache, "ttl", 0.05)
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    handle = ParticipantCache.get(ParticipantType.CUSTOMER, 1)
+    # As if another worker re-created the customer.
+    Repository.add_customer(CustomerData(1, "John Smith", "john@example.com"))
+    assert ParticipantCache.get(ParticipantType.CUSTOMER, 1) is handle
+    time.sleep(0.1)
+    assert ParticipantCache.get(ParticipantType.CUSTOMER, 1).name == "John Smith"
+
+
+def test_export_sessions(setup_repository):
+    first = ChatSessionData(uuid.uuid4(), 1, "Billing", support_agent_id=101)
+    second = ChatSessionData(uuid.uuid4(), 2, "Login", support_agent_id=102)
+    for session in (first, second):
+        Repository.add_chat_session(session)
+    Repository.add_messages(
+        MessageData(
+            session_id=first.session_id,
+            content=f"Hour {hour}",
+            timestamp=datetime(2024, 1, 1, hour),
+        )
+        for hour in range(9, 17)
+    )
+    Repository.add_message(
+        MessageData(
+            session_id=second.session_id, content="Hello", timestamp=datetime(2024, 1, 1, 9)
+        )
+    )
+    facade = ChatFacade()
+
+    def export(**filters):
+        chunks = list(facade.export_sessions(chunk_size=100, page_size=3, **filters))
+        assert all(chunk for chunk in chunks)
+        return [json.loads(line) for line in b"".join(chunks).splitlines()]
+
+    lines = export()
+    assert [line["session"]["session_id"] for line in lines] == [
+        str(first.session_id),
+        str(second.session_id),
+    ]
+    assert [m["content"] for m in lines[0]["messages"]] == [f"Hour {hour}" for hour in range(9, 17)]
+    assert lines[0]["messages"][0]["timestamp"] == "2024-01-01T09:00:00"
+
+    lines = export(since=datetime(2024, 1, 1, 11), until=datetime(2024, 1, 1, 14))
+    assert len(lines) == 1
+    assert [m["content"] for m in lines[0]["messages"]] == ["Hour 12", "Hour 13", "Hour 14"]
+
+    lines = export(agent_id=102)
+    assert [line["session"]["customer_id"] for line in lines] == [2]
+    assert export(agent_id=103) == []
+
+    with pytest.raises(ValueError):
+        facade.export_sessions(since=datetime(2024, 1, 2), until=datetime(2024, 1, 1))
+
+
+def test_export_filters_unsorted_timestamps(setup_repository):
+    session = ChatSessionData(uuid.uuid4(), 1, "Billing")
+    Repository.add_chat_session(session)
+    Repository.add_messages(
+        [
+            MessageData(
+                session_id=session.session_id, content="live", timestamp=datetime(2026, 1, 1)
+            ),
+            MessageData(
+                session_id=session.session_id,
+                content="imported-2024",
+                timestamp=datetime(2024, 6, 1),
+            ),
+        ]
+    )
+    chunks = ChatFacade().export_sessions(
+        since=datetime(2024, 1, 1), until=datetime(2024, 12, 31), page_size=1
+    )
+    (line,) = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert [m["content"] for m in line["messages"]] == ["imported-2024"]
@@ -1,23 +1,26 @@
+from datetime import datetime, timedelta
+import asyncio
 import pytest
 import uuid
 
+from chat.api.chat_facade import ChatFacade
 from chat.models.chat_session_data import ChatSessionData
 from chat.models.enums import MessageType, ParticipantType, TicketStatus
+from chat.models.message_data import MessageData
 from chat.models.support_agent_data import SupportAgentData
 from chat.models.support_ticket_data import SupportTicketData
 from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
 from chat.services.chat_service import ChatService
+from chat.strategies.message_processing_strategy import MessageProcessingStrategy
 
 
 
 @pytest.fixture
 def setup_repository():
-    """Clear the repository before each test."""
-    Repository.customers.clear()
-    Repository.agents.clear()
-    Repository.chat_sessions.clear()
-    Repository.messages.clear()
-    Repository.support_tickets.clear()
+    """Clear the repository and the agent scheduler before each test."""
+    Repository.clear()
+    AgentScheduler.clear()
 
 
 @pytest.mark.asyncio
@@ -93,4 +96,68 @@ async def test_resolve_ticket(setup_repository):
     await ChatService.resolve_ticket(ticket_id)
 
     resolved_ticket = Repository.support_tickets[ticket_id]
-    assert resolved_ticket.status == TicketStatus.RESOLVED
\ No newline at end of file
+    assert resolved_ticket.status == TicketStatus.RESOLVED
+
+
+@pytest.mark.asyncio
+async def test_send_messages_keeps_sessions_in_timestamp_order(setup_repository):
+    session_id = uuid.uuid4()
+    Repository.add_chat_session(ChatSessionData(session_id, 1, "Support"))
+    await ChatService.send_messages(
+        [
+            MessageData(session_id=session_id, content="imported", timestamp=datetime(2024, 1, 1)),
+            MessageData(session_id=session_id, content="later", timestamp=datetime(2024, 6, 1)),
+        ]
+    )
+    await ChatService.send_message(session_id, 1, ParticipantType.CUSTOMER, "live1")
+
+    for timestamp in (datetime(2024, 3, 1), datetime.now() + timedelta(days=1)):
+        with pytest.raises(ValueError):
+            await ChatService.send_messages(
+                [MessageData(session_id=session_id, content="backdated", timestamp=timestamp)]
+            )
+    with pytest.raises(ValueError):
+        await ChatService.send_messages(
+            [
+                MessageData(session_id=session_id, content="live2"),
+                MessageData(session_id=session_id, content="old", timestamp=datetime(2025, 1, 1)),
+            ]
+        )
+    await ChatService.send_message(session_id, 1, ParticipantType.CUSTOMER, "live2")
+
+    position = Repository.session_position_after(session_id, datetime(2025, 1, 1))
+    assert [m.content for m in Repository.get_session_messages(session_id, position)] == [
+        "live1",
+        "live2",
+    ]
+
+
+class _SlowOnFirstStrategy(MessageProcessingStrategy):
+    async def process(self, message: MessageData) -> MessageData:
+        if message.content == "first":
+            await asyncio.sleep(0.2)
+        return message
+
+
+@pytest.mark.asyncio
+async def test_send_message_stamps_messages_in_store_order(setup_repository):
+    session_id = uuid.uuid4()
+    Repository.add_chat_session(
+        ChatSessionData(session_id, 1, "Support", strategies=[_SlowOnFirstStrategy()])
+    )
+
+    first = asyncio.create_task(
+        ChatService.send_message(session_id, 1, ParticipantType.CUSTOMER, "first")
+    )
+    await asyncio.sleep(0.01)
+    await ChatService.send_message(session_id, 1, ParticipantType.CUSTOMER, "second")
+    await first
+
+    # The slow message is stored last and stamped last.
+    stored = Repository.get_session_messages(session_id)
+    assert [m.content for m in stored] == ["second", "first"]
+    assert stored[0].timestamp <= stored[1].timestamp
+    since = stored[0].timestamp
+    assert [m.content for m in ChatFacade().get_chat_history(session_id, since=since)] == [
+        "first"
+    ]
@@ -3,18 +3,16 @@ import pytest
 
 from chat.models.enums import TicketStatus
 from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
 from chat.api.chat_facade import ChatFacade
 from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
 from chat.strategies.spam_filter_strategy import SpamFilterStrategy
 
 @pytest.fixture
 def setup_repository():
-    """Clear the repository before each test."""
-    Repository.customers.clear()
-    Repository.agents.clear()
-    Repository.chat_sessions.clear()
-    Repository.messages.clear()
-    Repository.support_tickets.clear()
+    """Clear the repository and the agent scheduler before each test."""
+    Repository.clear()
+    AgentScheduler.clear()
 
 
 @pytest.fixture
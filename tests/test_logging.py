@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+
+import pytest
+
+from chat.config import settings
+from chat.models.enums import ParticipantType
+from chat.models.message_data import MessageData
+from chat.utils import logging as chat_logging
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    chat_logging.configure_logging("INFO", json_format=True, stream=stream)
+    yield stream
+    chat_logging.configure_logging(
+        settings.log_level, settings.log_format == "json", lean_records=settings.log_lean_records
+    )
+
+
+def _entries(stream):
+    chat_logging.stop_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def _message():
+    return MessageData(
+        participant_id=7, participant_type=ParticipantType.CUSTOMER, content="my card is 4111"
+    )
+
+
+def test_records_are_written_as_json_with_extra_fields(log_stream):
+    logging.getLogger("chat.test").info("Session %s ended.", "abc", extra={"session_id": "abc"})
+    logging.getLogger("chat.test").debug("Not written at INFO.")
+    [entry] = _entries(log_stream)
+    assert entry["message"] == "Session abc ended."
+    assert entry["level"] == "INFO"
+    assert entry["session_id"] == "abc"
+
+
+def test_message_content_is_left_out_unless_enabled(log_stream, monkeypatch):
+    message = _message()
+    chat_logging.log_message(message)
+    monkeypatch.setattr(settings, "log_message_content", True)
+    chat_logging.log_message(message)
+    without, with_content = _entries(log_stream)
+    assert without["message_id"] == str(message.message_id)
+    assert "content" not in without
+    assert "4111" not in json.dumps(without)
+    assert with_content["content"] == "my card is 4111"
+
+
+def test_message_logs_are_sampled(log_stream, monkeypatch):
+    monkeypatch.setattr(settings, "log_message_sample_rate", 0.0)
+    for _ in range(100):
+        chat_logging.log_message(_message())
+    monkeypatch.setattr(settings, "log_message_sample_rate", 0.5)
+    for _ in range(1000):
+        chat_logging.log_message(_message())
+    assert 350 < len(_entries(log_stream)) < 650
+
+
+def test_lean_records_are_opt_in(log_stream):
+    assert logging.logThreads and logging._srcfile is not None
+    chat_logging.configure_logging("INFO", stream=log_stream, lean_records=True)
+    assert not logging.logThreads and logging._srcfile is None
+    logging.getLogger("chat.test").info("Still %s.", "written")
+    chat_logging.configure_logging("INFO", stream=log_stream)
+    assert logging.logThreads and logging._srcfile is not None
+    assert [entry["message"] for entry in _entries(log_stream)] == ["Still written."]
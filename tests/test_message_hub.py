@@ -0,0 +1,56 @@
+import asyncio
+import uuid
+
+import pytest
+
+from chat.models.message_data import MessageData
+from chat.services.message_hub import MessageHub
+
+
+@pytest.fixture
+def hub():
+    """Reset the hub before each test."""
+    MessageHub.clear()
+    yield MessageHub
+    MessageHub.clear()
+
+
+@pytest.mark.asyncio
+async def test_publish_fans_out_to_session_subscribers(hub):
+    session_id = uuid.uuid4()
+    first = hub.subscribe(session_id)
+    second = hub.subscribe(session_id)
+    other = hub.subscribe(uuid.uuid4())
+
+    message = MessageData(session_id=session_id, content="Hello")
+    assert hub.publish(message) == 2
+
+    assert await first.get() is message
+    assert await second.get() is message
+    assert other._queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped(hub):
+    session_id = uuid.uuid4()
+    slow = hub.subscribe(session_id, max_queue_size=2)
+    fast = hub.subscribe(session_id, max_queue_size=10)
+
+    for i in range(3):
+        hub.publish(MessageData(session_id=session_id, content=str(i)))
+
+    assert slow.dropped
+    assert await slow.get() is None
+    assert hub.dropped_subscribers == 1
+    assert hub.subscriber_count(session_id) == 1
+    assert [(await fast.get()).content for _ in range(3)] == ["0", "1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_publish_from_another_thread(hub):
+    session_id = uuid.uuid4()
+    subscription = hub.subscribe(session_id)
+    message = MessageData(session_id=session_id, content="Hello")
+
+    await asyncio.to_thread(hub.publish, message)
+    assert await asyncio.wait_for(subscription.get(), timeout=1) is message
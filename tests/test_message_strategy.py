@@ -1,10 +1,19 @@
+import asyncio
+import pickle
+import time
 import uuid
 from datetime import datetime
 
-from chat.models.enums import MessageType, ParticipantType
+import pytest
+
+from chat.models.enums import ExecutionMode, MessageType, ParticipantType
 from chat.models.message_data import MessageData
+from chat.strategies.execution_policy import ExecutionPolicy
+from chat.strategies.message_processing_strategy import MessageProcessingStrategy
 from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
 from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+from chat.strategies.strategy_pipeline import StrategyPipeline
+from chat.strategies.strategy_registry import StrategyRegistry
 from chat.strategies.translation_strategy import TranslationStrategy
 
 
@@ -51,3 +60,141 @@ def test_translation_strategy():
     strategy = TranslationStrategy(target_language="Latin")
     processed_message = strategy.process(message)
     assert processed_message.content == "[Translated to Latin]: Quid agis?"
+
+
+def test_profanity_filter_strategy_custom_list():
+    message = MessageData(content="You are a Darn fool, darn it.")
+    strategy = ProfanityFilterStrategy(["darn", "fool"], case_sensitive=False)
+    processed_message = strategy.process(message)
+    assert processed_message.content == "You are a **** ****, **** it."
+
+
+def test_spam_filter_strategy_custom_keywords():
+    strategy = SpamFilterStrategy(["limited offer"])
+    assert strategy.process(MessageData(content="A LIMITED OFFER!")).content == (
+        "[Message removed due to spam detection]"
+    )
+    assert strategy.process(MessageData(content="It is free")).content == "It is free"
+
+
+def test_filter_strategies_survive_pickling():
+    strategy = pickle.loads(pickle.dumps(ProfanityFilterStrategy(["darn"])))
+    assert strategy.process(MessageData(content="darn")).content == "****"
+
+
+class _RecordingStrategy(MessageProcessingStrategy):
+    transforms_content = False
+
+    def __init__(self):
+        self.seen = []
+
+    def process(self, message: MessageData) -> MessageData:
+        self.seen.append(message.content)
+        return message
+
+
+def test_pipeline_stops_after_final_change():
+    recorder = _RecordingStrategy()
+    pipeline = StrategyPipeline(
+        [SpamFilterStrategy(), TranslationStrategy(target_language="Latin"), recorder]
+    )
+    processed_message = pipeline.run(MessageData(content="Click here to buy now!"))
+    assert processed_message.content == "[Message removed due to spam detection]"
+    assert recorder.seen == []
+
+
+def test_pipeline_matches_sequential_processing():
+    recorder = _RecordingStrategy()
+    strategies = [
+        SpamFilterStrategy(),
+        ProfanityFilterStrategy(),
+        recorder,
+        TranslationStrategy(target_language="Latin"),
+    ]
+    processed_message = StrategyPipeline(strategies).run(
+        MessageData(content="This contains badword1.")
+    )
+    assert recorder.seen == ["This contains ********."]
+    assert processed_message.content == "[Translated to Latin]: Quid agis?"
+
+
+class _AsyncUpperStrategy(MessageProcessingStrategy):
+    async def process(self, message: MessageData) -> MessageData:
+        await asyncio.sleep(0)
+        message.content = message.content.upper()
+        return message
+
+
+class _SlowStrategy(MessageProcessingStrategy):
+    def __init__(self, delay):
+        self.delay = delay
+
+    def process(self, message: MessageData) -> MessageData:
+        time.sleep(self.delay)
+        message.content = "too late"
+        return message
+
+
+@pytest.mark.asyncio
+async def test_pipeline_awaits_async_strategies():
+    pipeline = StrategyPipeline([_AsyncUpperStrategy(), ProfanityFilterStrategy()])
+    assert not pipeline.inline
+    processed_message = await pipeline.run_async(MessageData(content="badword1 here"))
+    assert processed_message.content == "BADWORD1 HERE"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_falls_back_when_a_strategy_times_out():
+    slow = _SlowStrategy(0.5).with_policy(
+        ExecutionPolicy(ExecutionMode.THREAD, timeout=0.05, fallback=ProfanityFilterStrategy())
+    )
+    message = MessageData(content="badword1")
+    processed_message = await StrategyPipeline([slow]).run_async(message)
+    assert processed_message.content == "********"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_awaits_async_fallbacks():
+    slow = _SlowStrategy(0.5).with_policy(
+        ExecutionPolicy(ExecutionMode.THREAD, timeout=0.05, fallback=_AsyncUpperStrategy())
+    )
+    processed_message = await StrategyPipeline([slow]).run_async(MessageData(content="hello"))
+    assert processed_message.content == "HELLO"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_strategies_in_a_process_pool():
+    translation = TranslationStrategy(target_language="Latin").with_policy(
+        ExecutionPolicy(ExecutionMode.PROCESS, timeout=30)
+    )
+    pipeline = StrategyPipeline([translation, _RecordingStrategy()])
+    processed_message = await pipeline.run_async(MessageData(content="Hello"))
+    assert processed_message.content == "[Translated to Latin]: Quid agis?"
+
+
+def test_registry_round_trips_strategies_and_policies():
+    strategies = [
+        SpamFilterStrategy(["promo"]),
+        ProfanityFilterStrategy(["darn"], case_sensitive=False),
+        TranslationStrategy("Latin", cache=None).with_policy(
+            ExecutionPolicy(ExecutionMode.THREAD, timeout=2, fallback=SpamFilterStrategy())
+        ),
+    ]
+    restored = StrategyRegistry.decode(StrategyRegistry.encode(strategies))
+    assert [type(strategy) for strategy in restored] == [type(s) for s in strategies]
+    assert restored[0].spam_keywords == ["promo"]
+    assert restored[1].process(MessageData(content="DARN")).content == "****"
+    assert restored[2].cache is None
+    policy = restored[2].execution_policy
+    assert (policy.mode, policy.timeout) == (ExecutionMode.THREAD, 2)
+    assert isinstance(policy.fallback, SpamFilterStrategy)
+    assert restored[0].execution_policy.mode is ExecutionMode.INLINE
+
+
+def test_registry_rejects_unknown_strategies_and_pickles():
+    with pytest.raises(ValueError, match="not registered"):
+        StrategyRegistry.encode([_AsyncUpperStrategy()])
+    with pytest.raises(ValueError, match="not registered"):
+        StrategyRegistry.decode(b'[{"name": "os.system", "config": {}}]')
+    with pytest.raises(ValueError, match="JSON strategy format"):
+        StrategyRegistry.decode(pickle.dumps([SpamFilterStrategy()]))
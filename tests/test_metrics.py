@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from chat.api.api import app
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.search_index import SearchIndex
+from chat.models.message_data import MessageData
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
+from chat.strategies.strategy_pipeline import STRATEGY_SECONDS, StrategyPipeline
+from chat.utils.metrics import (
+    LOCK_HOLD_SECONDS,
+    LOCK_WAIT_SECONDS,
+    Histogram,
+    InstrumentedLock,
+    Metrics,
+)
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(Metrics, "enabled", True)
+    Metrics.reset()
+    yield
+    Metrics.reset()
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "read")
+    lines = [f"{name}{labels} {value:g}" for name, labels, value in histogram.samples()]
+    assert lines == [
+        'test_seconds_bucket{op="read",le="0.1"} 1',
+        'test_seconds_bucket{op="read",le="1.0"} 3',
+        'test_seconds_bucket{op="read",le="+Inf"} 4',
+        'test_seconds_sum{op="read"} 4.05',
+        'test_seconds_count{op="read"} 4',
+    ]
+
+
+def test_instrumented_lock_times_outermost_acquisition(metrics):
+    lock = InstrumentedLock("test", threading.RLock())
+    with lock:
+        with lock:
+            pass
+    assert LOCK_WAIT_SECONDS.count("test") == 1
+    assert LOCK_HOLD_SECONDS.count("test") == 1
+
+
+def test_pipeline_times_each_strategy(metrics):
+    pipeline = StrategyPipeline([SpamFilterStrategy()])
+    pipeline.run(MessageData(content="Hello"))
+    assert STRATEGY_SECONDS.count("SpamFilterStrategy") == 1
+    assert InMemoryRepository()._customers_lock.__class__ is InstrumentedLock
+
+
+def test_metrics_endpoint(metrics):
+    Repository.clear()
+    SearchIndex.clear()
+    AgentScheduler.clear()
+    client = TestClient(app)
+    client.post("/customers/", json={"customer_id": 1, "name": "John", "email": "j@x.io"})
+    response = client.post("/chats/new", json={"customer_id": 1, "topic": "Billing"})
+    session_id = response.json()["session_id"]
+    client.post(
+        f"/chats/{session_id}/messages/customer/", json={"customer_id": 1, "content": "Hi"}
+    )
+    client.post("/chats/not-a-uuid/end")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert (
+        'chat_http_request_duration_seconds_count{method="POST",'
+        'route="/chats/{session_id}/messages/customer/"} 1'
+    ) in body
+    assert (
+        'chat_http_errors_total{method="POST",route="/chats/{session_id}/end",status="422"} 1'
+    ) in body
+    assert "chat_send_message_seconds_count 1" in body
+    assert 'chat_repository_items{collection="messages"} 1' in body
+
+
+def test_metrics_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(Metrics, "enabled", False)
+    assert TestClient(app).get("/metrics").status_code == 404
+    assert InMemoryRepository()._customers_lock.__class__ is not InstrumentedLock
@@ -0,0 +1,181 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+
+import pytest
+
+from chat.broker.broker import Broker
+from chat.broker.memory_broker import InMemoryBroker
+from chat.broker.resp_broker import RespBroker
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.support_agent_data import SupportAgentData
+from chat.models.enums import ParticipantType, SessionStatus
+from chat.repository.redis_repository import RedisRepository
+from chat.repository.repository import Repository
+from chat.repository.resp import RespConnection, parse_url
+from chat.repository.resp_server import RespServer
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.chat_service import ChatService
+from chat.services.search_index import SearchIndex
+
+WORKERS = 3
+MESSAGES = 40
+
+
+def _worker(url: str, prefix: str, worker: int, session_ids: list) -> list:
+    """Send messages as one API worker would and read the sessions back."""
+    Repository.configure(RedisRepository(url, prefix))
+
+    async def send():
+        for i in range(MESSAGES):
+            for session_id in session_ids:
+                await ChatService.send_message(
+                    session_id, worker, ParticipantType.CUSTOMER, f"{worker}:{i}"
+                )
+
+    asyncio.run(send())
+    return [Repository.count_session_messages(session_id) for session_id in session_ids]
+
+
+def _search_worker(
+    url: str, prefix: str, channel: str, worker: int, session_ids: list, barrier
+) -> dict:
+    """Send and assign as one API worker would, then search all workers' messages."""
+    from chat.api.api import check_workers
+    from chat.api.chat_facade import ChatFacade
+
+    Repository.configure(RedisRepository(url, prefix))
+    Broker.configure(RespBroker(url, channel=channel))
+    AgentScheduler.enabled = False
+    check_workers(WORKERS)
+    SearchIndex.rebuild()
+    facade = ChatFacade()
+    expected = WORKERS * MESSAGES
+
+    async def send():
+        await ChatService.assign_agent_to_session(session_ids[worker], 100 + worker)
+        for i in range(MESSAGES):
+            await ChatService.send_message(
+                session_ids[worker], worker, ParticipantType.CUSTOMER, f"refund order{worker}x{i}"
+            )
+
+    # Every worker subscribes before any of them sends.
+    barrier.wait()
+    asyncio.run(send())
+    deadline = time.monotonic() + 20
+    while facade.search("refund").total < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    results = {
+        "total": facade.search("refund").total,
+        "others": [facade.search(f"order{other}x0").total for other in range(WORKERS)],
+        "by_agent": [
+            facade.search("refund", agent_id=100 + other).total for other in range(WORKERS)
+        ],
+    }
+    Broker.close()
+    return results
+
+
+@pytest.fixture
+def resp_server():
+    server = RespServer().start()
+    yield server
+    server.stop()
+
+
+def test_workers_share_sessions(resp_server, monkeypatch):
+    monkeypatch.setenv("CHAT_LOG_LEVEL", "WARNING")
+    prefix = f"test:{uuid.uuid4().hex}:"
+    repository = RedisRepository(resp_server.url, prefix)
+    sessions = [ChatSessionData(uuid.uuid4(), 1, "Billing") for _ in range(2)]
+    for session in sessions:
+        repository.add_chat_session(session)
+    session_ids = [session.session_id for session in sessions]
+
+    with multiprocessing.get_context("spawn").Pool(WORKERS) as pool:
+        counts = pool.starmap(
+            _worker, [(resp_server.url, prefix, worker, session_ids) for worker in range(WORKERS)]
+        )
+
+    # Every worker reads at least its own writes, and all of them in the end.
+    assert all(count >= MESSAGES for worker_counts in counts for count in worker_counts)
+    for session_id in session_ids:
+        messages = repository.get_session_messages(session_id)
+        assert len(messages) == WORKERS * MESSAGES
+        for worker in range(WORKERS):
+            own = [m.content for m in messages if m.participant_id == worker]
+            assert own == [f"{worker}:{i}" for i in range(MESSAGES)]
+        session = repository.get_chat_session(session_id)
+        assert session.last_activity == max(m.timestamp for m in messages)
+    assert len(repository.messages) == 2 * WORKERS * MESSAGES
+
+    # A session ended through one connection is ended for every other one.
+    repository.end_chat_session(session_ids[0], sessions[0].last_activity)
+    other = RedisRepository(resp_server.url, prefix)
+    assert other.get_chat_session(session_ids[0]).status == SessionStatus.CLOSED
+    other.close()
+    repository.close()
+
+
+def test_workers_search_and_assign_across_workers(resp_server, monkeypatch):
+    monkeypatch.setenv("CHAT_LOG_LEVEL", "WARNING")
+    prefix = f"test:{uuid.uuid4().hex}:"
+    repository = RedisRepository(resp_server.url, prefix)
+    for worker in range(WORKERS):
+        repository.add_agent(SupportAgentData(100 + worker, f"Agent {worker}", "a@example.com"))
+    sessions = [ChatSessionData(uuid.uuid4(), 1, "Billing") for _ in range(WORKERS)]
+    for session in sessions:
+        repository.add_chat_session(session)
+    session_ids = [session.session_id for session in sessions]
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        barrier = manager.Barrier(WORKERS)
+        with context.Pool(WORKERS) as pool:
+            results = pool.starmap(
+                _search_worker,
+                [
+                    (resp_server.url, prefix, f"{prefix}messages", worker, session_ids, barrier)
+                    for worker in range(WORKERS)
+                ],
+            )
+
+    # Whichever worker answers, it finds the messages stored through every worker,
+    # and scopes them by the agents assigned through the others.
+    for result in results:
+        assert result["total"] == WORKERS * MESSAGES
+        assert result["others"] == [1] * WORKERS
+        assert result["by_agent"] == [MESSAGES] * WORKERS
+    for worker in range(WORKERS):
+        assert repository.find_chat_session_ids(agent_id=100 + worker) == [session_ids[worker]]
+    repository.close()
+
+
+def test_check_workers_rejects_per_worker_state(monkeypatch):
+    from chat.api.api import check_workers
+
+    monkeypatch.setattr(AgentScheduler, "enabled", True)
+    check_workers(1)
+    with pytest.raises(RuntimeError, match="CHAT_AUTO_ASSIGN_AGENTS=0"):
+        check_workers(2)
+    monkeypatch.setattr(AgentScheduler, "enabled", False)
+    monkeypatch.setattr(Broker, "_backend", InMemoryBroker())
+    with pytest.raises(RuntimeError, match="CHAT_BROKER=redis"):
+        check_workers(2)
+
+
+def test_transaction_aborts_when_a_watched_key_changes(resp_server):
+    first = RespConnection(*parse_url(resp_server.url))
+    second = RespConnection(*parse_url(resp_server.url))
+    first.execute("HSET", "key", "field", "1")
+    first.execute("WATCH", "key")
+    second.execute("HSET", "key", "field", "2")
+    assert first.pipeline([("MULTI",), ("HSET", "key", "field", "3"), ("EXEC",)])[-1] is None
+    assert first.execute("HGET", "key", "field") == b"2"
+
+    first.execute("WATCH", "key")
+    assert first.pipeline([("MULTI",), ("HSET", "key", "field", "3"), ("EXEC",)])[-1] == [0]
+    assert second.execute("HGET", "key", "field") == b"3"
+    first.close()
+    second.close()
@@ -1,24 +1,56 @@
+import pickle
 import pytest
+import threading
 import uuid
 from datetime import datetime
 
 from chat.models.chat_session_data import ChatSessionData
 from chat.models.customer_data import CustomerData
-from chat.models.enums import MessageType, ParticipantType, TicketStatus
+from chat.models.enums import (
+    ExecutionMode,
+    MessageType,
+    ParticipantType,
+    SessionStatus,
+    TicketStatus,
+)
 from chat.models.message_data import MessageData
 from chat.models.support_agent_data import SupportAgentData
 from chat.models.support_ticket_data import SupportTicketData
+from chat.repository.durable_memory_repository import DurableInMemoryRepository
+from chat.repository import mutation_log
+from chat.repository.memory_repository import InMemoryRepository
+from chat.repository.redis_repository import RedisRepository
 from chat.repository.repository import Repository
+from chat.repository.resp_server import RespServer
+from chat.repository.sqlite_repository import SQLiteRepository
+from chat.strategies.execution_policy import ExecutionPolicy
+from chat.strategies.spam_filter_strategy import SpamFilterStrategy
 
 
-@pytest.fixture
-def setup_repository():
-    """Clear the repository before each test."""
-    Repository.customers.clear()
-    Repository.agents.clear()
-    Repository.chat_sessions.clear()
-    Repository.messages.clear()
-    Repository.support_tickets.clear()
+@pytest.fixture(scope="module")
+def resp_server():
+    server = RespServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["memory", "durable", "sqlite", "redis"])
+def setup_repository(request, tmp_path):
+    """Run each test against an empty repository of every backend."""
+    previous = Repository.backend()
+    if request.param == "redis":
+        server = request.getfixturevalue("resp_server")
+        backend = RedisRepository(server.url, prefix=f"test:{uuid.uuid4().hex}:")
+    elif request.param == "sqlite":
+        backend = SQLiteRepository(tmp_path / "chat.db")
+    elif request.param == "durable":
+        backend = DurableInMemoryRepository(tmp_path / "wal")
+    else:
+        backend = InMemoryRepository()
+    Repository.configure(backend)
+    yield
+    backend.close()
+    Repository.configure(previous)
 
 
 def test_add_and_get_customer(setup_repository):
@@ -69,3 +101,413 @@ def test_add_and_get_support_ticket(setup_repository):
     Repository.add_support_ticket(ticket)
     assert Repository.support_tickets[ticket_id].issue == "Issue description"
     assert Repository.support_tickets[ticket_id].status == TicketStatus.OPEN
+
+
+def test_session_messages_index(setup_repository):
+    session_id = uuid.uuid4()
+    other_session_id = uuid.uuid4()
+    first = MessageData(session_id=session_id, content="first")
+    other = MessageData(session_id=other_session_id, content="other")
+    second = MessageData(session_id=session_id, content="second")
+    for message in (first, other, second):
+        Repository.add_message(message)
+
+    assert Repository.get_session_messages(session_id) == [first, second]
+    assert Repository.get_session_messages(other_session_id) == [other]
+    assert Repository.get_session_messages(uuid.uuid4()) == []
+
+
+def test_concurrent_add_message(setup_repository):
+    session_ids = [uuid.uuid4() for _ in range(4)]
+
+    def add_messages(session_id):
+        for i in range(500):
+            Repository.add_message(MessageData(session_id=session_id, content=str(i)))
+
+    threads = [threading.Thread(target=add_messages, args=(s,)) for s in session_ids * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(Repository.messages) == 4000
+    for session_id in session_ids:
+        assert Repository.count_session_messages(session_id) == 1000
+
+
+def test_assign_agent_and_update_ticket_status(setup_repository):
+    session_id = uuid.uuid4()
+    Repository.add_chat_session(ChatSessionData(session_id, 1, "Support Request"))
+    Repository.assign_agent(session_id, 101)
+    assert Repository.get_chat_session(session_id).support_agent_id == 101
+
+    ticket = SupportTicketData(101, session_id, "Issue description")
+    Repository.add_support_ticket(ticket)
+    Repository.update_ticket_status(ticket.ticket_id, TicketStatus.IN_PROGRESS)
+    assert Repository.get_support_ticket(ticket.ticket_id).status == TicketStatus.IN_PROGRESS
+
+
+def test_ticket_indexes_follow_status_changes(setup_repository):
+    first_session, second_session = uuid.uuid4(), uuid.uuid4()
+    tickets = [
+        SupportTicketData(101, first_session, "Refund"),
+        SupportTicketData(101, second_session, "Login"),
+        SupportTicketData(102, first_session, "Invoice"),
+    ]
+    for ticket in tickets:
+        Repository.add_support_ticket(ticket)
+    Repository.update_ticket_status(tickets[0].ticket_id, TicketStatus.IN_PROGRESS)
+    Repository.update_ticket_status(tickets[1].ticket_id, TicketStatus.RESOLVED)
+
+    assert Repository.count_tickets() == 3
+    assert Repository.count_tickets(status=TicketStatus.OPEN) == 1
+    assert Repository.count_tickets(agent_id=101) == 2
+    assert Repository.count_tickets(status=TicketStatus.OPEN, agent_id=101) == 0
+    assert Repository.count_tickets(session_id=first_session) == 2
+    assert Repository.count_tickets(TicketStatus.IN_PROGRESS, 101, first_session) == 1
+    assert [t.issue for t in Repository.list_tickets(status=TicketStatus.RESOLVED)] == ["Login"]
+    assert [t.issue for t in Repository.list_tickets(session_id=first_session, agent_id=102)] == [
+        "Invoice"
+    ]
+
+    page = Repository.list_tickets(start=1, stop=3) + Repository.list_tickets(start=0, stop=1)
+    assert sorted(t.issue for t in page) == ["Invoice", "Login", "Refund"]
+    assert Repository.list_tickets(agent_id=999) == []
+
+
+def test_add_messages_and_session_positions(setup_repository):
+    session_id = uuid.uuid4()
+    messages = [
+        MessageData(session_id=session_id, content=str(i), timestamp=datetime(2024, 1, 1, 12, i))
+        for i in range(5)
+    ]
+    Repository.add_messages(messages)
+
+    assert Repository.count_session_messages(session_id) == 5
+    assert Repository.get_session_messages(session_id, 1, 3) == messages[1:3]
+    assert Repository.get_session_messages(session_id, 3) == messages[3:]
+    assert Repository.session_position_after(session_id, datetime(2024, 1, 1, 12, 2)) == 3
+
+
+def test_ended_session_history_stays_readable(setup_repository):
+    session = ChatSessionData(uuid.uuid4(), 1, "Support Request")
+    Repository.add_chat_session(session)
+    messages = [
+        MessageData(
+            session_id=session.session_id,
+            participant_id=1 if i % 2 else "Bot",
+            participant_type=ParticipantType.CUSTOMER if i % 2 else ParticipantType.BOT,
+            content=f"Message {i} \u00e9",
+            timestamp=datetime(2024, 1, 1, 12, i),
+        )
+        for i in range(5)
+    ]
+    Repository.add_messages(messages)
+    Repository.end_chat_session(session.session_id, datetime(2024, 1, 1, 13))
+
+    assert Repository.get_chat_session(session.session_id).ended_at == datetime(2024, 1, 1, 13)
+    assert Repository.get_session_messages(session.session_id) == messages
+    assert Repository.get_session_messages(session.session_id, -2) == messages[-2:]
+    assert Repository.count_session_messages(session.session_id) == 5
+    assert Repository.session_position_after(session.session_id, datetime(2024, 1, 1, 12, 2)) == 3
+    assert Repository.get_message(messages[3].message_id) == messages[3]
+    assert Repository.get_message(messages[3].message_id, session.session_id) == messages[3]
+
+
+def test_session_states_and_idle_sessions(setup_repository):
+    active = ChatSessionData(uuid.uuid4(), 1, "Billing", last_activity=datetime(2024, 1, 1, 9))
+    waiting = ChatSessionData(uuid.uuid4(), 2, "Billing", last_activity=datetime(2024, 1, 1, 9))
+    Repository.add_chat_session(active)
+    Repository.add_chat_session(waiting)
+    Repository.add_message(
+        MessageData(session_id=active.session_id, content="Hi", timestamp=datetime(2024, 1, 1, 12))
+    )
+    Repository.assign_agent(active.session_id, 101)
+    Repository.set_session_status(waiting.session_id, SessionStatus.WAITING)
+
+    restored = Repository.get_chat_session(active.session_id)
+    assert restored.status == SessionStatus.ACTIVE
+    assert restored.last_activity == datetime(2024, 1, 1, 12)
+    assert Repository.get_chat_session(waiting.session_id).status == SessionStatus.WAITING
+    assert Repository.idle_sessions(datetime(2024, 1, 1, 11), 10) == [waiting.session_id]
+    assert len(Repository.idle_sessions(datetime(2024, 1, 1, 13), 10)) == 2
+    assert len(Repository.idle_sessions(datetime(2024, 1, 1, 13), 1)) == 1
+
+    Repository.end_chat_session(waiting.session_id, datetime(2024, 1, 1, 13))
+    assert Repository.get_chat_session(waiting.session_id).status == SessionStatus.CLOSED
+    assert Repository.idle_sessions(datetime(2024, 1, 1, 13), 10) == [active.session_id]
+
+
+def test_iter_chat_sessions_in_batches(setup_repository):
+    session_ids = [uuid.uuid4() for _ in range(7)]
+    for session_id in session_ids:
+        Repository.add_chat_session(ChatSessionData(session_id, 1, "Billing"))
+    for batch_size in (1, 3, 7, 10):
+        sessions = list(Repository.iter_chat_sessions(batch_size))
+        assert sorted(session.session_id for session in sessions) == sorted(session_ids)
+
+
+def test_find_chat_session_ids(setup_repository):
+    first, second, third = (uuid.uuid4() for _ in range(3))
+    Repository.add_chat_session(ChatSessionData(first, 1, "Billing", 101))
+    Repository.add_chat_session(ChatSessionData(second, 1, "Billing"))
+    Repository.add_chat_session(ChatSessionData(third, 2, "Billing", 101))
+
+    assert Repository.find_chat_session_ids(customer_id=1) == [first, second]
+    assert Repository.find_chat_session_ids(agent_id=101) == [first, third]
+    assert Repository.find_chat_session_ids(1, 101) == [first]
+    assert Repository.find_chat_session_ids(3) == []
+    assert sorted(Repository.find_chat_session_ids()) == sorted([first, second, third])
+
+    # Reassigned sessions move to the new agent.
+    Repository.assign_agent(first, 102)
+    Repository.assign_agent(second, 101)
+    assert set(Repository.find_chat_session_ids(agent_id=101)) == {second, third}
+    assert Repository.find_chat_session_ids(1, 102) == [first]
+
+
+@pytest.mark.parametrize("backend", ["memory", "durable"])
+def test_evict_ended_sessions(backend, tmp_path):
+    repository = (
+        DurableInMemoryRepository(tmp_path) if backend == "durable" else InMemoryRepository()
+    )
+    sessions = [ChatSessionData(uuid.uuid4(), 1, "Billing") for _ in range(3)]
+    for hour, session in enumerate(sessions, 10):
+        repository.add_chat_session(session)
+        repository.add_message(MessageData(session_id=session.session_id, content="Hello"))
+        repository.end_chat_session(session.session_id, datetime(2024, 1, 1, hour))
+    ticket = SupportTicketData(101, sessions[0].session_id, "Refund")
+    repository.add_support_ticket(ticket)
+    kept = SupportTicketData(101, sessions[2].session_id, "Login")
+    repository.add_support_ticket(kept)
+
+    assert repository.evict_chat_sessions(datetime(2024, 1, 1, 12), 1) == [sessions[0].session_id]
+    assert repository.evict_chat_sessions(datetime(2024, 1, 1, 12), 10) == [sessions[1].session_id]
+    assert repository.get_chat_session(sessions[0].session_id) is None
+    assert repository.get_session_messages(sessions[0].session_id) == []
+    assert list(repository.archives) == [sessions[2].session_id]
+    # Tickets and per-session tables go with the session.
+    assert repository.get_support_ticket(ticket.ticket_id) is None
+    assert repository.list_tickets(agent_id=101) == [kept]
+    assert list(repository._tickets_by_session) == [sessions[2].session_id]
+    assert repository.find_chat_session_ids(customer_id=1) == [sessions[2].session_id]
+    assert repository._participant_ids == {}
+
+    if backend == "durable":
+        repository.close()
+        repository = DurableInMemoryRepository(tmp_path)
+        assert list(repository.chat_sessions) == [sessions[2].session_id]
+        assert repository.get_chat_session(sessions[2].session_id).status == SessionStatus.CLOSED
+    repository.close()
+
+
+def test_memory_repository_archives_ended_sessions():
+    repository = InMemoryRepository()
+    session = ChatSessionData(uuid.uuid4(), 1, "Support Request")
+    repository.add_chat_session(session)
+    repository.add_message(MessageData(session_id=session.session_id, content="Hello"))
+    repository.end_chat_session(session.session_id, datetime.now())
+
+    assert len(repository.messages) == 0
+    assert len(repository.archives[session.session_id]) == 1
+    with pytest.raises(ValueError):
+        repository.add_message(MessageData(session_id=session.session_id, content="Late"))
+
+
+def test_memory_repository_idle_sessions_follow_activity():
+    repository = InMemoryRepository()
+    sessions = [
+        ChatSessionData(uuid.uuid4(), 1, "Billing", last_activity=datetime(2024, 1, 1, hour))
+        for hour in (9, 10, 11)
+    ]
+    for session in sessions:
+        repository.add_chat_session(session)
+    repository.add_message(
+        MessageData(session_id=sessions[0].session_id, timestamp=datetime(2024, 1, 1, 12))
+    )
+
+    before = datetime(2024, 1, 1, 11, 30)
+    assert repository.idle_sessions(before, 10) == [s.session_id for s in sessions[1:]]
+    assert repository.idle_sessions(before, 1) == [sessions[1].session_id]
+    repository.end_chat_session(sessions[1].session_id, before)
+    assert repository.idle_sessions(before, 10) == [sessions[2].session_id]
+    assert repository.idle_sessions(datetime(2024, 1, 1, 13), 10) == [
+        sessions[2].session_id,
+        sessions[0].session_id,
+    ]
+
+
+def test_memory_repository_shares_ids_between_messages():
+    repository = InMemoryRepository()
+    session = ChatSessionData(uuid.uuid4(), 1, "Support Request")
+    repository.add_chat_session(session)
+    for content in ("Hello", "Anyone there?"):
+        repository.add_message(
+            MessageData(
+                session_id=uuid.UUID(str(session.session_id)),
+                participant_id=int("1001"),
+                content=content,
+            )
+        )
+    first, second = repository.get_session_messages(session.session_id)
+    assert first.session_id is second.session_id is session.session_id
+    assert first.participant_id is second.participant_id
+    assert not hasattr(first, "__dict__")
+
+
+def test_redis_repository_never_unpickles_strategies(resp_server):
+    repository = RedisRepository(resp_server.url, prefix=f"test:{uuid.uuid4().hex}:")
+    session = ChatSessionData(uuid.uuid4(), 1, "Support", strategies=[SpamFilterStrategy()])
+    repository.add_chat_session(session)
+    key = repository._session_key(session.session_id)
+    assert repository._execute("HGET", key, b"strategies").startswith(b'[{"name"')
+    assert isinstance(
+        repository.get_chat_session(session.session_id).strategies[0], SpamFilterStrategy
+    )
+
+    # Anyone able to write to the server could store a pickle there.
+    repository._execute("HSET", key, b"strategies", pickle.dumps([SpamFilterStrategy()]))
+    with pytest.raises(ValueError):
+        repository.get_chat_session(session.session_id)
+    repository.clear()
+    repository.close()
+
+
+def test_sqlite_repository_keeps_position_of_stored_again_messages(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "chat.db"))
+    session_id = uuid.uuid4()
+    messages = [MessageData(session_id=session_id, content=f"m{i}") for i in range(3)]
+    repository.add_messages(messages)
+    messages[0].content = "edited"
+    repository.add_message(messages[0])
+
+    assert repository.count_session_messages(session_id) == 3
+    assert [m.content for m in repository.get_session_messages(session_id)] == [
+        "edited",
+        "m1",
+        "m2",
+    ]
+    assert repository.session_position_after(session_id, messages[0].timestamp) == 1
+    repository.close()
+
+
+def test_sqlite_repository_persists_across_restarts(tmp_path):
+    path = tmp_path / "chat.db"
+    repository = SQLiteRepository(path)
+    session = ChatSessionData(
+        uuid.uuid4(), 1, "Support Request", strategies=[SpamFilterStrategy()]
+    )
+    repository.add_customer(CustomerData(1, "John Doe", "john@example.com"))
+    repository.add_chat_session(session)
+    repository.add_message(MessageData(session_id=session.session_id, content="Hello"))
+    repository.close()
+
+    repository = SQLiteRepository(path)
+    assert repository.get_customer(1).name == "John Doe"
+    restored = repository.get_chat_session(session.session_id)
+    assert isinstance(restored.strategies[0], SpamFilterStrategy)
+    assert repository.get_session_messages(session.session_id)[0].content == "Hello"
+    repository.close()
+
+
+def _populate_durable(repository):
+    session = ChatSessionData(uuid.uuid4(), 1, "Support Request", strategies=[SpamFilterStrategy()])
+    ticket = SupportTicketData(101, session.session_id, "Issue description")
+    repository.add_customer(CustomerData(1, "John Doe", "john@example.com"))
+    repository.add_agent(SupportAgentData(101, "Jane Smith", "jane@example.com"))
+    repository.add_chat_session(session)
+    repository.add_message(MessageData(session_id=session.session_id, content="Hello"))
+    repository.add_support_ticket(ticket)
+    repository.assign_agent(session.session_id, 101)
+    repository.update_ticket_status(ticket.ticket_id, TicketStatus.RESOLVED)
+    return session, ticket
+
+
+def _assert_recovered(repository, session, ticket):
+    assert repository.get_customer(1).name == "John Doe"
+    assert repository.get_agent(101).name == "Jane Smith"
+    restored = repository.get_chat_session(session.session_id)
+    assert restored.support_agent_id == 101
+    assert restored.last_activity == session.last_activity
+    assert isinstance(restored.strategies[0], SpamFilterStrategy)
+    assert [m.content for m in repository.get_session_messages(session.session_id)] == ["Hello"]
+    assert repository.get_support_ticket(ticket.ticket_id).status == TicketStatus.RESOLVED
+    assert repository.count_tickets(status=TicketStatus.RESOLVED, agent_id=101) == 1
+    assert repository.count_tickets(status=TicketStatus.OPEN) == 0
+
+
+def test_durable_repository_replays_log(tmp_path):
+    repository = DurableInMemoryRepository(tmp_path)
+    session, ticket = _populate_durable(repository)
+    repository.close()
+
+    repository = DurableInMemoryRepository(tmp_path)
+    _assert_recovered(repository, session, ticket)
+    repository.close()
+
+
+def test_durable_repository_logs_strategies_by_name(tmp_path):
+    policy = ExecutionPolicy(ExecutionMode.THREAD, timeout=1, fallback=SpamFilterStrategy())
+    session = ChatSessionData(
+        uuid.uuid4(), 1, "Support", strategies=[SpamFilterStrategy(["promo"]).with_policy(policy)]
+    )
+    record = mutation_log.encode_chat_session(session)
+    assert b'"name": "SpamFilterStrategy"' in record
+
+    repository = DurableInMemoryRepository(tmp_path)
+    repository.add_chat_session(session)
+    repository.close()
+    for _ in range(2):
+        repository = DurableInMemoryRepository(tmp_path)
+        [strategy] = repository.get_chat_session(session.session_id).strategies
+        assert strategy.spam_keywords == ["promo"]
+        assert strategy.execution_policy.timeout == 1
+        # The second round recovers from the snapshot.
+        repository.snapshot()
+        repository.close()
+
+
+def test_durable_repository_recovers_ended_sessions(tmp_path):
+    repository = DurableInMemoryRepository(tmp_path)
+    session, ticket = _populate_durable(repository)
+    repository.end_chat_session(session.session_id, datetime(2024, 1, 1, 13))
+    repository.close()
+
+    for _ in range(2):
+        repository = DurableInMemoryRepository(tmp_path)
+        _assert_recovered(repository, session, ticket)
+        assert session.session_id in repository.archives
+        assert repository.get_chat_session(session.session_id).ended_at == datetime(2024, 1, 1, 13)
+        # The second round recovers from the snapshot.
+        repository.snapshot()
+        repository.close()
+
+
+def test_durable_repository_snapshot_and_tail(tmp_path):
+    repository = DurableInMemoryRepository(tmp_path)
+    session, ticket = _populate_durable(repository)
+    repository.snapshot()
+    repository.add_message(MessageData(session_id=session.session_id, content="After snapshot"))
+    repository.close()
+
+    repository = DurableInMemoryRepository(tmp_path)
+    assert repository.count_session_messages(session.session_id) == 2
+    assert repository.get_session_messages(session.session_id, 1)[0].content == "After snapshot"
+    repository.close()
+
+
+def test_durable_repository_ignores_torn_tail(tmp_path):
+    repository = DurableInMemoryRepository(tmp_path)
+    session, ticket = _populate_durable(repository)
+    repository.close()
+    with open(tmp_path / "wal-00000000.log", "ab") as log:
+        log.write(b"\x04\xff\x00")  # a record cut short by a crash
+
+    repository = DurableInMemoryRepository(tmp_path)
+    _assert_recovered(repository, session, ticket)
+    repository.add_message(MessageData(session_id=session.session_id, content="Later"))
+    repository.close()
+
+    repository = DurableInMemoryRepository(tmp_path)
+    assert repository.count_session_messages(session.session_id) == 2
+    repository.close()
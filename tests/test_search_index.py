@@ -0,0 +1,95 @@
+import uuid
+
+import pytest
+
+from chat.api.chat_facade import ChatFacade
+from chat.models.chat_session_data import ChatSessionData
+from chat.models.message_data import MessageData
+from chat.repository.repository import Repository
+from chat.services.search_index import SearchIndex, parse_query
+from chat.strategies.profanity_filter_strategy import ProfanityFilterStrategy
+
+
+@pytest.fixture
+def setup_index():
+    """Clear the repository and the search index before each test."""
+    Repository.clear()
+    SearchIndex.clear()
+
+
+def _index(session_id, *contents):
+    messages = [MessageData(session_id=session_id, content=content) for content in contents]
+    SearchIndex.add_many(messages)
+    return [message.message_id for message in messages]
+
+
+def test_parse_query():
+    assert parse_query('refund "order A-17" b2b') == [["refund"], ["order", "a", "17"], ["b2b"]]
+
+
+def test_term_and_phrase_queries(setup_index):
+    session_id = uuid.uuid4()
+    ids = _index(
+        session_id,
+        "Where is my order A-1234?",
+        "Order 1234 was refunded",
+        "The A team will call you about your order",
+    )
+    assert SearchIndex.search("order")[1] == 3
+    assert [m for m, _, _ in SearchIndex.search("A-1234")[0]] == [ids[0]]
+    assert [m for m, _, _ in SearchIndex.search('"order 1234"')[0]] == [ids[1]]
+    assert SearchIndex.search("order refunded missing")[1] == 0
+
+
+def test_ranking_and_session_scope(setup_index):
+    first, second = uuid.uuid4(), uuid.uuid4()
+    ids = _index(first, "printer jam", "printer printer printer jam again")
+    _index(second, "the printer is fine, thanks for asking about it today")
+    matches, total = SearchIndex.search("printer")
+    assert total == 3
+    assert matches[0][:2] == (ids[1], first)
+    assert {m for m, _, _ in SearchIndex.search("printer", {first})[0]} == set(ids)
+    assert SearchIndex.search("jam", {second})[1] == 0
+
+
+@pytest.mark.asyncio
+async def test_facade_search_indexes_filtered_content(setup_index):
+    facade = ChatFacade()
+    facade.create_customer(1, "John Doe", "john@example.com")
+    facade.create_customer(2, "Jane Doe", "jane@example.com")
+    session_id = await facade.initiate_chat(1, "Billing", [ProfanityFilterStrategy()])
+    other_session_id = await facade.initiate_chat(2, "Billing")
+    for i in range(3):
+        await facade.customer_send_message(session_id, 1, f"invoice {i} badword1")
+    await facade.customer_send_message(other_session_id, 2, "invoice for Jane")
+
+    assert facade.search("badword1").total == 0
+    page = facade.search("invoice", customer_id=1, limit=2)
+    assert page.total == 3 and page.next_offset == 2
+    assert all(hit.message.session_id == session_id for hit in page.hits)
+    last = facade.search("invoice", customer_id=1, limit=2, offset=2)
+    assert len(last.hits) == 1 and last.next_offset is None
+    assert facade.search("jane", session_id=session_id).total == 0
+
+
+def test_removed_sessions_are_hidden_and_compacted(setup_index, monkeypatch):
+    monkeypatch.setattr(SearchIndex, "compact_min_docs", 2)
+    kept, removed = uuid.uuid4(), uuid.uuid4()
+    for session_id in (kept, removed):
+        Repository.add_chat_session(ChatSessionData(session_id, 1, "Billing"))
+    kept_messages = [MessageData(session_id=kept, content="refund order")]
+    removed_messages = [MessageData(session_id=removed, content=f"refund {i}") for i in range(3)]
+    Repository.add_messages(kept_messages + removed_messages)
+    SearchIndex.add_many(kept_messages + removed_messages)
+
+    assert SearchIndex.remove_sessions([removed])
+    assert [m for m, _, _ in SearchIndex.search("refund")[0]] == [kept_messages[0].message_id]
+    assert SearchIndex.search("refund", session_ids=[removed])[1] == 0
+    assert SearchIndex.indexed_count() == 1
+
+    SearchIndex.compact()
+    assert SearchIndex.search('"refund order"')[1] == 1
+    assert SearchIndex.search("refund")[1] == 1
+    _index(kept, "another refund")
+    assert SearchIndex.search("refund", session_ids=[kept])[1] == 2
+    assert SearchIndex.indexed_count() == 2
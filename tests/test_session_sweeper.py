@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from chat.api.chat_facade import ChatFacade
+from chat.models.enums import SessionStatus
+from chat.repository.repository import Repository
+from chat.services.agent_scheduler import AgentScheduler
+from chat.services.search_index import SearchIndex
+from chat.services.session_sweeper import SessionSweeper
+
+
+@pytest.fixture
+def facade(monkeypatch):
+    """Clear the repository, scheduler and index; sweep with a settable clock."""
+    Repository.clear()
+    AgentScheduler.clear()
+    SearchIndex.clear()
+    now = [datetime.now()]
+    monkeypatch.setattr(SessionSweeper, "clock", lambda: now[0])
+    monkeypatch.setattr(SessionSweeper, "idle_seconds", 600)
+    monkeypatch.setattr(SessionSweeper, "retention_seconds", 3600)
+    monkeypatch.setattr(SessionSweeper, "batch_size", 2)
+    facade = ChatFacade()
+    facade.now = now
+    facade.create_customer(1, "John Doe", "john@example.com")
+    return facade
+
+
+@pytest.mark.asyncio
+async def test_session_status_follows_assignment(facade):
+    session_id = await facade.initiate_chat(1, "Billing")
+    assert Repository.get_chat_session(session_id).status == SessionStatus.WAITING
+    facade.create_agent(101, "Jane Smith", "jane@example.com")
+    assert Repository.get_chat_session(session_id).status == SessionStatus.ACTIVE
+    await facade.end_chat(session_id)
+    assert Repository.get_chat_session(session_id).status == SessionStatus.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_send_message_records_activity(facade):
+    session_id = await facade.initiate_chat(1, "Billing")
+    created = Repository.get_chat_session(session_id).last_activity
+    await facade.customer_send_message(session_id, 1, "Hello")
+    message = Repository.get_session_messages(session_id)[-1]
+    assert Repository.get_chat_session(session_id).last_activity == message.timestamp >= created
+
+
+@pytest.mark.asyncio
+async def test_sweep_closes_idle_and_evicts_ended_sessions(facade):
+    facade.create_agent(101, "Jane Smith", "jane@example.com", max_sessions=10)
+    idle = [await facade.initiate_chat(1, "Billing") for _ in range(5)]
+    for session_id in idle:
+        await facade.customer_send_message(session_id, 1, "refund please")
+
+    assert (await SessionSweeper.sweep()).closed == 0
+    facade.now[0] += timedelta(minutes=11)
+    result = await SessionSweeper.sweep()
+    assert (result.closed, result.evicted) == (5, 0)
+    assert all(Repository.get_chat_session(s).status == SessionStatus.CLOSED for s in idle)
+    assert AgentScheduler.load(101) == 0
+    assert len(facade.get_chat_history(idle[0])) == 1
+
+    facade.now[0] += timedelta(hours=2)
+    result = await SessionSweeper.sweep()
+    assert (result.closed, result.evicted) == (0, 5)
+    assert Repository.get_chat_session(idle[0]) is None
+    assert facade.get_chat_history(idle[0]) == []
+    assert facade.search("refund").total == 0
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chat.models.message_data import MessageData
+from chat.strategies.translation_strategy import StubTranslator, TranslationStrategy
+from chat.utils.translation_cache import TranslationCache
+
+
+def test_cache_hits_and_lru_eviction():
+    cache = TranslationCache(max_entries=2, ttl=None)
+    translator = StubTranslator()
+    for content in ("a", "b", "a", "c", "b"):
+        cache.get_or_translate(content, "French", translator.translate)
+    # "b" was evicted by "c" as the least recently used entry, then fetched again.
+    assert translator.calls == 4
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 4, 2)
+    assert len(cache) == 2
+
+
+def test_cache_entries_expire():
+    now = [0.0]
+    cache = TranslationCache(ttl=10, clock=lambda: now[0])
+    translator = StubTranslator()
+    cache.get_or_translate("hello", "French", translator.translate)
+    now[0] = 5
+    cache.get_or_translate("hello", "French", translator.translate)
+    now[0] = 11
+    cache.get_or_translate("hello", "French", translator.translate)
+    assert translator.calls == 2
+    assert cache.stats.expirations == 1
+
+
+def test_concurrent_identical_translations_are_coalesced():
+    translator = StubTranslator(latency=0.2)
+    strategy = TranslationStrategy("Latin", translator, TranslationCache())
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: strategy.process(MessageData(content="Hi")).content, range(8)))
+    assert results == ["[Translated to Latin]: Quid agis?"] * 8
+    assert translator.calls == 1
+    assert strategy.cache.stats.misses + strategy.cache.stats.coalesced + strategy.cache.stats.hits == 8
+
+
+def test_failed_translations_are_not_cached():
+    cache = TranslationCache()
+
+    def failing(content, target_language):
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_translate("hello", "French", failing)
+    assert cache.get_or_translate("hello", "French", StubTranslator().translate)
+    assert cache.stats.misses == 2